@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+import nonebot
+from nonebot.adapters.onebot.v11 import Adapter
+
+
+def load_plugin():
+    if nonebot.get_plugin("nonebot_plugin_bawiki"):
+        return
+
+    # 插件会在当前目录下创建数据文件夹，切到临时目录里运行
+    os.chdir(tempfile.mkdtemp(prefix="bawiki-bench-"))
+    nonebot.init(driver="~none", log_level="WARNING")
+    nonebot.get_driver().register_adapter(Adapter)
+    nonebot.load_plugin("nonebot_plugin_bawiki")
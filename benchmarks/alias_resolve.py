@@ -0,0 +1,71 @@
+# 对比 recover_alia 使用索引前后的耗时
+# 运行：python benchmarks/alias_resolve.py
+
+import random
+import timeit
+from typing import Dict, List
+
+from _util import load_plugin
+
+load_plugin()
+
+from nonebot_plugin_bawiki.util import recover_alia, replace_brackets
+
+
+def legacy_recover_alia(origin: str, alia_dict: Dict[str, List[str]]):
+    origin = replace_brackets(origin).strip()
+    origin_ = origin.lower()
+
+    for k, li in alia_dict.items():
+        if origin_ in li or origin_ == k:
+            return k
+
+    origin_ = origin.replace(" ", "")
+    for k, li in alia_dict.items():
+        li = [x.replace(" ", "") for x in ([k, *li])]
+        for v in li:
+            if origin_ in v:
+                return k
+
+    return origin
+
+
+def random_name(rand: random.Random, length: int) -> str:
+    return "".join(chr(rand.randint(0x4E00, 0x4E00 + 600)) for _ in range(length))
+
+
+def main():
+    rand = random.Random(114514)
+    alia_dict = {
+        f"{random_name(rand, 2)}（{random_name(rand, 2)}）": [
+            random_name(rand, rand.randint(1, 4)) for _ in range(rand.randint(2, 8))
+        ]
+        for _ in range(300)
+    }
+    names = [*alia_dict, *(x for li in alia_dict.values() for x in li)]
+    queries = [
+        *rand.sample(names, 200),  # 精确
+        *(x[: rand.randint(1, len(x))] for x in rand.sample(names, 200)),  # 模糊
+        *(random_name(rand, 3) for _ in range(100)),  # 未命中
+    ]
+
+    for q in queries:
+        assert recover_alia(q, alia_dict) == legacy_recover_alia(q, alia_dict), q
+
+    number = 20
+    legacy = timeit.timeit(
+        lambda: [legacy_recover_alia(q, alia_dict) for q in queries],
+        number=number,
+    )
+    indexed = timeit.timeit(
+        lambda: [recover_alia(q, alia_dict) for q in queries],
+        number=number,
+    )
+    total = len(queries) * number
+    print(f"legacy : {legacy / total * 1e6:8.2f} us/query")
+    print(f"indexed: {indexed / total * 1e6:8.2f} us/query")
+    print(f"speedup: {legacy / indexed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# 对比 draw_summary_gacha_img 使用解码图片缓存、局部圆角蒙版与学生卡片缓存前后的耗时
+# 学生图片请求会被替换为读取本地图片，只测量绘制部分
+# 运行：python benchmarks/gacha_summary_img.py
+
+import asyncio
+import random
+import time
+from io import BytesIO
+
+from _util import load_plugin
+
+load_plugin()
+
+import anyio
+from pil_utils import BuildImage
+
+from nonebot_plugin_bawiki.data import gacha
+from nonebot_plugin_bawiki.resource import GACHA_STU_ERR_PATH
+from nonebot_plugin_bawiki.util import (
+    circle_corner,
+    read_image,
+    read_image_resized,
+)
+
+
+async def legacy_read_image(path, mode=None) -> BuildImage:
+    image = BuildImage.open(BytesIO(await anyio.Path(path).read_bytes()))
+    return image.convert(mode) if mode else image
+
+
+async def legacy_read_image_resized(path, size, keep_ratio=False, mode=None):
+    return (await legacy_read_image(path, mode)).resize(size, keep_ratio=keep_ratio)
+
+
+# 改动前每次都重新绘制学生卡片，不经过卡片缓存
+def legacy_get_student_sprite(student, stu_img, assets) -> BuildImage:
+    image = BuildImage.open(BytesIO(stu_img)) if stu_img else assets.stu_err
+    portrait = gacha.render_student_portrait(image, assets)
+    return gacha.render_student_sprite(student, portrait, assets)
+
+
+def make_result(pulls: int):
+    rand = random.Random(1919810)
+    return [
+        gacha.GachaStudent(
+            id=rand.randint(10000, 10060),
+            name="测试学生",
+            star=(star := rand.choices([3, 2, 1], [3, 18.5, 78.5])[0]),
+            new=rand.random() < 0.2,
+            pickup=star == 3 and rand.random() < 0.3,
+            count=i,
+        )
+        for i in range(1, pulls + 1)
+    ]
+
+
+async def bench(label: str, rounds: int = 5):
+    result = make_result(200)
+    await gacha.draw_summary_gacha_img(result)  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await gacha.draw_summary_gacha_img(result)
+    cost = (time.perf_counter() - start) / rounds
+    print(f"{label}: {cost * 1000:8.2f} ms/render")
+    return cost
+
+
+async def main():
+    stu_img = GACHA_STU_ERR_PATH.read_bytes()
+
+    async def fake_schale_get(*_, **__):
+        return stu_img
+
+    gacha.schale_get = fake_schale_get
+
+    get_student_sprite = gacha.get_student_sprite
+    gacha.read_image = legacy_read_image
+    gacha.read_image_resized = legacy_read_image_resized
+    gacha.circle_corner = lambda image, r: image.circle_corner(r)
+    gacha.get_student_sprite = legacy_get_student_sprite
+    before = await bench("before")
+
+    gacha.read_image = read_image
+    gacha.read_image_resized = read_image_resized
+    gacha.circle_corner = circle_corner
+    gacha.get_student_sprite = get_student_sprite
+    after = await bench("after ")
+
+    print(f"speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
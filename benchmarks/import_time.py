@@ -0,0 +1,97 @@
+# 用 `python -X importtime` 测量插件加载耗时，并检查较重的依赖没有在加载时被导入
+# 每轮都在新的解释器中加载插件，取各轮的中位数
+# 运行：python benchmarks/import_time.py [轮数]
+
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PLUGIN = "nonebot_plugin_bawiki"
+BENCH_DIR = Path(__file__).parent
+
+# 这些模块只在用到对应功能时才导入，出现在加载过程中说明又被提前导入了
+# matplotlib 本体会被 pil_utils 导入，所以只检查绘图相关的子模块
+LAZY_MODULES = [
+    "pypinyin",
+    "matplotlib.figure",
+    "matplotlib.axes",
+    "matplotlib.dates",
+    "bs4",
+    "lxml.etree",
+    "pytz",
+]
+TOP_N = 15
+
+MARKER = "--- bawiki load ---"
+# nonebot 加载插件时不经过 import 语句，importtime 不会记录插件包本身，
+# 所以在子进程里自己计时，并只统计标记之后的导入记录
+LOAD_CODE = f"""
+import sys
+import time
+sys.path.insert(0, {str(BENCH_DIR)!r})
+import nonebot
+import nonebot.adapters.onebot.v11
+from _util import load_plugin
+print({MARKER!r}, file=sys.stderr, flush=True)
+start = time.perf_counter()
+load_plugin()
+print({MARKER!r}, time.perf_counter() - start, file=sys.stderr, flush=True)
+"""
+LINE_REGEX = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def run_once() -> Tuple[float, Dict[str, int]]:
+    """返回插件加载耗时（秒）与加载期间导入的模块的自身耗时（us）"""
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", LOAD_CODE],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    lines = proc.stderr.splitlines()
+    begin = lines.index(MARKER)
+    end = next(i for i, x in enumerate(lines) if i > begin and x.startswith(MARKER))
+    self_times = {
+        m[4]: int(m[1])
+        for line in lines[begin + 1 : end]
+        if (m := LINE_REGEX.match(line))
+    }
+    return float(lines[end].split()[-1]), self_times
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    run_once()  # 预热，生成 pyc 缓存
+
+    totals: List[float] = []
+    self_times: Dict[str, List[int]] = {}
+    for _ in range(rounds):
+        total, times = run_once()
+        totals.append(total)
+        for name, us in times.items():
+            self_times.setdefault(name, []).append(us)
+
+    total = statistics.median(totals)
+    print(f"plugin load: {total * 1000:8.2f} ms (median of {rounds})")
+    print()
+    print(f"top {TOP_N} modules by self time:")
+    medians = sorted(
+        ((statistics.median(v), k) for k, v in self_times.items()),
+        reverse=True,
+    )
+    for us, name in medians[:TOP_N]:
+        print(f"  {us / 1000:8.2f} ms  {name}")
+
+    print()
+    if imported := [x for x in LAZY_MODULES if x in self_times]:
+        print(f"eagerly imported lazy modules: {', '.join(imported)}")
+        sys.exit(1)
+    print("lazy modules: ok")
+
+
+if __name__ == "__main__":
+    main()
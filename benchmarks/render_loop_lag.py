@@ -0,0 +1,70 @@
+# 对比绘图在事件循环中执行与提交到线程池 / 进程池时的事件循环延迟
+# 同时发起多个 draw_summary_gacha_img，另起一个任务每 10ms 醒来一次，记录实际醒来的延迟
+# 运行：python benchmarks/render_loop_lag.py
+
+import asyncio
+import time
+
+from _util import load_plugin
+
+load_plugin()
+
+from gacha_summary_img import make_result
+
+from nonebot_plugin_bawiki.config import config
+from nonebot_plugin_bawiki.data import gacha
+from nonebot_plugin_bawiki.resource import GACHA_STU_ERR_PATH
+from nonebot_plugin_bawiki.util import shutdown_render_executor
+
+CONCURRENCY = 4
+TICK = 0.01
+
+
+async def measure_lag(stop: asyncio.Event):
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+    return lags
+
+
+async def bench(executor: str):
+    config.ba_render_executor = executor  # type: ignore
+    shutdown_render_executor()
+
+    result = make_result(200)
+    await gacha.draw_summary_gacha_img(result)  # 预热
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(gacha.draw_summary_gacha_img(result) for _ in range(CONCURRENCY)),
+    )
+    cost = time.perf_counter() - start
+    stop.set()
+    lags = sorted(await lag_task)
+
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0
+    print(
+        f"{executor:>7}: total {cost * 1000:8.2f} ms, "
+        f"loop lag max {lags[-1] * 1000:8.2f} ms, p99 {p99 * 1000:8.2f} ms",
+    )
+
+
+async def main():
+    stu_img = GACHA_STU_ERR_PATH.read_bytes()
+
+    async def fake_schale_get(*_, **__):
+        return stu_img
+
+    gacha.schale_get = fake_schale_get
+
+    for executor in ("none", "thread", "process"):
+        await bench(executor)
+    shutdown_render_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
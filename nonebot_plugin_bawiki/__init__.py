@@ -4,7 +4,7 @@ from nonebot.plugin import PluginMetadata
 require("nonebot_plugin_apscheduler")
 require("nonebot_plugin_htmlrender")
 
-from .command import load_commands  # noqa: E402
+from .command import load_commands, sort_help  # noqa: E402
 from .config import Cfg as Cfg  # noqa: E402
 from .help import extra, register_help_cmd, usage  # noqa: E402
 
@@ -25,3 +25,7 @@ if extra:
 
 register_help_cmd()
 load_commands()
+
+# PicMenu 会直接读取帮助列表，所以要在加载完指令后马上排序
+if extra:
+    sort_help()
@@ -3,7 +3,6 @@ from pathlib import Path
 from typing import List, TypedDict
 
 from nonebot import logger
-from pypinyin import lazy_pinyin
 
 
 class HelpDict(TypedDict):
@@ -17,10 +16,23 @@ class HelpDict(TypedDict):
 HelpList = List[HelpDict]
 
 help_list: HelpList = []
+help_list_sorted = False
 
 
 def sort_help():
+    global help_list_sorted
+
+    # pypinyin 导入时会加载很大的词典，所以帮助列表在第一次用到时才排序
+    from pypinyin import lazy_pinyin
+
     help_list.sort(key=lambda x: "".join(lazy_pinyin(x["func"])))
+    help_list_sorted = True
+
+
+def get_help_list() -> HelpList:
+    if not help_list_sorted:
+        sort_help()
+    return help_list
 
 
 def append_and_sort_help(help_dict: HelpDict):
@@ -29,6 +41,8 @@ def append_and_sort_help(help_dict: HelpDict):
 
 
 def load_commands():
+    global help_list_sorted
+
     for module in Path(__file__).parent.iterdir():
         if module.name.startswith("_"):
             continue
@@ -41,4 +55,4 @@ def load_commands():
         else:
             help_list.extend(module.help_list)
 
-    sort_help()
+    help_list_sorted = False
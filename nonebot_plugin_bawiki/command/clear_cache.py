@@ -7,7 +7,11 @@ from nonebot.permission import SUPERUSER
 
 from ..help import FT_E, FT_S
 from ..resource import CACHE_DIR
-from ..util import clear_wrapped_alru_cache
+from ..util import (
+    clear_wrapped_alru_cache,
+    format_size,
+    get_wrapped_alru_cache_memory,
+)
 
 if TYPE_CHECKING:
     from . import HelpList
@@ -51,6 +55,10 @@ cmd_clear_cache = on_command("ba清空缓存", aliases={"ba清除缓存"}, permi
 
 @cmd_clear_cache.handle()
 async def _(matcher: Matcher):
+    req_memory = get_wrapped_alru_cache_memory()
     req_count = clear_wrapped_alru_cache()
     cache_count = clear_cache_dir()
-    await matcher.finish(f"已清除 {req_count} 项请求缓存与 {cache_count} 项文件缓存～")
+    await matcher.finish(
+        f"已清除 {req_count} 项请求缓存（占用内存约 {format_size(req_memory)}）"
+        f"与 {cache_count} 项文件缓存～",
+    )
@@ -9,11 +9,13 @@ from nonebot.params import CommandArg
 from nonebot.typing import T_State
 
 from ..config import config
-from ..data.bawiki import db_get_gacha_data, db_get_stu_alias
+from ..data.bawiki import db_get_gacha_data, recover_stu_alia
 from ..data.gacha import gacha, get_gacha_cool_down, set_gacha_cool_down
+from ..data.gacha_pool import get_compiled_gacha_pool
+from ..data.gacha_sim import render_gacha_sim_chart, simulate_gacha
 from ..data.schaledb import schale_get_stu_dict
 from ..help import FT_E, FT_S
-from ..util import recover_alia
+from ..util import run_render
 
 if TYPE_CHECKING:
     from . import HelpList
@@ -55,11 +57,31 @@ help_list: "HelpList" = [
             f"- {FT_S}ba切换卡池 小桃 小绿{FT_E}"
         ),
     },
+    {
+        "func": "抽卡模拟统计",
+        "trigger_method": "指令",
+        "trigger_condition": "ba抽卡模拟",
+        "brief_des": "统计抽卡出UP的概率",
+        "detail_des": (
+            "对卡池进行大量模拟抽卡，统计抽到UP学生的次数分布、首次抽到UP的抽数，以及需要井的概率\n"
+            "卡池没有UP时统计的是3星学生\n"
+            "参数依次为卡池、每次模拟的抽数（默认200）、模拟次数（默认10000），均可省略\n"
+            f"卡池可以填 {FT_S}常驻{FT_E} 或 {FT_S}ba切换卡池{FT_E} 中展示的序号，"
+            "省略时使用当前切换到的卡池\n"
+            "只填数字时，依次视为抽数与模拟次数\n"
+            " \n"
+            "指令示例：\n"
+            f"- {FT_S}ba抽卡模拟{FT_E}\n"
+            f"- {FT_S}ba抽卡模拟 100{FT_E}\n"
+            f"- {FT_S}ba抽卡模拟 常驻 200 50000{FT_E}"
+        ),
+    },
 ]
 
 
 cmd_change_pool = on_command("ba切换卡池")
 cmd_gacha_once = on_command("ba抽卡", aliases={"ba招募"})
+cmd_gacha_sim = on_command("ba抽卡模拟")
 
 
 @dataclass()
@@ -101,13 +123,13 @@ async def _(
             pool = []
             try:
                 stu_li = await schale_get_stu_dict()
-                stu_alias = await db_get_stu_alias()
+                stu_names = [await recover_stu_alia(x) for x in arg.split()]
             except Exception:
                 logger.exception("获取学生列表或别名失败")
                 await matcher.finish("获取学生列表或别名失败，请检查后台输出")
 
-            for i in arg.split():
-                if not (stu := stu_li.get(recover_alia(i, stu_alias))):
+            for i, name in zip(arg.split(), stu_names):
+                if not (stu := stu_li.get(name)):
                     await matcher.finish(f"未找到学生 {i}")
                 if stu["StarGrade"] == 1:
                     await matcher.finish("不能UP一星角色")
@@ -215,3 +237,102 @@ async def _(
     await matcher.finish(
         MessageSegment.at(event.user_id) + f"当前抽取卡池：{pool_obj.name}" + img,
     )
+
+
+@cmd_gacha_sim.handle()
+async def _(
+    matcher: Matcher,
+    event: MessageEvent,
+    cmd_arg: Message = CommandArg(),
+):
+    # 与真实抽卡分开计算冷却，模拟不影响之后的抽卡
+    session_id = f"sim_{event.get_session_id()}"
+
+    if cool_down := get_gacha_cool_down(session_id):
+        await matcher.finish(f"你先别急，先等 {cool_down} 秒再来模拟吧qwq")
+
+    args = cmd_arg.extract_plain_text().strip().split()
+    if len(args) > 3:
+        await matcher.finish("参数过多")
+
+    try:
+        gacha_data = await db_get_gacha_data()
+        stu_li = await schale_get_stu_dict("Id")
+    except Exception:
+        logger.exception("获取抽卡基本数据失败")
+        await matcher.finish("获取抽卡基本数据失败，请检查后台输出")
+
+    pool_obj = (
+        gacha_pool_index.get(event.get_user_id())
+        or get_1st_pool(gacha_data)
+        or STATIC_POOL
+    )
+    if args and (len(args) == 3 or not args[0].isdigit()):
+        pool_arg = args.pop(0)
+        pool_data = gacha_data.get("current_pools") or []
+        if "常驻" in pool_arg:
+            pool_obj = STATIC_POOL
+        elif pool_arg.isdigit() and 1 <= (index := int(pool_arg)) <= len(pool_data):
+            pool_obj = GachaPool(**pool_data[index - 1])
+        else:
+            await matcher.finish("请输入有效的卡池序号")
+
+    if not all(x.isdigit() for x in args):
+        await matcher.finish("请输入有效的整数")
+    pulls, trials = [int(x) for x in args] + [200, 10000][len(args) :]
+
+    if not (1 <= pulls <= config.ba_gacha_sim_max_pulls):
+        await matcher.finish(
+            f"请输入有效的抽数，在1~{config.ba_gacha_sim_max_pulls}之间",
+        )
+    if not (1 <= trials <= config.ba_gacha_sim_max_trials):
+        await matcher.finish(
+            f"请输入有效的模拟次数，在1~{config.ba_gacha_sim_max_trials}之间",
+        )
+
+    pool = get_compiled_gacha_pool(gacha_data, pool_obj.pool, stu_li)
+    if pool.up_3 or pool.up_2:
+        targets = list(pool.up_3 or pool.up_2)
+        target_name = "UP学生"
+    else:
+        targets = [
+            x
+            for x in pool.table.chars.tolist()
+            if stu_li.get(x, {}).get("StarGrade") == 3
+        ]
+        target_name = "3星学生"
+
+    set_gacha_cool_down(session_id)
+    try:
+        result = await run_render(
+            simulate_gacha,
+            pool,
+            targets,
+            target_name,
+            pulls,
+            trials,
+        )
+        chart = await run_render(render_gacha_sim_chart, result)
+    except Exception:
+        logger.exception("抽卡模拟出错")
+        await matcher.finish("抽卡模拟出错了，请检查后台输出")
+
+    median = result.first_median
+    lines = [
+        f"模拟卡池：{pool_obj.name}",
+        f"共模拟 {trials} 次，每次 {pulls} 抽，统计目标：{target_name}",
+        f"{pulls} 抽内至少抽到一次的概率：{result.hit_any_rate:.2%}",
+        f"{pulls} 抽内平均抽到次数：{result.hits_mean:.2f}",
+        (
+            f"半数老师在第 {median} 抽前抽到"
+            if median
+            else f"{pulls} 抽内抽到的概率没有过半，半数老师未出"
+        ),
+        f"200 抽内没有抽到、需要井的概率：{result.spark_rate:.2%}",
+        f"算上井的期望抽数：{result.first_mean_with_spark:.1f}",
+    ]
+    await matcher.finish(
+        MessageSegment.at(event.user_id)
+        + "\n".join(lines)
+        + MessageSegment.image(chart),
+    )
@@ -8,6 +8,7 @@ from nonebot.params import ShellCommandArgs
 from nonebot.rule import ArgumentParser, Namespace
 
 from ..data.logo_generate import get_logo
+from ..data.playwright import RenderQueueFullError
 from ..help import FT_E, FT_S
 
 if TYPE_CHECKING:
@@ -61,6 +62,8 @@ async def _(matcher: Matcher, err: ParserExit = ShellCommandArgs()):
 async def _(matcher: Matcher, arg: Namespace = ShellCommandArgs()):
     try:
         b64_url = await get_logo(arg.text_l, arg.text_r, (not arg.no_transparent))
+    except RenderQueueFullError:
+        await matcher.finish("当前渲染任务过多，请稍后再试")
     except Exception:
         logger.exception("Error when generating image")
         await matcher.finish("遇到错误，请检查后台输出")
@@ -9,6 +9,7 @@ from nonebot.params import CommandArg
 from nonebot.typing import T_State
 
 from ..config import config
+from ..data.playwright import RenderQueueFullError
 from ..data.shittim_chest import (
     RAID_ANALYSIS_URL,
     RANK_DATA_TYPE_NAME_MAP,
@@ -174,6 +175,8 @@ async def _(matcher: Matcher, state: T_State, arg_msg: Message = CommandArg()):
             raid_chart,
             participation_chart,
         )
+    except RenderQueueFullError:
+        await matcher.finish("当前渲染任务过多，请稍后再试")
     except Exception:
         logger.exception("Error when rendering image")
         await matcher.finish("渲染图片时出错，请检查后台输出")
@@ -188,6 +191,8 @@ cmd_raid_analysis = on_command("ba总力统计")
 async def _(matcher: Matcher):
     try:
         img = await render_raid_analysis()
+    except RenderQueueFullError:
+        await matcher.finish("当前渲染任务过多，请稍后再试")
     except Exception:
         logger.exception("Error when rendering image")
         await matcher.finish("渲染图片时出错，请检查后台输出")
@@ -225,6 +230,8 @@ async def _(matcher: Matcher, state: T_State, arg_msg: Message = CommandArg()):
 
     try:
         img = await render_rank_detail(title, season_list, rank_list)
+    except RenderQueueFullError:
+        await matcher.finish("当前渲染任务过多，请稍后再试")
     except Exception:
         logger.exception("Error when rendering image")
         await matcher.finish("渲染图片时出错，请检查后台输出")
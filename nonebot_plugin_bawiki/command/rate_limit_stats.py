@@ -0,0 +1,42 @@
+from typing import TYPE_CHECKING
+
+from nonebot import on_command
+from nonebot.matcher import Matcher
+from nonebot.permission import SUPERUSER
+
+from ..data.shittim_chest import shittim_rate_limiter
+from ..help import FT_E, FT_S
+
+if TYPE_CHECKING:
+    from . import HelpList
+
+help_list: "HelpList" = [
+    {
+        "func": "限速统计",
+        "trigger_method": "超级用户 指令",
+        "trigger_condition": "ba限速统计",
+        "brief_des": "查看什亭之匣 API 的限速情况",
+        "detail_des": (
+            "查看什亭之匣 API 请求的限速设置，以及请求因限速而等待的次数与耗时\n"
+            f"注：该指令只能由{FT_S}超级用户{FT_E}触发"
+        ),
+    },
+]
+
+
+cmd_rate_limit_stats = on_command("ba限速统计", permission=SUPERUSER)
+
+
+@cmd_rate_limit_stats.handle()
+async def _(matcher: Matcher):
+    stats = shittim_rate_limiter.stats
+    desc = (
+        f"每秒 {shittim_rate_limiter.rate:g} 次，突发 {shittim_rate_limiter.burst} 次"
+        if shittim_rate_limiter.enabled
+        else "未限速"
+    )
+    await matcher.finish(
+        f"【什亭之匣 API】{desc}\n"
+        f"请求 {stats.count} 次，其中 {stats.waited} 次需要等待\n"
+        f"等待 平均 {stats.wait_avg:.2f}s / 最长 {stats.wait_max:.2f}s",
+    )
@@ -0,0 +1,46 @@
+from typing import TYPE_CHECKING
+
+from nonebot import on_command
+from nonebot.matcher import Matcher
+from nonebot.permission import SUPERUSER
+
+from ..data.playwright import page_pool, render_scheduler
+from ..help import FT_E, FT_S
+
+if TYPE_CHECKING:
+    from . import HelpList
+
+help_list: "HelpList" = [
+    {
+        "func": "渲染统计",
+        "trigger_method": "超级用户 指令",
+        "trigger_condition": "ba渲染统计",
+        "brief_des": "查看浏览器渲染队列状态",
+        "detail_des": (
+            "查看浏览器渲染队列的当前状态，以及各类渲染任务的排队与渲染耗时\n"
+            f"注：该指令只能由{FT_S}超级用户{FT_E}触发"
+        ),
+    },
+]
+
+
+cmd_render_stats = on_command("ba渲染统计", permission=SUPERUSER)
+
+
+@cmd_render_stats.handle()
+async def _(matcher: Matcher):
+    lines = [
+        f"运行中：{render_scheduler.running}/{render_scheduler.max_concurrency}",
+        f"排队中：{render_scheduler.queued}/{render_scheduler.max_queue}",
+        f"页面：空闲 {page_pool.idle_count} / "
+        f"打开 {page_pool.live}/{page_pool.max_size}",
+    ]
+    for job_type, stats in render_scheduler.stats.items():
+        lines.append(
+            f"\n【{job_type}】完成 {stats.count} 次，失败 {stats.failed} 次，"
+            f"拒绝 {stats.rejected} 次\n"
+            f"排队 平均 {stats.wait_avg:.2f}s / 最长 {stats.wait_max:.2f}s\n"
+            f"渲染 平均 {stats.render_avg:.2f}s / 最长 {stats.render_max:.2f}s",
+        )
+
+    await matcher.finish("\n".join(lines))
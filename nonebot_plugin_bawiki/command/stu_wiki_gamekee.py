@@ -9,10 +9,11 @@ from nonebot.params import CommandArg
 from ..config import config
 from ..data.bawiki import recover_stu_alia
 from ..data.gamekee import (
-    game_kee_get_page,
     game_kee_get_stu_cid_li,
+    game_kee_get_stu_page,
     game_kee_page_url,
 )
+from ..data.playwright import RenderQueueFullError
 from ..help import FT_E, FT_S
 from ..util import send_forward_msg
 
@@ -66,7 +67,9 @@ async def _(
     await matcher.send(f"请稍等，正在截取Wiki页面……\n{url}")
 
     try:
-        images = await game_kee_get_page(url)
+        images = await game_kee_get_stu_page(sid)
+    except RenderQueueFullError:
+        await matcher.finish("当前截图任务过多，请稍后再试")
     except Exception:
         logger.exception(f"截取wiki页面出错 {url}")
         await matcher.finish("截取页面出错，请检查后台输出")
@@ -8,6 +8,7 @@ from nonebot.params import CommandArg
 
 from ..config import config
 from ..data.bawiki import recover_stu_alia
+from ..data.playwright import RenderQueueFullError
 from ..data.schaledb import schale_get_stu_dict, schale_get_stu_info
 from ..help import FT_E, FT_S
 
@@ -59,6 +60,8 @@ async def _(matcher: Matcher, cmd_arg: Message = CommandArg()):
 
     try:
         img = MessageSegment.image(await schale_get_stu_info(stu_name))
+    except RenderQueueFullError:
+        await matcher.finish("当前截图任务过多，请稍后再试")
     except Exception:
         logger.exception(f"截取schale db页面出错 chara={stu_name}")
         await matcher.finish("截取页面出错，请检查后台输出")
@@ -1,10 +1,35 @@
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 from typing_extensions import Annotated
 
 from nonebot import get_plugin_config
 from pydantic import BaseModel, Field, HttpUrl
 
 
+class SiteFilterCfg(BaseModel):
+    allow_domains: List[str] = Field(default_factory=list)
+    block_domains: List[str] = Field(default_factory=list)
+    block_resource_types: Optional[List[str]] = None
+
+
+DEFAULT_SCREENSHOT_BLOCK_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "static.cloudflareinsights.com",
+    "clarity.ms",
+    "hotjar.com",
+    "sentry.io",
+    "plausible.io",
+    "connect.facebook.net",
+    "hm.baidu.com",
+    "cnzz.com",
+    "umeng.com",
+]
+
+
 class Cfg(BaseModel):
     ba_proxy: Optional[str] = None
     ba_shittim_proxy: Optional[str] = None
@@ -12,14 +37,29 @@ class Cfg(BaseModel):
     ba_voice_use_card: bool = False
     ba_use_forward_msg: bool = True
     ba_screenshot_timeout: int = 60
+    ba_screenshot_cache: bool = True
+    ba_screenshot_filter: bool = True
+    ba_screenshot_block_domains: List[str] = Field(
+        default_factory=lambda: DEFAULT_SCREENSHOT_BLOCK_DOMAINS.copy(),
+    )
+    ba_screenshot_block_resource_types: List[str] = Field(
+        default_factory=lambda: ["media", "ping"],
+    )
+    ba_screenshot_site_filters: Dict[str, SiteFilterCfg] = Field(default_factory=dict)
+    ba_screenshot_asset_cache_ttl: int = 86400  # 1 day
+    ba_screenshot_asset_cache_max_mb: float = 256
     ba_disable_classic_gacha: bool = False
     ba_gacha_max: int = 200
+    ba_gacha_sim_max_pulls: int = 1000
+    ba_gacha_sim_max_trials: int = 100000
     ba_illegal_limit: int = 3
     ba_arona_set_alias_only_su: bool = False
 
     ba_gamekee_url: Annotated[str, HttpUrl] = Field("https://ba.gamekee.com/")
     ba_schale_url: Annotated[str, HttpUrl] = Field("https://schale.gg/")
+    ba_schale_mirror_urls: List[str] = Field(default_factory=list)
     ba_bawiki_db_url: Annotated[str, HttpUrl] = Field("https://bawiki.lgc2333.top/")
+    ba_bawiki_db_mirror_urls: List[str] = Field(default_factory=list)
     ba_arona_api_url: Annotated[str, HttpUrl] = Field("https://arona.diyigemt.com/")
     ba_arona_cdn_url: Annotated[str, HttpUrl] = Field("https://arona.cdn.diyigemt.com/")
     ba_shittim_url: Annotated[str, HttpUrl] = Field("https://arona.icu/")
@@ -28,12 +68,42 @@ class Cfg(BaseModel):
 
     ba_shittim_key: Optional[str] = None
     ba_shittim_request_delay: float = 0
+    ba_shittim_page_concurrency: int = 4
+    ba_shittim_rate_limit: float = 0
+    ba_shittim_rate_burst: int = 1
+    ba_shittim_local_store: bool = True
 
     ba_req_retry: int = 1
     ba_req_cache_ttl: int = 10800  # 3 hrs
+    ba_req_cache_max_stale: int = 1800  # 30 mins
     ba_shittim_req_cache_ttl: int = 600  # 10 mins
+    ba_req_cache_max_mb: float = 256
+    ba_req_cache_json_max_mb: float = 96
+    ba_req_cache_binary_max_mb: float = 192
+    ba_req_disk_cache: bool = True
+    ba_req_disk_cache_max_mb: float = 512
     ba_req_timeout: Optional[float] = 10.0
+    ba_req_max_connections: int = 100
+    ba_req_max_keepalive_connections: int = 20
+    ba_req_keepalive_expiry: float = 30.0
+    ba_req_circuit_breaker_threshold: int = 3
+    ba_req_circuit_breaker_cooldown: float = 60.0
+    ba_req_hedge: bool = False
+    ba_req_hedge_percentile: float = 90.0
     ba_auto_clear_cache_path: bool = False
 
+    ba_render_executor: Literal["thread", "process", "none"] = "thread"
+    ba_render_workers: Optional[int] = None
+    ba_page_pool_size: int = 4
+    ba_page_pool_max_uses: int = 50
+    ba_page_pool_warmup: int = 1
+    ba_res_cache_max_mb: float = 64
+    ba_gacha_card_cache_max_mb: float = 64
+    ba_gacha_card_disk_cache: bool = True
+    ba_gacha_card_disk_cache_max_mb: float = 128
+    ba_chart_cache_max_mb: float = 64
+    ba_render_queue_max: int = 20
+    ba_render_queue_user_max: int = 2
+
 
 config = get_plugin_config(Cfg)
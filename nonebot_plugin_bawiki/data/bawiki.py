@@ -1,7 +1,7 @@
 import asyncio
 import datetime
 from io import BytesIO
-from typing import Any, Dict, List, Literal, Optional, cast
+from typing import Any, Dict, List, Literal, Optional, Tuple, cast
 from typing_extensions import Unpack
 
 from nonebot import logger
@@ -9,16 +9,30 @@ from nonebot.adapters.onebot.v11 import Message, MessageSegment
 from pil_utils import BuildImage
 
 from ..config import config
-from ..util import AsyncReqKwargs, RespType as Rt, async_req, recover_alia
-
-
-async def db_get(suffix: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
-    kwargs["base_urls"] = config.ba_bawiki_db_url
-    return await async_req(suffix, **kwargs)
+from ..util import (
+    AsyncReqKwargs,
+    RespType as Rt,
+    SearchIndex,
+    async_req,
+    recover_alia,
+    stale_async_req,
+)
+from .schaledb import schale_get_stu_data
+
+
+async def db_get(
+    suffix: str,
+    *,
+    stale: bool = False,
+    **kwargs: Unpack[AsyncReqKwargs],
+) -> Any:
+    kwargs["base_urls"] = [config.ba_bawiki_db_url, *config.ba_bawiki_db_mirror_urls]
+    kwargs.setdefault("disk_cache", True)
+    return await (stale_async_req if stale else async_req)(suffix, **kwargs)
 
 
 async def db_get_wiki_data() -> Dict[str, Any]:
-    return await db_get("data/wiki.json")
+    return await db_get("data/wiki.json", stale=True)
 
 
 async def db_get_stu_alias() -> Dict[str, List[str]]:
@@ -60,8 +74,45 @@ async def schale_to_gamekee(o: str) -> str:
     return o.replace("(", "（").replace(")", "）")
 
 
+stu_search_index_cache: Optional[Tuple[dict, list, SearchIndex]] = None
+
+
+async def get_stu_search_index() -> SearchIndex:
+    global stu_search_index_cache
+
+    stu_alias = await db_get_stu_alias()
+    try:
+        stu_data = await schale_get_stu_data()
+    except Exception as e:
+        logger.warning(f"Failed to get student list, search by alias only: {e!r}")
+        stu_data = []
+
+    # 数据来自请求缓存，对象没变就说明数据没变
+    if (
+        stu_search_index_cache
+        and stu_search_index_cache[0] is stu_alias
+        and stu_search_index_cache[1] is stu_data
+    ):
+        return stu_search_index_cache[2]
+
+    entries: Dict[str, List[str]] = {x["Name"]: [] for x in stu_data}
+    for k, v in stu_alias.items():
+        entries.setdefault(k, []).extend(v)
+
+    index = SearchIndex(entries.items())
+    stu_search_index_cache = (stu_alias, stu_data, index)
+    return index
+
+
 async def recover_stu_alia(a: str, game_kee: bool = False) -> str:
-    ret = recover_alia(a, await db_get_stu_alias())
+    stu_alias = await db_get_stu_alias()
+    ret = recover_alia(a, stu_alias)
+
+    # 别名匹配不到时，尝试拼音与错字搜索
+    if (ret not in stu_alias) and (
+        searched := (await get_stu_search_index()).search_best(a)
+    ):
+        ret = searched
 
     if game_kee:
         ret = await schale_to_gamekee(ret)
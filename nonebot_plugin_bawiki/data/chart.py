@@ -0,0 +1,85 @@
+import secrets
+import shutil
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
+
+import anyio
+
+from ..config import config
+from ..resource import CACHE_DIR
+from ..util import DiskCacheLimit, make_fingerprint, mb_to_bytes, run_render
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+T = TypeVar("T")
+
+CHART_CACHE_DIR = CACHE_DIR / "chart"
+if config.ba_auto_clear_cache_path and CHART_CACHE_DIR.exists():
+    shutil.rmtree(CHART_CACHE_DIR)
+if not CHART_CACHE_DIR.exists():
+    CHART_CACHE_DIR.mkdir(parents=True)
+
+# 修改了图表样式后需要增加这个值，让旧的缓存失效
+CHART_CACHE_VERSION = 1
+
+# 进行中的赛季数据每次刷新都会得到新的图表，所以要限制缓存文件夹的大小
+chart_cache_limit = DiskCacheLimit(
+    CHART_CACHE_DIR,
+    mb_to_bytes(config.ba_chart_cache_max_mb),
+)
+
+
+# 不使用 pyplot：pyplot 会在全局记录每一个创建的 figure，不手动关闭就不会被释放，
+# 而且它的全局状态不是线程安全的；直接创建 Figure 与 Agg 画布则没有这些问题
+# matplotlib.figure 导入很慢，在第一次绘图时再导入
+
+
+def new_figure(width: int, height: int, multiplier: float = 2, **kwargs) -> "Figure":
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(
+        figsize=(width / 100, height / 100),
+        dpi=100 * multiplier,
+        **kwargs,
+    )
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def save_figure(figure: "Figure", **kwargs) -> bytes:
+    bio = BytesIO()
+    try:
+        figure.savefig(bio, format="png", **kwargs)
+    finally:
+        figure.clear()
+    return bio.getvalue()
+
+
+async def render_chart_cached(
+    func: Callable[[T], bytes],
+    data: T,
+    fingerprint: Any,
+) -> bytes:
+    """在绘图线程 / 进程池中绘制图表，结果按图表数据的指纹缓存到磁盘"""
+
+    key = make_fingerprint(
+        CHART_CACHE_VERSION,
+        func.__module__,
+        func.__qualname__,
+        fingerprint,
+    )
+    path = anyio.Path(CHART_CACHE_DIR / f"{key}.png")
+    if await path.exists():
+        img = await path.read_bytes()
+        # 更新修改时间，清理缓存时最近用到的图表会留到最后
+        await path.touch()
+        return img
+
+    img = await run_render(func, data)
+    tmp_path = path.with_name(f"{path.name}.{secrets.token_hex(4)}")
+    await tmp_path.write_bytes(img)
+    await tmp_path.replace(path)
+    await chart_cache_limit.record_write(len(img))
+    return img
@@ -1,22 +1,25 @@
 import asyncio
-import json
-import random
+import secrets
+import shutil
+import threading
 import time
+import zlib
+from collections import OrderedDict
 from dataclasses import dataclass
 from io import BytesIO
-from typing import Any, Dict, List, Optional, cast
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional
 
-import anyio
+import numpy as np
 from nonebot import logger
 from nonebot.adapters.onebot.v11 import MessageSegment
-from nonebot.compat import model_dump
+from PIL import Image
 from pil_utils import BuildImage, Text2Image
-from pydantic import BaseModel, Field
 
 from ..config import config
 from ..resource import (
+    CACHE_DIR,
     CALENDER_BANNER_PATH,
-    DATA_DIR,
     GACHA_BG_OLD_PATH,
     GACHA_BG_PATH,
     GACHA_CARD_BG_PATH,
@@ -26,21 +29,38 @@ from ..resource import (
     GACHA_STAR_PATH,
     GACHA_STU_ERR_PATH,
 )
-from ..util import RespType, read_image, split_list
+from ..util import (
+    DiskCacheLimit,
+    RespType,
+    circle_corner,
+    i2b,
+    mb_to_bytes,
+    read_image,
+    read_image_resized,
+    run_render,
+    split_list,
+)
+from .gacha_pool import get_compiled_gacha_pool
+from .gacha_store import add_collected
 from .schaledb import schale_get, schale_get_stu_dict
 
-GACHA_DATA_PATH = DATA_DIR / "gacha.json"
-if not GACHA_DATA_PATH.exists():
-    GACHA_DATA_PATH.write_text("{}")
+GACHA_CARD_CACHE_DIR = CACHE_DIR / "gacha_card"
+if config.ba_auto_clear_cache_path and GACHA_CARD_CACHE_DIR.exists():
+    shutil.rmtree(GACHA_CARD_CACHE_DIR)
+if not GACHA_CARD_CACHE_DIR.exists():
+    GACHA_CARD_CACHE_DIR.mkdir(parents=True)
+
+# 文件名中带有学生图片的哈希，学生立绘更新后旧的卡片不会再被用到，所以要限制文件夹大小
+# 卡片可能在绘图进程中写入，统计不到写入量，所以只在每次绘制完成后按时间间隔检查
+gacha_card_cache_limit = DiskCacheLimit(
+    GACHA_CARD_CACHE_DIR,
+    mb_to_bytes(config.ba_gacha_card_disk_cache_max_mb),
+)
 
 
 COOL_DOWN_DICT: Dict[str, float] = {}
 
 
-class GachaData(BaseModel):
-    collected: List[int] = Field(default_factory=list)
-
-
 @dataclass()
 class GachaStudent:
     id: int  # noqa: A003
@@ -71,21 +91,6 @@ def set_gacha_cool_down(session_id: str):
     COOL_DOWN_DICT[session_id] = time.time()
 
 
-async def set_gacha_data(user_id: str, data: GachaData):
-    path = anyio.Path(GACHA_DATA_PATH)
-    j = json.loads(await path.read_text(encoding="u8"))
-    j[user_id] = model_dump(data)
-    await path.write_text(json.dumps(j), encoding="u8")
-
-
-async def get_gacha_data(user_id: str) -> GachaData:
-    j = await anyio.Path(GACHA_DATA_PATH).read_text(encoding="u8")
-    data: Dict[str, Any] = json.loads(j)
-    if not (user_data := data.get(user_id)):
-        return GachaData()
-    return GachaData(**user_data)
-
-
 def format_count(count: int) -> str:
     trans_dict = {1: "st", 2: "nd", 3: "rd"}
     default_suffix = "th"
@@ -96,51 +101,133 @@ def format_count(count: int) -> str:
     return f"{count}{trans_dict.get(count % 10, default_suffix)}"
 
 
-async def get_student_icon(student_id: int) -> BuildImage:
+@dataclass()
+class GachaCardAssets:
+    card_bg: BuildImage
+    card_mask: BuildImage
+    star: BuildImage
+    new: BuildImage
+    pickup: BuildImage
+    stu_err: BuildImage
+
+
+async def get_gacha_card_assets() -> GachaCardAssets:
+    card_bg, card_mask, star, new, pickup, stu_err = await asyncio.gather(
+        read_image(GACHA_CARD_BG_PATH),
+        read_image(GACHA_CARD_MASK_PATH, "RGBA"),
+        read_image(GACHA_STAR_PATH),
+        read_image(GACHA_NEW_PATH),
+        read_image(GACHA_PICKUP_PATH),
+        read_image(GACHA_STU_ERR_PATH),
+    )
+    return GachaCardAssets(card_bg, card_mask, star, new, pickup, stu_err)
+
+
+async def get_student_image(url: str, student_id: int) -> Optional[bytes]:
     try:
-        stu_img = await schale_get(
-            f"images/student/icon/{student_id}.webp",
-            resp_type=RespType.BYTES,
-        )
-        stu_img = BuildImage.open(BytesIO(stu_img))
+        return await schale_get(url, resp_type=RespType.BYTES)
     except Exception:
         logger.exception(f"学生数据获取失败 {student_id}")
-        stu_img = await read_image(GACHA_STU_ERR_PATH)
+        return None
 
-    return stu_img.resize((64, 64), keep_ratio=True).circle()
 
+async def get_student_icon_bytes(student_id: int) -> Optional[bytes]:
+    return await get_student_image(
+        f"images/student/icon/{student_id}.webp",
+        student_id,
+    )
 
-async def get_student_card(
-    student: GachaStudent,
-    draw_count: bool = True,
-) -> BuildImage:
-    bg = await read_image(GACHA_CARD_BG_PATH)
 
-    try:
-        stu_img = await schale_get(
-            f"images/student/collection/{student.id}.webp",
-            resp_type=RespType.BYTES,
-        )
-        stu_img = BuildImage.open(BytesIO(stu_img))
-    except Exception:
-        logger.exception(f"学生数据获取失败 {student.id}")
-        stu_img = await read_image(GACHA_STU_ERR_PATH)
+async def get_student_card_bytes(student_id: int) -> Optional[bytes]:
+    return await get_student_image(
+        f"images/student/collection/{student_id}.webp",
+        student_id,
+    )
+
 
-    mask = (await read_image(GACHA_CARD_MASK_PATH)).convert("RGBA")
+# 以下 render_ 开头的函数会被提交到绘图线程 / 进程池执行，
+# 参数与返回值都需要可以被 pickle
+
+
+def render_student_icon(stu_img: Optional[bytes], err_img: BuildImage) -> BuildImage:
+    img = BuildImage.open(BytesIO(stu_img)) if stu_img else err_img
+    return img.resize((64, 64), keep_ratio=True).circle()
+
+
+# region card sprite cache
+
+
+class SpriteCache:
+    """按像素数据大小限制容量的图片 LRU 缓存，会在绘图线程中使用，所以需要加锁"""
+
+    def __init__(self, max_bytes: Optional[int] = None) -> None:
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.items: OrderedDict[Hashable, Image.Image] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_size(img: Image.Image) -> int:
+        return img.width * img.height * len(img.getbands())
+
+    def get(self, key: Hashable) -> Optional[Image.Image]:
+        with self.lock:
+            if (img := self.items.get(key)) is not None:
+                self.items.move_to_end(key)
+            return img
+
+    def put(self, key: Hashable, img: Image.Image):
+        size = self.get_size(img)
+        with self.lock:
+            if old := self.items.pop(key, None):
+                self.used -= self.get_size(old)
+            if self.max_bytes and size > self.max_bytes:
+                return
+            while self.max_bytes and self.items and self.used + size > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.used -= self.get_size(evicted)
+            self.items[key] = img
+            self.used += size
+
+
+# 学生头像裁好后的图层与拼好星级、NEW、PICKUP 角标的卡片分开缓存，
+# 抽卡序号每次都不一样，所以在取出卡片后再绘制
+sprite_cache = SpriteCache(int(config.ba_gacha_card_cache_max_mb * 1024 * 1024) or None)
+
+
+def get_sprite_disk_path(student: GachaStudent, img_hash: int) -> Path:
+    return GACHA_CARD_CACHE_DIR / (
+        f"{student.id}-{img_hash:08x}-{student.star}"
+        f"-{int(student.new)}-{int(student.pickup)}.png"
+    )
+
+
+def render_student_portrait(
+    stu: BuildImage,
+    assets: GachaCardAssets,
+) -> Image.Image:
+    mask = assets.card_mask
     card_img = BuildImage.new("RGBA", mask.size, (0, 0, 0, 0))
     card_img.image.paste(
-        stu_img.resize(mask.size, keep_ratio=True).image,
+        stu.resize(mask.size, keep_ratio=True).image,
         mask=mask.image,
     )
+    return card_img.image
 
-    bg = bg.paste(card_img, (26, 13), alpha=True)
 
-    star_img = await read_image(GACHA_STAR_PATH)
+def render_student_sprite(
+    student: GachaStudent,
+    portrait: Image.Image,
+    assets: GachaCardAssets,
+) -> BuildImage:
+    bg = assets.card_bg.copy()
+    bg = bg.paste(BuildImage(portrait), (26, 13), alpha=True)
+
     star_x_offset = int(26 + (159 - 30 * student.star) / 2)
     star_y_offset = 198
     for i in range(student.star):
         bg = bg.paste(
-            star_img,
+            assets.star,
             (star_x_offset + i * 30, star_y_offset),
             alpha=True,
         )
@@ -150,7 +237,7 @@ async def get_student_card(
 
     if student.new:
         bg = bg.paste(
-            await read_image(GACHA_NEW_PATH),
+            assets.new,
             (font_x_offset, font_y_offset),
             alpha=True,
         )
@@ -161,11 +248,67 @@ async def get_student_card(
         font_x_offset -= 4
         font_y_offset -= 4
         bg = bg.paste(
-            await read_image(GACHA_PICKUP_PATH),
+            assets.pickup,
             (font_x_offset, font_y_offset),
             alpha=True,
         )
 
+    return bg
+
+
+def get_student_sprite(
+    student: GachaStudent,
+    stu_img: Optional[bytes],
+    assets: GachaCardAssets,
+) -> BuildImage:
+    if not stu_img:
+        portrait = render_student_portrait(assets.stu_err, assets)
+        return render_student_sprite(student, portrait, assets)
+
+    img_hash = zlib.crc32(stu_img)
+    key = (student.id, img_hash, student.star, student.new, student.pickup)
+    if (sprite := sprite_cache.get(key)) is not None:
+        return BuildImage(sprite.copy())
+
+    disk_path = get_sprite_disk_path(student, img_hash)
+    if config.ba_gacha_card_disk_cache and disk_path.exists():
+        try:
+            with Image.open(disk_path) as f:
+                sprite = f.convert("RGBA")
+            disk_path.touch()
+        except Exception:
+            logger.exception(f"Failed to load cached gacha card {disk_path.name}")
+
+    if sprite is None:
+        portrait_key = (student.id, img_hash)
+        if (portrait := sprite_cache.get(portrait_key)) is None:
+            portrait = render_student_portrait(
+                BuildImage.open(BytesIO(stu_img)),
+                assets,
+            )
+            sprite_cache.put(portrait_key, portrait)
+
+        sprite = render_student_sprite(student, portrait, assets).image
+        if config.ba_gacha_card_disk_cache:
+            tmp_path = disk_path.with_name(f"{disk_path.name}.{secrets.token_hex(4)}")
+            sprite.save(tmp_path, "PNG", compress_level=1)
+            tmp_path.replace(disk_path)
+
+    sprite_cache.put(key, sprite)
+    return BuildImage(sprite.copy())
+
+
+# endregion
+
+
+def render_student_card(
+    student: GachaStudent,
+    stu_img: Optional[bytes],
+    assets: GachaCardAssets,
+    draw_count: bool = True,
+) -> BuildImage:
+    bg = get_student_sprite(student, stu_img, assets)
+
     if draw_count:
         bg.draw_text(
             (29, 195),
@@ -193,7 +336,21 @@ def collect_regular_info(
     ]
 
 
-async def draw_summary_gacha_img(result: List[GachaStudent]) -> BuildImage:
+# 招募总结图片的布局，横幅需要在提交绘制前按图片宽度缩放好
+SUMMARY_PADDING = 50
+SUMMARY_PART_WIDTH = 256 * 5 + SUMMARY_PADDING * 2
+SUMMARY_IMG_WIDTH = SUMMARY_PART_WIDTH + SUMMARY_PADDING * 2
+SUMMARY_BANNER_HEIGHT = 150
+
+
+def render_summary_gacha_img(
+    result: List[GachaStudent],
+    card_imgs: Dict[int, Optional[bytes]],
+    icon_imgs: Dict[int, Optional[bytes]],
+    assets: GachaCardAssets,
+    gacha_bg: BuildImage,
+    banner: BuildImage,
+) -> BuildImage:
     important_result: List[GachaStudent] = []
     regular_result: List[GachaStudent] = []
     for res in result:
@@ -211,17 +368,21 @@ async def draw_summary_gacha_img(result: List[GachaStudent]) -> BuildImage:
 
     important_pics = list(
         split_list(
-            await asyncio.gather(*[get_student_card(x) for x in important_result]),
+            [
+                render_student_card(x, card_imgs.get(x.id), assets)
+                for x in important_result
+            ],
             5,
         ),
     )
-    regular_icons: List[BuildImage] = await asyncio.gather(
-        *[get_student_icon(x.student.id) for x in regular_collected],
-    )
+    regular_icons = [
+        render_student_icon(icon_imgs.get(x.student.id), assets.stu_err)
+        for x in regular_collected
+    ]
 
-    padding = 50
-    part_width = 256 * 5 + padding * 2
-    img_width = part_width + padding * 2
+    padding = SUMMARY_PADDING
+    part_width = SUMMARY_PART_WIDTH
+    img_width = SUMMARY_IMG_WIDTH
 
     def gen_important() -> BuildImage:
         img_size = 256
@@ -330,19 +491,17 @@ async def draw_summary_gacha_img(result: List[GachaStudent]) -> BuildImage:
     important_img = gen_important()
     regular_img = gen_regular()
 
-    banner_h = 150
     return (
-        (await read_image(GACHA_BG_PATH))
-        .resize(
+        gacha_bg.resize(
             (
                 img_width,
-                banner_h + important_img.height + regular_img.height + padding * 3,
+                banner.height + important_img.height + regular_img.height + padding * 3,
             ),
             keep_ratio=True,
         )
-        .paste((await read_image(CALENDER_BANNER_PATH)).resize((img_width, banner_h)))
+        .paste(banner)
         .draw_text(
-            (50, 0, 1480, 150),
+            (padding, 0, img_width, banner.height),
             "招募总结",
             max_fontsize=100,
             weight="bold",
@@ -350,27 +509,59 @@ async def draw_summary_gacha_img(result: List[GachaStudent]) -> BuildImage:
             halign="left",
         )
         .paste(
-            important_img.circle_corner(10),
-            (padding, banner_h + padding),
+            circle_corner(important_img, 10),
+            (padding, banner.height + padding),
             alpha=True,
         )
         .paste(
-            regular_img.circle_corner(10),
-            (padding, banner_h + padding + important_img.height + padding),
+            circle_corner(regular_img, 10),
+            (padding, banner.height + padding + important_img.height + padding),
             alpha=True,
         )
     )
 
 
-async def draw_classic_gacha_img(students: List[GachaStudent]) -> BuildImage:
+async def draw_summary_gacha_img(result: List[GachaStudent]) -> BuildImage:
+    important_ids = list({x.id for x in result if x.star >= 3})
+    regular_ids = list({x.id for x in result if x.star < 3})
+
+    card_imgs, icon_imgs, assets, gacha_bg, banner = await asyncio.gather(
+        asyncio.gather(*(get_student_card_bytes(x) for x in important_ids)),
+        asyncio.gather(*(get_student_icon_bytes(x) for x in regular_ids)),
+        get_gacha_card_assets(),
+        read_image(GACHA_BG_PATH),
+        read_image_resized(
+            CALENDER_BANNER_PATH,
+            (SUMMARY_IMG_WIDTH, SUMMARY_BANNER_HEIGHT),
+        ),
+    )
+    img = await run_render(
+        render_summary_gacha_img,
+        result,
+        dict(zip(important_ids, card_imgs)),
+        dict(zip(regular_ids, icon_imgs)),
+        assets,
+        gacha_bg,
+        banner,
+    )
+    await gacha_card_cache_limit.sweep_if_due()
+    return img
+
+
+def render_classic_gacha_img(
+    students: List[GachaStudent],
+    card_imgs: Dict[int, Optional[bytes]],
+    assets: GachaCardAssets,
+    bg: BuildImage,
+) -> BuildImage:
     line_limit = 5
     card_w, card_h = (256, 256)
 
-    org_stu_cards = await asyncio.gather(
-        *(get_student_card(student, draw_count=False) for student in students),
-    )
+    org_stu_cards = [
+        render_student_card(x, card_imgs.get(x.id), assets, draw_count=False)
+        for x in students
+    ]
     stu_cards = list(split_list(org_stu_cards, line_limit))
-    bg = await read_image(GACHA_BG_OLD_PATH)
 
     x_gap = 10
     y_gap = 80
@@ -397,70 +588,42 @@ async def draw_classic_gacha_img(students: List[GachaStudent]) -> BuildImage:
     )
 
 
+async def draw_classic_gacha_img(students: List[GachaStudent]) -> BuildImage:
+    ids = list({x.id for x in students})
+    card_imgs, assets, bg = await asyncio.gather(
+        asyncio.gather(*(get_student_card_bytes(x) for x in ids)),
+        get_gacha_card_assets(),
+        read_image(GACHA_BG_OLD_PATH),
+    )
+    img = await run_render(
+        render_classic_gacha_img,
+        students,
+        dict(zip(ids, card_imgs)),
+        assets,
+        bg,
+    )
+    await gacha_card_cache_limit.sweep_if_due()
+    return img
+
+
 async def do_gacha(
     user_id: str,
     times: int,
     gacha_data_json: dict,
     up_pool: Optional[List[int]] = None,
+    rng: Optional[np.random.Generator] = None,
 ):
-    # 屎山代码 别骂了别骂了
-    # 如果有大佬指点指点怎么优化或者愿意发个PR就真的太感激了
-
-    if not up_pool:
-        up_pool = []
-
     stu_li = await schale_get_stu_dict("Id")
-    up_3_li, up_2_li = [
-        [x for x in up_pool if x in stu_li and stu_li[x]["StarGrade"] == y]
-        for y in [3, 2]
-    ]
+    pool = get_compiled_gacha_pool(gacha_data_json, up_pool or [], stu_li)
 
-    base_char: dict = gacha_data_json["base"]
-    for up in up_pool:
-        for li in cast(List[List[int]], base_char.values()):
-            if up in li:
-                li.remove(up)
+    chars = pool.table.sample(times, rng)
+    new_chars = await add_collected(user_id, chars)
 
-    star_3_base, star_2_base, star_1_base = [base_char[x] for x in ["3", "2", "1"]]
-    star_3_chance, star_2_chance, star_1_chance = [
-        x["chance"] for x in [star_3_base, star_2_base, star_1_base]
-    ]
-
-    up_3_chance = 0
-    up_2_chance = 0
-    if up_3_li:
-        up_3_chance = gacha_data_json["up"]["3"]["chance"]
-        star_3_chance -= up_3_chance
-    if up_2_li:
-        up_2_chance = gacha_data_json["up"]["2"]["chance"]
-        star_2_chance -= up_2_chance
-
-    gacha_data = await get_gacha_data(user_id)
     gacha_result: List[GachaStudent] = []
-
-    for i in range(1, times + 1):
-        is_10th = i % 10 == 0
-        now_2_chance = star_2_chance + star_1_chance if is_10th else star_2_chance
-        pool_and_weight = [
-            (up_3_li, up_3_chance),
-            (up_2_li, up_2_chance),
-            (star_3_base["char"], star_3_chance),
-            (star_2_base["char"], now_2_chance),
-        ]
-        if not is_10th:
-            pool_and_weight.append((star_1_base["char"], star_1_chance))
-
-        pool_and_weight = [x for x in pool_and_weight if x[0]]
-        pool = [x[0] for x in pool_and_weight]
-        weight = [x[1] for x in pool_and_weight]
-
-        await asyncio.sleep(0.05)
-        random.seed()
-        char = random.choice(random.choices(pool, weights=weight, k=1)[0])
-
-        is_3star_pickup = char in up_3_li
-        is_pickup = is_3star_pickup or (char in up_2_li)
-        is_new = char not in gacha_data.collected
+    for i, char in enumerate(chars, 1):
+        is_pickup = pool.is_pickup(char)
+        is_new = char in new_chars
+        new_chars.discard(char)
         char_info = stu_li[char]
         gacha_result.append(
             GachaStudent(
@@ -473,10 +636,6 @@ async def do_gacha(
             ),
         )
 
-        if is_new:
-            gacha_data.collected.append(char)
-
-    await set_gacha_data(user_id, gacha_data)
     return gacha_result
 
 
@@ -492,5 +651,4 @@ async def gacha(
         if (times > 10) or (config.ba_disable_classic_gacha)
         else (await draw_classic_gacha_img(result))
     )
-    img_bytes = img.convert("RGB").save_jpg()
-    return MessageSegment.image(img_bytes)
+    return MessageSegment.image(await run_render(i2b, img.image))
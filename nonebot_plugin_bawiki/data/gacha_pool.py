@@ -0,0 +1,193 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..util import make_fingerprint
+
+GACHA_POOL_CACHE_SIZE = 32
+
+# (学生 ID 列表, 普通抽概率, 每十抽保底那一抽的概率)
+GachaCategory = Tuple[Sequence[int], float, float]
+
+
+def normalize_probs(probs: np.ndarray) -> np.ndarray:
+    total = probs.sum()
+    if total <= 0:
+        raise ValueError("Gacha pool has no positive weight")
+    return probs / total
+
+
+@dataclass(frozen=True)
+class GachaWeightTable:
+    """把各个池子展开成逐个学生的概率表，建好后可以一次性抽出任意多抽"""
+
+    chars: np.ndarray
+    probs: np.ndarray
+    probs_10th: np.ndarray
+
+    @classmethod
+    def build(cls, categories: Sequence[GachaCategory]) -> "GachaWeightTable":
+        # 空池子不参与抽取，其概率直接丢弃后重新归一化
+        categories = [x for x in categories if x[0]]
+        if not categories:
+            raise ValueError("Gacha pool is empty")
+
+        chars = np.concatenate([np.asarray(x[0], dtype=np.int64) for x in categories])
+        probs, probs_10th = (
+            normalize_probs(
+                np.concatenate(
+                    [np.full(len(x[0]), x[i] / len(x[0])) for x in categories],
+                ),
+            )
+            for i in (1, 2)
+        )
+        for arr in (chars, probs, probs_10th):
+            arr.setflags(write=False)
+        return cls(chars, probs, probs_10th)
+
+    def sample_index(
+        self,
+        times: int,
+        rng: Optional[np.random.Generator] = None,
+        start: int = 1,
+    ) -> np.ndarray:
+        """
+        返回 `times` 抽在 `chars` 中的下标，`start` 为第一抽的序号，
+        序号为 10 的倍数的那一抽使用保底概率
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        is_10th = np.arange(start, start + times) % 10 == 0
+        result = np.empty(times, dtype=np.int64)
+        for mask, probs in ((~is_10th, self.probs), (is_10th, self.probs_10th)):
+            if size := int(mask.sum()):
+                result[mask] = rng.choice(len(self.chars), size=size, p=probs)
+        return result
+
+    def sample(
+        self,
+        times: int,
+        rng: Optional[np.random.Generator] = None,
+        start: int = 1,
+    ) -> List[int]:
+        return self.chars[self.sample_index(times, rng, start)].tolist()
+
+    def sample_groups(
+        self,
+        groups: np.ndarray,
+        shape: Tuple[int, int],
+        rng: Optional[np.random.Generator] = None,
+        start: int = 1,
+    ) -> np.ndarray:
+        """
+        将 `chars` 中的学生按 `groups`（与 `chars` 等长的分组编号）合并后批量抽取，
+        返回形状为 (会话数, 每个会话抽数) 的分组编号矩阵，
+        只关心分组时比逐个学生抽取快得多
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        size = int(groups.max()) + 1
+        cdf, cdf_10th = (
+            np.cumsum(np.bincount(groups, weights=probs, minlength=size))
+            for probs in (self.probs, self.probs_10th)
+        )
+
+        is_10th = np.arange(start, start + shape[1]) % 10 == 0
+        result = np.empty(shape, dtype=np.int8)
+        for mask, x in ((~is_10th, cdf), (is_10th, cdf_10th)):
+            if mask.any():
+                sampled = np.searchsorted(
+                    x,
+                    rng.random((shape[0], int(mask.sum()))),
+                    side="right",
+                )
+                # 浮点误差可能导致累积概率最后一项略小于 1
+                result[:, mask] = np.minimum(sampled, size - 1)
+        return result
+
+
+@dataclass(frozen=True)
+class CompiledGachaPool:
+    """由 gacha.json 与 UP 学生列表编译出的卡池，编译后不再修改，可以被多次抽卡共享"""
+
+    table: GachaWeightTable
+    up_3: FrozenSet[int]
+    up_2: FrozenSet[int]
+
+    @classmethod
+    def compile(
+        cls,
+        gacha_data_json: Dict[str, Any],
+        up_3: Sequence[int],
+        up_2: Sequence[int],
+        excluded: Sequence[int] = (),
+    ) -> "CompiledGachaPool":
+        base: Dict[str, Any] = gacha_data_json["base"]
+        up: Dict[str, Any] = gacha_data_json["up"]
+
+        # UP 学生从常驻池中剔除，注意不能修改传进来的数据
+        excluded_set = set(excluded) | set(up_3) | set(up_2)
+        star_3, star_2, star_1 = (
+            [x for x in base[star]["char"] if x not in excluded_set]
+            for star in ("3", "2", "1")
+        )
+        star_3_chance, star_2_chance, star_1_chance = (
+            base[star]["chance"] for star in ("3", "2", "1")
+        )
+
+        up_3_chance = 0
+        up_2_chance = 0
+        if up_3:
+            up_3_chance = up["3"]["chance"]
+            star_3_chance -= up_3_chance
+        if up_2:
+            up_2_chance = up["2"]["chance"]
+            star_2_chance -= up_2_chance
+
+        table = GachaWeightTable.build(
+            [
+                (up_3, up_3_chance, up_3_chance),
+                (up_2, up_2_chance, up_2_chance),
+                (star_3, star_3_chance, star_3_chance),
+                (star_2, star_2_chance, star_2_chance + star_1_chance),
+                (star_1, star_1_chance, 0),
+            ],
+        )
+        return cls(table, frozenset(up_3), frozenset(up_2))
+
+    def is_pickup(self, char: int) -> bool:
+        return char in self.up_3 or char in self.up_2
+
+
+gacha_pool_cache: "OrderedDict[Tuple[Any, ...], CompiledGachaPool]" = OrderedDict()
+
+
+def get_gacha_data_version(gacha_data_json: Dict[str, Any]) -> str:
+    return make_fingerprint(gacha_data_json["base"], gacha_data_json["up"])
+
+
+def get_compiled_gacha_pool(
+    gacha_data_json: Dict[str, Any],
+    up_pool: Sequence[int],
+    stu_li: Dict[int, Any],
+) -> CompiledGachaPool:
+    up_3, up_2 = (
+        tuple(x for x in up_pool if x in stu_li and stu_li[x]["StarGrade"] == y)
+        for y in (3, 2)
+    )
+    excluded = tuple(sorted(set(up_pool)))
+    key = (get_gacha_data_version(gacha_data_json), up_3, up_2, excluded)
+
+    if pool := gacha_pool_cache.get(key):
+        gacha_pool_cache.move_to_end(key)
+        return pool
+
+    pool = CompiledGachaPool.compile(gacha_data_json, up_3, up_2, excluded)
+    gacha_pool_cache[key] = pool
+    while len(gacha_pool_cache) > GACHA_POOL_CACHE_SIZE:
+        gacha_pool_cache.popitem(last=False)
+    return pool
@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from .chart import new_figure, save_figure
+from .gacha_pool import CompiledGachaPool
+
+# 抽满 200 次可以直接兑换（井）
+SPARK_PULLS = 200
+# 每批模拟的会话数，避免一次性生成过大的矩阵
+SIM_CHUNK_SIZE = 5000
+
+CHART_W = 760
+CHART_H = 480
+MULTIPLIER = 2
+
+
+@dataclass()
+class GachaSimResult:
+    pulls: int
+    trials: int
+    target_name: str
+    hits_hist: List[int]  # 下标为一次会话中抽到目标学生的次数
+    first_hist: List[int]  # 下标为第一次抽到目标学生的抽数，0 表示没抽到
+
+    @property
+    def hit_any_rate(self) -> float:
+        return 1 - self.hits_hist[0] / self.trials
+
+    @property
+    def hits_mean(self) -> float:
+        hits = np.arange(len(self.hits_hist))
+        return float(np.dot(hits, self.hits_hist)) / self.trials
+
+    @property
+    def first_cdf(self) -> np.ndarray:
+        """第 n 抽（下标 n - 1）及之前已经抽到目标学生的概率"""
+        return np.cumsum(self.first_hist[1:]) / self.trials
+
+    @property
+    def spark_rate(self) -> float:
+        """200 抽内都没有抽到目标学生，需要靠井兑换的概率"""
+        return 1 - float(self.first_cdf[SPARK_PULLS - 1])
+
+    @property
+    def first_mean_with_spark(self) -> float:
+        """算上井时，拿到目标学生的期望抽数"""
+        first = np.arange(len(self.first_hist))
+        cost = np.where((first == 0) | (first > SPARK_PULLS), SPARK_PULLS, first)
+        return float(np.dot(cost, self.first_hist)) / self.trials
+
+    @property
+    def first_median(self) -> Optional[int]:
+        """半数会话第一次抽到目标学生的抽数，在 `pulls` 抽内没有过半时为 None"""
+        cdf = self.first_cdf[: self.pulls]
+        if cdf[-1] < 0.5:
+            return None
+        return int(np.searchsorted(cdf, 0.5)) + 1
+
+
+def simulate_gacha(
+    pool: CompiledGachaPool,
+    targets: List[int],
+    target_name: str,
+    pulls: int,
+    trials: int,
+    rng: Optional[np.random.Generator] = None,
+) -> GachaSimResult:
+    if rng is None:
+        rng = np.random.default_rng()
+
+    groups = np.isin(pool.table.chars, targets).astype(np.int64)
+    cols = max(pulls, SPARK_PULLS)
+    hits_hist = np.zeros(pulls + 1, dtype=np.int64)
+    first_hist = np.zeros(cols + 1, dtype=np.int64)
+
+    for offset in range(0, trials, SIM_CHUNK_SIZE):
+        rows = min(SIM_CHUNK_SIZE, trials - offset)
+        hit = pool.table.sample_groups(groups, (rows, cols), rng) == 1
+
+        hits_hist += np.bincount(hit[:, :pulls].sum(axis=1), minlength=pulls + 1)
+        first = np.where(hit.any(axis=1), hit.argmax(axis=1) + 1, 0)
+        first_hist += np.bincount(first, minlength=cols + 1)
+
+    return GachaSimResult(
+        pulls=pulls,
+        trials=trials,
+        target_name=target_name,
+        hits_hist=hits_hist.tolist(),
+        first_hist=first_hist.tolist(),
+    )
+
+
+def render_gacha_sim_chart(result: GachaSimResult) -> bytes:
+    figure = new_figure(CHART_W, CHART_H, MULTIPLIER, facecolor="white")
+    ax_hits, ax_first = figure.subplots(1, 2)
+
+    # 截掉概率过小的尾部，避免柱状图过长
+    hits = np.asarray(result.hits_hist) / result.trials
+    shown = np.nonzero(hits >= 0.001)[0]
+    last = int(shown[-1]) + 1 if len(shown) else len(hits)
+    ax_hits.bar(np.arange(last), hits[:last] * 100)
+    ax_hits.set_title(f"Hits in {result.pulls} pulls")
+    ax_hits.set_xlabel("Hits")
+    ax_hits.set_ylabel("%")
+    ax_hits.grid(axis="y")
+
+    cdf = result.first_cdf
+    ax_first.plot(np.arange(1, len(cdf) + 1), cdf * 100)
+    ax_first.axvline(SPARK_PULLS, color="tab:red", linestyle="--", label="Spark")
+    ax_first.set_title("First hit by pull")
+    ax_first.set_xlabel("Pulls")
+    ax_first.set_ylabel("%")
+    ax_first.set_ylim(0, 100)
+    ax_first.grid()
+    ax_first.legend(loc="lower right")
+
+    figure.tight_layout()
+    return save_figure(figure)
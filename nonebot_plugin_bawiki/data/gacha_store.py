@@ -0,0 +1,137 @@
+import json
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, Iterable, List, Set
+
+import anyio
+from nonebot import logger
+
+from ..resource import DATA_DIR
+
+GACHA_DB_PATH = DATA_DIR / "gacha.db"
+GACHA_JSON_PATH = DATA_DIR / "gacha.json"
+GACHA_JSON_MIGRATED_PATH = DATA_DIR / "gacha.json.migrated"
+
+
+def connect() -> sqlite3.Connection:
+    # 每次操作单独开连接，操作都在工作线程中执行，不需要共享连接
+    conn = sqlite3.connect(GACHA_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_db():
+    with closing(connect()) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS gacha_collected ("
+            "user_id TEXT NOT NULL, "
+            "student_id INTEGER NOT NULL, "
+            "PRIMARY KEY (user_id, student_id)"
+            ") WITHOUT ROWID",
+        )
+
+
+def migrate_json():
+    """将旧版的 gacha.json 导入数据库，导入后重命名为 gacha.json.migrated"""
+
+    if not GACHA_JSON_PATH.exists():
+        return
+
+    data: Dict[str, dict] = json.loads(GACHA_JSON_PATH.read_text(encoding="u8"))
+    rows = [
+        (user_id, int(student_id))
+        for user_id, user_data in data.items()
+        for student_id in (user_data.get("collected") or [])
+    ]
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO gacha_collected VALUES (?, ?)",
+                rows,
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    GACHA_JSON_PATH.replace(GACHA_JSON_MIGRATED_PATH)
+    logger.info(f"Migrated gacha data of {len(data)} users to {GACHA_DB_PATH.name}")
+
+
+db_ready = False
+db_ready_lock = threading.Lock()
+
+
+def ensure_db():
+    """第一次读写时再建表，避免插件加载时就打开数据库"""
+
+    global db_ready
+
+    if db_ready:
+        return
+    with db_ready_lock:
+        if db_ready:
+            return
+        init_db()
+        migrate_json()
+        db_ready = True
+
+
+def get_collected_sync(user_id: str) -> Set[int]:
+    ensure_db()
+    with closing(connect()) as conn:
+        cursor = conn.execute(
+            "SELECT student_id FROM gacha_collected WHERE user_id = ?",
+            (user_id,),
+        )
+        return {x for (x,) in cursor}
+
+
+def add_collected_sync(user_id: str, student_ids: Iterable[int]) -> Set[int]:
+    ensure_db()
+    added: Set[int] = set()
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for student_id in dict.fromkeys(student_ids):
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO gacha_collected VALUES (?, ?)",
+                    (user_id, student_id),
+                )
+                if cursor.rowcount:
+                    added.add(student_id)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return added
+
+
+def set_collected_sync(user_id: str, student_ids: Iterable[int]):
+    ensure_db()
+    rows: List[tuple] = [(user_id, x) for x in set(student_ids)]
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM gacha_collected WHERE user_id = ?", (user_id,))
+            conn.executemany("INSERT INTO gacha_collected VALUES (?, ?)", rows)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+async def get_collected(user_id: str) -> Set[int]:
+    return await anyio.to_thread.run_sync(get_collected_sync, user_id)
+
+
+async def add_collected(user_id: str, student_ids: Iterable[int]) -> Set[int]:
+    """将学生加入用户的已拥有列表，返回之前没有拥有的学生，整个操作在一个事务内完成"""
+    return await anyio.to_thread.run_sync(add_collected_sync, user_id, student_ids)
+
+
+async def set_collected(user_id: str, student_ids: Iterable[int]):
+    await anyio.to_thread.run_sync(set_collected_sync, user_id, student_ids)
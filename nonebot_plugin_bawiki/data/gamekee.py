@@ -7,16 +7,12 @@ import urllib.parse
 from dataclasses import dataclass
 from datetime import datetime
 from io import BytesIO
-from typing import Any, Dict, List, Literal, Optional, cast
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional, cast
 from typing_extensions import Unpack
 
-from bs4 import BeautifulSoup, PageElement, ResultSet, Tag
 from nonebot import logger
-from nonebot_plugin_htmlrender import get_new_page
-from PIL import Image
 from PIL.Image import Resampling
 from pil_utils import BuildImage, text2image
-from playwright.async_api import Page
 
 from ..config import config
 from ..resource import CALENDER_BANNER_PATH, GAMEKEE_UTIL_JS_PATH, GRADIENT_BG_PATH
@@ -24,15 +20,26 @@ from ..util import (
     AsyncReqKwargs,
     RespType as Rt,
     async_req,
-    i2b,
+    circle_corner,
+    load_screenshot_cache,
+    make_fingerprint,
     parse_time_delta,
+    read_file_cached,
     read_image,
-    split_pic,
+    read_image_resized,
+    run_render,
+    save_screenshot_cache,
+    split_pic_bytes,
 )
+from .playwright import SITE_GAMEKEE, get_pooled_page
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, PageElement, ResultSet, Tag
 
 
 async def game_kee_request(url: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
     kwargs["base_urls"] = config.ba_gamekee_url
+    kwargs.setdefault("disk_cache", True)
 
     headers = kwargs.get("headers") or {}
     headers.update({"Game-Id": "829", "Game-Alias": "ba"})
@@ -94,7 +101,7 @@ def game_kee_page_url(sid: int) -> str:
 
 
 async def game_kee_get_page(url: str) -> List[BytesIO]:
-    async with cast(Page, get_new_page()) as page:
+    async with get_pooled_page(site=SITE_GAMEKEE) as page:
         await page.goto(url, timeout=config.ba_screenshot_timeout * 1000)
 
         await page.evaluate(GAMEKEE_UTIL_JS_PATH.read_text(encoding="u8"))
@@ -110,8 +117,40 @@ async def game_kee_get_page(url: str) -> List[BytesIO]:
         assert element
         pic_bytes = await element.screenshot(type="jpeg")
 
-    pic = Image.open(BytesIO(pic_bytes))
-    return list(map(i2b, split_pic(pic)))
+    return await run_render(split_pic_bytes, pic_bytes)
+
+
+async def get_game_kee_page_fingerprint(cid: int) -> str:
+    ret: dict = await game_kee_request(f"v1/content/detail/{cid}")
+    return make_fingerprint(
+        config.ba_gamekee_url,
+        ret["content"],
+        (await read_file_cached(GAMEKEE_UTIL_JS_PATH)).decode("u8"),
+    )
+
+
+async def game_kee_get_stu_page(cid: int) -> List[BytesIO]:
+    key = str(cid)
+    try:
+        fingerprint = await get_game_kee_page_fingerprint(cid)
+    except Exception:
+        logger.exception(f"获取 GameKee 页面 {cid} 的数据指纹失败")
+        fingerprint = None
+
+    if fingerprint and (
+        cached := await load_screenshot_cache("gamekee", key, fingerprint)
+    ):
+        return [BytesIO(x) for x in cached]
+
+    images = await game_kee_get_page(game_kee_page_url(cid))
+    if fingerprint:
+        await save_screenshot_cache(
+            "gamekee",
+            key,
+            fingerprint,
+            [x.getvalue() for x in images],
+        )
+    return images
 
 
 async def game_kee_calender(
@@ -154,160 +193,199 @@ def split_images(
     return ret
 
 
-async def game_kee_get_calender_page(
-    ret: List[Dict],
-    has_pic: bool = True,
-) -> List[BytesIO]:
-    now = datetime.now().astimezone()
-
-    async def draw(it: dict) -> BuildImage:
-        ev_pic = None
-        if has_pic and (url := it.get("picture")):
-            try:
-                pic_bytes = await async_req(f"https:{url}", resp_type=Rt.BYTES)
-                ev_pic = BuildImage.open(BytesIO(pic_bytes))
-            except Exception:
-                logger.exception("下载日程表图片失败")
-
-        begin = datetime.fromtimestamp(it["begin_at"]).astimezone()
-        end = datetime.fromtimestamp(it["end_at"]).astimezone()
-        started = begin <= now
-        time_remain = (end if started else begin) - now
-        dd, hh, mm, ss = parse_time_delta(time_remain)
-
-        # logger.debug(f'{it["title"]} | {started} | {time_remain}')
-
-        title_p = text2image(
-            f'[b]{it["title"]}[/b]',
-            "#ffffff00",
-            max_width=1290,
-            fontsize=65,
-        )
-        time_p = text2image(
-            f"{begin} ~ {end}",
+def render_calender_item(
+    it: dict,
+    pic_bytes: Optional[bytes],
+    now: datetime,
+) -> BuildImage:
+    ev_pic = BuildImage.open(BytesIO(pic_bytes)) if pic_bytes else None
+
+    begin = datetime.fromtimestamp(it["begin_at"]).astimezone()
+    end = datetime.fromtimestamp(it["end_at"]).astimezone()
+    started = begin <= now
+    time_remain = (end if started else begin) - now
+    dd, hh, mm, ss = parse_time_delta(time_remain)
+
+    # logger.debug(f'{it["title"]} | {started} | {time_remain}')
+
+    title_p = text2image(
+        f'[b]{it["title"]}[/b]',
+        "#ffffff00",
+        max_width=1290,
+        fontsize=65,
+    )
+    time_p = text2image(
+        f"{begin} ~ {end}",
+        "#ffffff00",
+        max_width=1290,
+        fontsize=40,
+    )
+    desc_p = (
+        text2image(
+            desc.replace("<br>", ""),
             "#ffffff00",
             max_width=1290,
             fontsize=40,
         )
-        desc_p = (
-            text2image(
-                desc.replace("<br>", ""),
-                "#ffffff00",
-                max_width=1290,
-                fontsize=40,
-            )
-            if (desc := it["description"])
-            else None
-        )
-        remain_p = text2image(
-            f"剩余 [color=#fc6475]{dd}[/color] 天 [color=#fc6475]{hh}[/color] 时 "
-            f"[color=#fc6475]{mm}[/color] 分 [color=#fc6475]{ss}[/color] 秒"
-            f'{"结束" if started else "开始"}',
-            "#ffffff00",
-            max_width=1290,
-            fontsize=50,
-        )
+        if (desc := it["description"])
+        else None
+    )
+    remain_p = text2image(
+        f"剩余 [color=#fc6475]{dd}[/color] 天 [color=#fc6475]{hh}[/color] 时 "
+        f"[color=#fc6475]{mm}[/color] 分 [color=#fc6475]{ss}[/color] 秒"
+        f'{"结束" if started else "开始"}',
+        "#ffffff00",
+        max_width=1290,
+        fontsize=50,
+    )
 
-        h = (
-            100
-            + (title_p.height + 25)
-            + (time_p.height + 25)
-            + (ev_pic.height + 25 if ev_pic else 0)
-            + (desc_p.height + 25 if desc_p else 0)
-            + remain_p.height
-        )
-        img = BuildImage.new("RGBA", (1400, h), (255, 255, 255, 70)).draw_rectangle(
-            (0, 0, 10, h),
-            "#fc6475" if it["importance"] else "#4acf75",
-        )
+    h = (
+        100
+        + (title_p.height + 25)
+        + (time_p.height + 25)
+        + (ev_pic.height + 25 if ev_pic else 0)
+        + (desc_p.height + 25 if desc_p else 0)
+        + remain_p.height
+    )
+    img = BuildImage.new("RGBA", (1400, h), (255, 255, 255, 70)).draw_rectangle(
+        (0, 0, 10, h),
+        "#fc6475" if it["importance"] else "#4acf75",
+    )
 
-        if not started:
-            img.draw_rectangle((1250, 0, 1400, 60), "gray")
-            img.draw_text((1250, 0, 1400, 60), "未开始", max_fontsize=50, fill="white")
-
-        ii = 50
-        img.paste(title_p, (60, ii), alpha=True)
-        ii += title_p.height + 25
-        img.paste(time_p, (60, ii), alpha=True)
-        ii += time_p.height + 25
-        if ev_pic:
-            img.paste(ev_pic.resize_width(1290).circle_corner(15), (60, ii), alpha=True)
-            ii += ev_pic.height + 25
-        if desc_p:
-            img.paste(desc_p, (60, ii), alpha=True)
-            ii += desc_p.height + 25
-        img.paste(remain_p, (60, ii), alpha=True)
-        return img
-
-    async def draw_list(li: List[BuildImage], title: str) -> BuildImage:
-        bg_w = 1500
-        bg_h = 200 + sum(x.height + 50 for x in li)
-        bg = (
-            BuildImage.new("RGBA", (bg_w, bg_h))
-            .paste((await read_image(CALENDER_BANNER_PATH)).resize((1500, 150)))
-            .draw_text(
-                (50, 0, 1480, 150),
-                title,
-                max_fontsize=100,
-                weight="bold",
-                fill="#ffffff",
-                halign="left",
-            )
-            .paste(
-                (await read_image(GRADIENT_BG_PATH)).resize(
-                    (1500, bg_h - 150),
-                    resample=Resampling.NEAREST,
-                ),
-                (0, 150),
-            )
+    if not started:
+        img.draw_rectangle((1250, 0, 1400, 60), "gray")
+        img.draw_text((1250, 0, 1400, 60), "未开始", max_fontsize=50, fill="white")
+
+    ii = 50
+    img.paste(title_p, (60, ii), alpha=True)
+    ii += title_p.height + 25
+    img.paste(time_p, (60, ii), alpha=True)
+    ii += time_p.height + 25
+    if ev_pic:
+        img.paste(circle_corner(ev_pic.resize_width(1290), 15), (60, ii), alpha=True)
+        ii += ev_pic.height + 25
+    if desc_p:
+        img.paste(desc_p, (60, ii), alpha=True)
+        ii += desc_p.height + 25
+    img.paste(remain_p, (60, ii), alpha=True)
+    return img
+
+
+def render_calender_list(
+    li: List[BuildImage],
+    title: str,
+    banner: BuildImage,
+    gradient_bg: BuildImage,
+) -> BytesIO:
+    bg_w = 1500
+    bg_h = 200 + sum(x.height + 50 for x in li)
+    bg = (
+        BuildImage.new("RGBA", (bg_w, bg_h))
+        .paste(banner)
+        .draw_text(
+            (50, 0, 1480, 150),
+            title,
+            max_fontsize=100,
+            weight="bold",
+            fill="#ffffff",
+            halign="left",
+        )
+        .paste(
+            gradient_bg.resize(
+                (1500, bg_h - 150),
+                resample=Resampling.NEAREST,
+            ),
+            (0, 150),
         )
+    )
 
-        index = 200
-        for p in li:
-            bg.paste(p.circle_corner(10), (50, index), alpha=True)
-            index += p.height + 50
-        return bg
+    index = 200
+    for p in li:
+        bg.paste(circle_corner(p, 10), (50, index), alpha=True)
+        index += p.height + 50
+    return bg.convert("RGB").save_jpg()
 
-    important_data = []
-    common_data = []
-    for data in ret:
-        (important_data if data["importance"] else common_data).append(data)
 
-    important_pics, common_pics = await asyncio.gather(
-        asyncio.gather(*(draw(x) for x in important_data)),
-        asyncio.gather(*(draw(x) for x in common_data)),
-    )
+def render_calender_page(
+    ret: List[Dict],
+    pics: List[Optional[bytes]],
+    now: datetime,
+    banner: BuildImage,
+    gradient_bg: BuildImage,
+) -> List[BytesIO]:
+    important_pics = []
+    common_pics = []
+    for data, pic in zip(ret, pics):
+        (important_pics if data["importance"] else common_pics).append(
+            render_calender_item(data, pic, now),
+        )
 
     max_height = 6000
     if not common_pics:
-        pics = [important_pics]
+        pics_li = [important_pics]
     else:
-        chain = itertools.chain(important_pics, common_pics)
-        pics: List[List[BuildImage]] = (
-            [list(chain)]
+        chain = [*important_pics, *common_pics]
+        pics_li: List[List[BuildImage]] = (
+            [chain]
             if sum(x.height + 50 for x in chain) <= max_height + 50
             else [important_pics, *split_images(common_pics, max_height, 50)]
         )
 
     title_prefix = "GameKee丨活动日程"
-    if len(pics) == 1:
-        images = await asyncio.gather(*(draw_list(pics[0], title_prefix)))
-    else:
-        if len(pics[-1]) < 3:
-            extra = pics.pop()
-            pics[-1].extend(extra)
-        images = await asyncio.gather(
-            *(draw_list(x, f"{title_prefix}丨P{i}") for i, x in enumerate(pics, 1)),
-        )
+    if len(pics_li) == 1:
+        return [render_calender_list(pics_li[0], title_prefix, banner, gradient_bg)]
+
+    if len(pics_li[-1]) < 3:
+        extra = pics_li.pop()
+        pics_li[-1].extend(extra)
+    return [
+        render_calender_list(x, f"{title_prefix}丨P{i}", banner, gradient_bg)
+        for i, x in enumerate(pics_li, 1)
+    ]
 
-    return [x.convert("RGB").save_jpg() for x in images]
+
+async def game_kee_get_calender_page(
+    ret: List[Dict],
+    has_pic: bool = True,
+) -> List[BytesIO]:
+    async def get_pic(it: dict) -> Optional[bytes]:
+        if not (has_pic and (url := it.get("picture"))):
+            return None
+        try:
+            return await async_req(f"https:{url}", resp_type=Rt.BYTES)
+        except Exception:
+            logger.exception("下载日程表图片失败")
+            return None
+
+    pics, banner, gradient_bg = await asyncio.gather(
+        asyncio.gather(*(get_pic(x) for x in ret)),
+        read_image_resized(CALENDER_BANNER_PATH, (1500, 150)),
+        read_image(GRADIENT_BG_PATH),
+    )
+    return await run_render(
+        render_calender_page,
+        ret,
+        list(pics),
+        datetime.now().astimezone(),
+        banner,
+        gradient_bg,
+    )
+
+
+def parse_html(html: str) -> "BeautifulSoup":
+    # bs4 与 lxml 导入较慢，用到时再导入
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, "lxml")
 
 
 async def game_kee_grab_l2d(cid: int) -> List[str]:
+    from bs4 import Tag
+
     ret: dict = await game_kee_request(f"v1/content/detail/{cid}")
     content: str = ret["content"]
 
-    soup = BeautifulSoup(content, "lxml")
+    soup = parse_html(content)
 
     l2d_nav_title = soup.find("div", class_="input-wrapper", string="Live2D")
     assert l2d_nav_title
@@ -337,7 +415,7 @@ class GameKeeVoice:
     url: str
 
 
-def parse_voice_elem(elem: Tag) -> GameKeeVoice:
+def parse_voice_elem(elem: "Tag") -> GameKeeVoice:
     url: str = cast(str, elem["src"])
     if not url.startswith("http"):
         url = f"https:{url}"
@@ -380,7 +458,7 @@ async def game_kee_get_voice(cid: int, is_chinese: bool = False) -> List[GameKee
             await game_kee_request(f"v1/content/detail/{cid}"),
         )
     )["content"]
-    bs = BeautifulSoup(wiki_html, "lxml")
+    bs = parse_html(wiki_html)
 
     multi_lang_voices = [
         [parse_voice_elem(x) for x in audios]
@@ -432,7 +510,7 @@ async def extract_content_pic(cid: int) -> List[str]:
             await game_kee_request(f"v1/content/detail/{cid}"),
         )
     )["content"]
-    bs = BeautifulSoup(wiki_html, "lxml")
+    bs = parse_html(wiki_html)
     img_elem = bs.find_all("img")
     img_urls = cast(List[str], [x["src"] for x in img_elem])
     return [f"https:{x}" if x.startswith("//") else x for x in img_urls]
@@ -476,8 +554,8 @@ async def get_manga_list() -> List[MangaMetadata]:
     return manga_list
 
 
-def tags_to_str(tag: PageElement) -> str:
-    def process(elem: PageElement) -> str:
+def tags_to_str(tag: "PageElement") -> str:
+    def process(elem: "PageElement") -> str:
         if c := getattr(elem, "contents", None):
             return "".join([s for x in c if (s := process(x))])
         text = elem if isinstance(elem, str) else elem.text
@@ -500,7 +578,7 @@ def tags_to_str(tag: PageElement) -> str:
 
 async def get_manga_content(cid: int) -> MangaContent:
     article = cast(dict, await game_kee_request(f"v1/content/detail/{cid}"))
-    soup = BeautifulSoup(article["content"], "lxml")
+    soup = parse_html(article["content"])
 
     content = tags_to_str(soup).strip()
     if "汉化：" in content:
@@ -1,27 +1,48 @@
+import asyncio
+import functools
+import hashlib
+import heapq
+import itertools
+import json
 import mimetypes
 import re
-from contextlib import asynccontextmanager
-from dataclasses import dataclass
+import secrets
+import shutil
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass, field
+from pathlib import Path
 from typing import (
+    Any,
     AsyncIterator,
     Awaitable,
     Callable,
+    Dict,
+    Iterable,
     List,
     Literal,
     Optional,
+    Set,
+    Tuple,
     TypeVar,
     Union,
 )
 
 import anyio
 import jinja2
-from nonebot import logger
-from nonebot_plugin_htmlrender import get_new_page
+from nonebot import get_driver, logger
+from nonebot.compat import model_dump
+from nonebot.matcher import current_event
+from nonebot_plugin_htmlrender import get_browser
 from pil_utils.fonts import Font, get_proper_font
 from playwright.async_api import Page, Request, Route
+from pydantic import BaseModel
 from yarl import URL
 
-from ..resource import EMPTY_HTML_PATH, RES_DIR
+from ..config import config
+from ..resource import CACHE_DIR, EMPTY_HTML_PATH, RES_DIR
+from ..util import DiskCacheLimit, mb_to_bytes
 
 PWRouter = Callable[[Route, Request], Awaitable[None]]
 BAWikiRouterFunc = Callable[..., Awaitable[None]]
@@ -30,6 +51,10 @@ TRF = TypeVar("TRF", bound=BAWikiRouterFunc)
 RES_ROUTE_URL = "https://bawiki.res"
 RES_TYPE_FONT = "font"
 
+# 注册了 res 的页面用于渲染插件自己的模板，注册了 filter 的页面用于截取外部网页
+ROUTER_SCOPE_RES = "res"
+ROUTER_SCOPE_FILTER = "filter"
+
 
 registered_routers: List["BAWikiRouter"] = []
 
@@ -39,57 +64,487 @@ class BAWikiRouter:
     pattern: Union[str, re.Pattern]
     func: BAWikiRouterFunc
     priority: int
+    scope: str = ROUTER_SCOPE_RES
 
 
 def bawiki_router(
     pattern: Union[str, re.Pattern],
     flags: Optional[re.RegexFlag] = None,
     priority: int = 0,
+    scope: str = ROUTER_SCOPE_RES,
 ):
     if not isinstance(pattern, re.Pattern):
         pattern = re.compile(pattern, flags=flags or 0)
 
     def wrapper(func: TRF) -> TRF:
-        registered_routers.append(BAWikiRouter(pattern, func, priority))
+        registered_routers.append(BAWikiRouter(pattern, func, priority, scope))
         # 低 priority 的 BAWikiRouter 应最先运行，
         # 因为 playwright 后 route 的先运行，所以要反过来排序
         registered_routers.sort(key=lambda r: r.priority, reverse=True)
-        logger.debug(f"Registered router: {pattern=}, {priority=}")
+        logger.debug(f"Registered router: {pattern=}, {priority=}, {scope=}")
         return func
 
     return wrapper
 
 
-async def route_page(page: Page, router: BAWikiRouter):
+async def route_page(page: Page, router: BAWikiRouter, **extra):
     async def wrapped(route: Route, request: Request):
         url = URL(request.url)
         logger.debug(f"Requested routed URL: {url.human_repr()}")
         match = re.search(router.pattern, request.url)
         assert match
-        return await router.func(match=match, url=url, route=route, request=request)
+        return await router.func(
+            match=match,
+            url=url,
+            route=route,
+            request=request,
+            **extra,
+        )
 
     await page.route(router.pattern, wrapped)
 
 
+# region page pool
+
+
+# 页面按创建参数与注册的 BAWikiRouter 分组复用，
+# 用完后会在后台重置并放回池中，使用次数过多或崩溃的页面会被关闭
+# 空闲与使用中的页面一起计数，池满时先关闭其他分组中最久未使用的空闲页面
+
+PAGE_BLANK_URL = "about:blank"
+
+
+@dataclass
+class PooledPage:
+    page: Page
+    key: str
+    scope: Optional[str]
+    kwargs: Dict[str, Any]
+    uses: int = 0
+    crashed: bool = False
+    closed: bool = False
+    idle_since: float = 0.0
+
+    @property
+    def usable(self) -> bool:
+        return not (self.crashed or self.closed or self.page.is_closed())
+
+
+def get_page_key(
+    scope: Optional[str],
+    site: Optional[str],
+    kwargs: Dict[str, Any],
+) -> str:
+    return json.dumps([scope, site, kwargs], sort_keys=True, default=str)
+
+
+@dataclass
+class PagePool:
+    max_size: int
+    max_uses: int
+    idle: Dict[str, List[PooledPage]] = field(default_factory=dict)
+    live: int = 0
+    recycling: Set["asyncio.Task[None]"] = field(default_factory=set)
+    _semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # 在事件循环启动后才创建，避免绑定到错误的事件循环
+        if not self._semaphore:
+            self._semaphore = asyncio.Semaphore(self.max_size)
+        return self._semaphore
+
+    @property
+    def idle_count(self) -> int:
+        return sum(len(x) for x in self.idle.values())
+
+    async def new_page(
+        self,
+        scope: Optional[str],
+        site: Optional[str],
+        kwargs: Dict[str, Any],
+    ) -> PooledPage:
+        # 先占位再创建，创建过程中的页面也要计入总数
+        self.live += 1
+        try:
+            browser = await get_browser()
+            page = await browser.new_page(**{"device_scale_factor": 2, **kwargs})
+        except BaseException:
+            self.live -= 1
+            raise
+
+        key = get_page_key(scope, site, kwargs)
+        pooled = PooledPage(page, key, scope, kwargs)
+
+        def on_crash(*_):
+            pooled.crashed = True
+
+        page.once("crash", on_crash)
+
+        try:
+            for router in registered_routers:
+                if router.scope == scope:
+                    await route_page(page, router, site=site)
+            if scope == ROUTER_SCOPE_RES:
+                await page.goto(RES_ROUTE_URL)
+        except BaseException:
+            await self.close(pooled)
+            raise
+        return pooled
+
+    def put_idle(self, pooled: PooledPage):
+        pooled.idle_since = time.monotonic()
+        self.idle.setdefault(pooled.key, []).append(pooled)
+
+    def take_idle(self, key: str) -> Optional[PooledPage]:
+        pages = self.idle.get(key)
+        while pages:
+            pooled = pages.pop()
+            if pooled.usable:
+                return pooled
+            self.close_later(pooled)
+        return None
+
+    def take_oldest_idle(self) -> Optional[PooledPage]:
+        pages = [y for x in self.idle.values() for y in x]
+        if not pages:
+            return None
+        pooled = min(pages, key=lambda x: x.idle_since)
+        self.idle[pooled.key].remove(pooled)
+        return pooled
+
+    async def reset(self, pooled: PooledPage):
+        if viewport := pooled.kwargs.get("viewport"):
+            await pooled.page.set_viewport_size(viewport)
+        await pooled.page.goto(
+            RES_ROUTE_URL if pooled.scope == ROUTER_SCOPE_RES else PAGE_BLANK_URL,
+        )
+
+    def forget(self, pooled: PooledPage) -> bool:
+        """将页面移出计数，页面已经被移出过时返回 False"""
+
+        if pooled.closed:
+            return False
+        pooled.closed = True
+        self.live -= 1
+        return True
+
+    async def close_context(self, pooled: PooledPage):
+        with suppress(Exception):
+            await pooled.page.context.close()
+
+    async def close(self, pooled: PooledPage):
+        if self.forget(pooled):
+            await self.close_context(pooled)
+
+    def close_later(self, pooled: PooledPage):
+        if self.forget(pooled):
+            self.run_background(self.close_context(pooled))
+
+    def run_background(self, coro: Awaitable[None]):
+        task = asyncio.ensure_future(coro)
+        self.recycling.add(task)
+        task.add_done_callback(self.recycling.discard)
+
+    async def recycle(self, pooled: PooledPage):
+        try:
+            keep = pooled.usable and pooled.uses < self.max_uses
+            if keep:
+                try:
+                    await self.reset(pooled)
+                except Exception:
+                    logger.opt(exception=True).debug("Failed to reset pooled page")
+                    keep = False
+
+            if keep and pooled.usable:
+                self.put_idle(pooled)
+            else:
+                await self.close(pooled)
+        finally:
+            self.semaphore.release()
+
+    @asynccontextmanager
+    async def acquire(
+        self,
+        scope: Optional[str] = None,
+        site: Optional[str] = None,
+        **kwargs,
+    ) -> AsyncIterator[Page]:
+        await self.semaphore.acquire()
+        try:
+            pooled = self.take_idle(get_page_key(scope, site, kwargs))
+            if not pooled:
+                # 持有信号量时其他使用中的页面最多 max_size - 1 个，
+                # 所以池满时一定有可以关闭的空闲页面
+                while self.live >= self.max_size and (
+                    oldest := self.take_oldest_idle()
+                ):
+                    await self.close(oldest)
+                pooled = await self.new_page(scope, site, kwargs)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+        pooled.uses += 1
+        try:
+            yield pooled.page
+        except BaseException:
+            # 出错时页面状态未知，不再复用
+            pooled.crashed = True
+            raise
+        finally:
+            self.run_background(self.recycle(pooled))
+
+    async def warmup(
+        self,
+        count: int,
+        scope: Optional[str] = ROUTER_SCOPE_RES,
+        site: Optional[str] = None,
+        **kwargs,
+    ):
+        async def warm_one():
+            # 与 acquire 一样先占用信号量，池满时不再预热，
+            # 避免和正在使用的页面一起超出上限
+            async with self.semaphore:
+                if self.live >= self.max_size:
+                    return
+                self.put_idle(await self.new_page(scope, site, kwargs))
+
+        results = await asyncio.gather(
+            *(warm_one() for _ in range(min(count, self.max_size))),
+            return_exceptions=True,
+        )
+        for e in results:
+            if isinstance(e, BaseException):
+                logger.opt(exception=e).warning("Failed to warm up page")
+        logger.debug(f"Warmed up {self.idle_count} page(s)")
+
+    async def clear(self):
+        if self.recycling:
+            await asyncio.gather(*self.recycling, return_exceptions=True)
+        pages = [y for x in self.idle.values() for y in x]
+        self.idle.clear()
+        await asyncio.gather(*(self.close(x) for x in pages))
+
+
+page_pool = PagePool(
+    max_size=config.ba_page_pool_size,
+    max_uses=config.ba_page_pool_max_uses,
+)
+
+
+# endregion
+
+
+# region render scheduler
+
+
+# 所有用到浏览器页面的任务都要先在这里排队
+# 优先级数字越小越先执行，同优先级下每个用户轮流执行，队列过长时直接拒绝
+
+RENDER_JOB_TEMPLATE = "template"
+RENDER_JOB_LOGO = "logo"
+RENDER_JOB_SCREENSHOT = "screenshot"
+
+RENDER_JOB_PRIORITY: Dict[str, int] = {
+    RENDER_JOB_TEMPLATE: 0,
+    RENDER_JOB_LOGO: 0,
+    RENDER_JOB_SCREENSHOT: 10,
+}
+
+
+class RenderQueueFullError(Exception):
+    pass
+
+
+@dataclass
+class RenderJobStats:
+    count: int = 0
+    failed: int = 0
+    rejected: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    render_total: float = 0.0
+    render_max: float = 0.0
+
+    @property
+    def wait_avg(self) -> float:
+        return self.wait_total / self.count if self.count else 0.0
+
+    @property
+    def render_avg(self) -> float:
+        return self.render_total / self.count if self.count else 0.0
+
+    def record(self, wait: float, render: float):
+        self.count += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.render_total += render
+        self.render_max = max(self.render_max, render)
+
+
+@dataclass(order=True)
+class RenderWaiter:
+    priority: int
+    turn: int  # 该用户入队时已有的任务数，用于在用户之间轮转
+    seq: int
+    future: "asyncio.Future[None]" = field(compare=False)
+
+
+def get_current_user_id() -> Optional[str]:
+    event = current_event.get(None)
+    if not event:
+        return None
+    try:
+        return event.get_user_id()
+    except Exception:
+        return None
+
+
+class RenderScheduler:
+    def __init__(self, max_concurrency: int, max_queue: int, max_user_jobs: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_user_jobs = max_user_jobs
+
+        self.running = 0
+        self.queued = 0
+        self.queue: List[RenderWaiter] = []
+        self.user_jobs: Dict[str, int] = {}
+        self.stats: Dict[str, RenderJobStats] = {}
+        self._seq = itertools.count()
+
+    def _release(self):
+        # 直接把名额交给下一个等待中的任务
+        while self.queue:
+            waiter = heapq.heappop(self.queue)
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+                return
+        self.running -= 1
+
+    async def _wait(self, priority: int, user_id: Optional[str]):
+        waiter = RenderWaiter(
+            priority,
+            self.user_jobs.get(user_id, 1) - 1 if user_id else 0,
+            next(self._seq),
+            asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self.queue, waiter)
+        self.queued += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release()
+            else:
+                waiter.future.cancel()
+            raise
+        finally:
+            self.queued -= 1
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        job_type: str,
+        user_id: Optional[str] = None,
+    ) -> AsyncIterator[None]:
+        stats = self.stats.setdefault(job_type, RenderJobStats())
+        user_id = user_id or get_current_user_id()
+
+        queue_full = self.queued >= self.max_queue
+        if (queue_full and self.running >= self.max_concurrency) or (
+            user_id and self.user_jobs.get(user_id, 0) >= self.max_user_jobs
+        ):
+            stats.rejected += 1
+            raise RenderQueueFullError
+
+        if user_id:
+            self.user_jobs[user_id] = self.user_jobs.get(user_id, 0) + 1
+
+        try:
+            enqueued_at = time.perf_counter()
+            if self.running < self.max_concurrency and not self.queue:
+                self.running += 1
+            else:
+                await self._wait(RENDER_JOB_PRIORITY.get(job_type, 0), user_id)
+            started_at = time.perf_counter()
+
+            try:
+                yield
+            except BaseException:
+                stats.failed += 1
+                raise
+            finally:
+                self._release()
+                ended_at = time.perf_counter()
+                wait, render = started_at - enqueued_at, ended_at - started_at
+                stats.record(wait, render)
+                logger.debug(
+                    f"Render job `{job_type}` finished, "
+                    f"waited {wait:.3f}s, rendered {render:.3f}s",
+                )
+
+        finally:
+            if user_id:
+                self.user_jobs[user_id] -= 1
+                if not self.user_jobs[user_id]:
+                    del self.user_jobs[user_id]
+
+
+render_scheduler = RenderScheduler(
+    max_concurrency=config.ba_page_pool_size,
+    max_queue=config.ba_render_queue_max,
+    max_user_jobs=config.ba_render_queue_user_max,
+)
+
+
+@asynccontextmanager
+async def get_pooled_page(
+    job_type: str = RENDER_JOB_SCREENSHOT,
+    site: Optional[str] = None,
+    **kwargs,
+) -> AsyncIterator[Page]:
+    scope = ROUTER_SCOPE_FILTER if config.ba_screenshot_filter else None
+    pooled_page = page_pool.acquire(scope, site, **kwargs)
+    async with render_scheduler.slot(job_type), pooled_page as page:
+        yield page
+
+
 @asynccontextmanager
-async def get_routed_page(**kwargs) -> AsyncIterator[Page]:
-    async with get_new_page(**kwargs) as page:
-        for router in registered_routers:
-            await route_page(page, router)
-        await page.goto(RES_ROUTE_URL)
+async def get_routed_page(
+    job_type: str = RENDER_JOB_TEMPLATE,
+    **kwargs,
+) -> AsyncIterator[Page]:
+    pooled_page = page_pool.acquire(ROUTER_SCOPE_RES, **kwargs)
+    async with render_scheduler.slot(job_type), pooled_page as page:
         yield page
 
 
+# endregion
+
+
+driver = get_driver()
+
+
+@driver.on_startup
+async def _():
+    if config.ba_page_pool_warmup > 0:
+        # 浏览器启动很慢，放到后台预热，不阻塞 Bot 启动
+        page_pool.run_background(page_pool.warmup(config.ba_page_pool_warmup))
+
+
+@driver.on_shutdown
+async def _():
+    await page_pool.clear()
+
+
 async def render_html(
     html: str,
     selector: str = "body",
     img_format: Literal["png", "jpeg"] = "jpeg",
     **page_kwargs,
 ) -> bytes:
-    from pathlib import Path
-
-    Path("debug.html").write_text(html, encoding="u8")
-
     async with get_routed_page(**page_kwargs) as page:
         await page.set_content(html)
         elem = await page.query_selector(selector)
@@ -110,44 +565,256 @@ def get_template_renderer(
     return renderer
 
 
-# region routers
+# region request filter
 
 
-@bawiki_router(rf"^{RES_ROUTE_URL}/?$")
-async def _(route: Route, **_):
-    html = EMPTY_HTML_PATH.read_text()
-    return await route.fulfill(body=html, content_type="text/html")
+# 截取外部网页时拦截统计、广告等请求，并把静态资源缓存到本地
 
+SITE_SCHALE = "schale"
+SITE_GAMEKEE = "gamekee"
+SITE_SHITTIM = "shittim"
 
-@bawiki_router(rf"^{RES_ROUTE_URL}/{RES_TYPE_FONT}/([^/]+?)/?$")
-async def _(url: URL, route: Route, **_):
-    family = url.parts[-1]
-    style = url.query.get("style", "normal")
-    weight = url.query.get("weight", "normal")
+STATIC_RESOURCE_TYPES = {"script", "stylesheet", "image", "font"}
+SKIPPED_ASSET_HEADERS = {
+    "connection",
+    "content-encoding",
+    "content-length",
+    "set-cookie",
+    "transfer-encoding",
+}
+
+PAGE_ASSET_CACHE_DIR = CACHE_DIR / "page_asset"
+if config.ba_auto_clear_cache_path and PAGE_ASSET_CACHE_DIR.exists():
+    shutil.rmtree(PAGE_ASSET_CACHE_DIR)
+if not PAGE_ASSET_CACHE_DIR.exists():
+    PAGE_ASSET_CACHE_DIR.mkdir(parents=True)
+
+page_asset_cache_limit = DiskCacheLimit(
+    PAGE_ASSET_CACHE_DIR,
+    mb_to_bytes(config.ba_screenshot_asset_cache_max_mb),
+)
+
+
+class PageAssetMeta(BaseModel):
+    url: str
+    status: int
+    headers: Dict[str, str]
+    stored_at: float
+
+
+def match_domain(host: str, domains: Iterable[str]) -> bool:
+    return any(host == x or host.endswith(f".{x}") for x in domains)
+
+
+def should_block_request(site: Optional[str], request: Request) -> bool:
+    # 页面本身的导航请求永远不拦截
+    if request.is_navigation_request() and not request.frame.parent_frame:
+        return False
+
+    host = URL(request.url).host or ""
+    site_filter = config.ba_screenshot_site_filters.get(site) if site else None
+    if site_filter and match_domain(host, site_filter.allow_domains):
+        return False
+
+    block_types = (
+        site_filter.block_resource_types
+        if site_filter and (site_filter.block_resource_types is not None)
+        else config.ba_screenshot_block_resource_types
+    )
+    if request.resource_type in block_types:
+        return True
+
+    return match_domain(host, config.ba_screenshot_block_domains) or bool(
+        site_filter and match_domain(host, site_filter.block_domains),
+    )
+
+
+def get_page_asset_paths(url: str) -> Tuple[anyio.Path, anyio.Path]:
+    name = hashlib.sha256(url.encode()).hexdigest()
+    return (
+        anyio.Path(PAGE_ASSET_CACHE_DIR / f"{name}.json"),
+        anyio.Path(PAGE_ASSET_CACHE_DIR / f"{name}.bin"),
+    )
+
+
+async def load_page_asset(url: str) -> Optional[Tuple[PageAssetMeta, bytes]]:
+    meta_path, body_path = get_page_asset_paths(url)
+    if not ((await meta_path.exists()) and (await body_path.exists())):
+        return None
+    try:
+        meta = PageAssetMeta(**json.loads(await meta_path.read_text("u8")))
+        body = await body_path.read_bytes()
+        # 更新修改时间，清理缓存时最近用到的资源会留到最后
+        for path in (meta_path, body_path):
+            await path.touch()
+        return meta, body
+    except Exception as e:
+        logger.warning(f"Failed to load page asset cache of `{url}`: {e!r}")
+        return None
+
+
+async def save_page_asset(url: str, status: int, headers: Dict[str, str], body: bytes):
+    if "no-store" in headers.get("cache-control", "").lower():
+        return
+
+    meta = PageAssetMeta(
+        url=url,
+        status=status,
+        headers={
+            k: v for k, v in headers.items() if k.lower() not in SKIPPED_ASSET_HEADERS
+        },
+        stored_at=time.time(),
+    )
+    meta_path, body_path = get_page_asset_paths(url)
+    for path, content in (
+        (body_path, body),
+        (meta_path, json.dumps(model_dump(meta)).encode("u8")),
+    ):
+        # 多个页面可能同时请求同一个资源
+        tmp_path = path.with_suffix(f"{path.suffix}.{secrets.token_hex(4)}.tmp")
+        await tmp_path.write_bytes(content)
+        await tmp_path.replace(path)
+    await page_asset_cache_limit.record_write(len(body))
+
+
+async def serve_page_asset(route: Route, request: Request):
+    cached = await load_page_asset(request.url)
+    if cached:
+        meta, body = cached
+        if time.time() - meta.stored_at < config.ba_screenshot_asset_cache_ttl:
+            return await route.fulfill(
+                status=meta.status,
+                headers=meta.headers,
+                body=body,
+            )
+
+    try:
+        resp = await route.fetch()
+    except Exception as e:
+        if not cached:
+            logger.debug(f"Failed to fetch page asset `{request.url}`: {e!r}")
+            return await route.abort()
+        # 请求失败时使用过期的缓存
+        meta, body = cached
+        return await route.fulfill(status=meta.status, headers=meta.headers, body=body)
+
+    body = await resp.body()
+    if resp.status == 200:
+        await save_page_asset(request.url, resp.status, resp.headers, body)
+    return await route.fulfill(response=resp, body=body)
+
+
+# endregion
+
+
+# region resource cache
+
+
+# bawiki.res 下的资源与字体文件会缓存在内存中，文件修改后会自动重新读取
+# 注：开启了请求拦截的页面 Chromium 不会使用 HTTP 缓存，所以每次都直接返回完整内容
+
+
+@dataclass
+class ResourceCacheItem:
+    mtime_ns: int
+    size: int
+    body: bytes
+
+
+class ResourceCache:
+    def __init__(self, max_bytes: Optional[int] = None) -> None:
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.items: OrderedDict[str, ResourceCacheItem] = OrderedDict()
+
+    def _remove(self, key: str):
+        if item := self.items.pop(key, None):
+            self.used -= item.size
+
+    def _put(self, key: str, item: ResourceCacheItem):
+        self._remove(key)
+        if self.max_bytes and item.size > self.max_bytes:
+            return
+        while self.max_bytes and self.items and self.used + item.size > self.max_bytes:
+            self._remove(next(iter(self.items)))
+        self.items[key] = item
+        self.used += item.size
+
+    async def get(self, path: Path) -> ResourceCacheItem:
+        apath = anyio.Path(path)
+        stat = await apath.stat()
+        key = str(path)
+
+        item = self.items.get(key)
+        if item and item.mtime_ns == stat.st_mtime_ns and item.size == stat.st_size:
+            self.items.move_to_end(key)
+            return item
+
+        body = await apath.read_bytes()
+        item = ResourceCacheItem(stat.st_mtime_ns, len(body), body)
+        self._put(key, item)
+        return item
+
+    def clear(self):
+        self.items.clear()
+        self.used = 0
+
+
+resource_cache = ResourceCache(
+    int(config.ba_res_cache_max_mb * 1024 * 1024) or None,
+)
+
+
+@functools.lru_cache(maxsize=64)
+def resolve_font_path(family: str, style: str, weight: str) -> str:
     try:
         font = Font.find(
             family,
-            style=style,
-            weight=weight,
+            style=style,  # type: ignore
+            weight=weight,  # type: ignore
             fallback_to_default=False,
         )
     except Exception:
         logger.info(f"Font `{family}` not found, use fallback font")
         font = get_proper_font("国", style=style, weight=weight)  # type: ignore
+    return str(font.path)
+
+
+async def fulfill_resource(route: Route, path: Path, mime: str):
+    item = await resource_cache.get(path)
+    return await route.fulfill(body=item.body, content_type=mime)
+
+
+# endregion
+
+
+# region routers
 
-    file_path = anyio.Path(font.path)
+
+@bawiki_router(rf"^{RES_ROUTE_URL}/?$")
+async def _(route: Route, **_):
+    return await fulfill_resource(route, EMPTY_HTML_PATH, "text/html")
+
+
+@bawiki_router(rf"^{RES_ROUTE_URL}/{RES_TYPE_FONT}/([^/]+?)/?$")
+async def _(url: URL, route: Route, **_):
+    family = url.parts[-1]
+    style = url.query.get("style", "normal")
+    weight = url.query.get("weight", "normal")
+
+    file_path = Path(resolve_font_path(family, style, weight))
     mime = f"font/{file_path.suffix[1:]}"
 
     logger.debug(f"Resolved font `{family}`, file path: {file_path}")
-    return await route.fulfill(body=await file_path.read_bytes(), content_type=mime)
+    return await fulfill_resource(route, file_path, mime)
 
 
 @bawiki_router(rf"^{RES_ROUTE_URL}/(.+)$", priority=99)
 async def _(url: URL, route: Route, **_):
     res_path = url.parts[1:]
-    file_path = anyio.Path(RES_DIR.joinpath(*res_path))
+    file_path = RES_DIR.joinpath(*res_path)
 
-    if not await file_path.exists():
+    if not await anyio.Path(file_path).is_file():
         logger.debug(f"Resource `{res_path}` not found")
         return await route.abort()
 
@@ -155,10 +822,27 @@ async def _(url: URL, route: Route, **_):
     logger.debug(
         f"Resolved resource `{'/'.join(res_path)}`, mimetype: {mime}, real path: {file_path}",
     )
-    return await route.fulfill(
-        body=await file_path.read_bytes(),
-        content_type=mime or "application/octet-stream",
+    return await fulfill_resource(
+        route,
+        file_path,
+        mime or "application/octet-stream",
     )
 
 
+@bawiki_router(r"^https?://", scope=ROUTER_SCOPE_FILTER)
+async def _(route: Route, request: Request, site: Optional[str] = None, **_):
+    if should_block_request(site, request):
+        logger.debug(f"Blocked request: {request.resource_type} {request.url}")
+        return await route.abort("blockedbyclient")
+
+    if (
+        config.ba_screenshot_asset_cache_ttl > 0
+        and request.method == "GET"
+        and request.resource_type in STATIC_RESOURCE_TYPES
+    ):
+        return await serve_page_asset(route, request)
+
+    return await route.continue_()
+
+
 # endregion
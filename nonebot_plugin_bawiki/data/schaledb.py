@@ -3,14 +3,14 @@ import math
 import time
 from datetime import datetime, timedelta
 from io import BytesIO
-from typing import Any, Dict, List, NamedTuple, Optional, cast
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, cast
 from typing_extensions import Unpack
 
-from nonebot_plugin_htmlrender import get_new_page
+from nonebot import logger
 from PIL import Image, ImageFilter
 from PIL.Image import Resampling
 from pil_utils import BuildImage, Text2Image, text2image
-from playwright.async_api import Page, ViewportSize
+from playwright.async_api import ViewportSize
 
 from ..config import config
 from ..resource import (
@@ -23,11 +23,20 @@ from ..util import (
     AsyncReqKwargs,
     RespType as Rt,
     async_req,
+    circle_corner,
     img_invert_rgba,
+    load_screenshot_cache,
+    make_fingerprint,
     parse_time_delta,
+    read_file_cached,
     read_image,
+    read_image_resized,
+    run_render,
+    save_screenshot_cache,
     split_list,
+    stale_async_req,
 )
+from .playwright import SITE_SCHALE, get_pooled_page
 
 PAGE_KWARGS = {
     "is_mobile": True,
@@ -35,13 +44,19 @@ PAGE_KWARGS = {
 }
 
 
-async def schale_get(url: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
-    kwargs["base_urls"] = config.ba_schale_url
-    return await async_req(url, **kwargs)
+async def schale_get(
+    url: str,
+    *,
+    stale: bool = False,
+    **kwargs: Unpack[AsyncReqKwargs],
+) -> Any:
+    kwargs["base_urls"] = [config.ba_schale_url, *config.ba_schale_mirror_urls]
+    kwargs.setdefault("disk_cache", True)
+    return await (stale_async_req if stale else async_req)(url, **kwargs)
 
 
 async def schale_get_stu_data(loc: str = "cn") -> List[Dict[str, Any]]:
-    return await schale_get(f"data/{loc}/students.min.json")
+    return await schale_get(f"data/{loc}/students.min.json", stale=True)
 
 
 async def schale_get_config() -> Dict[str, Any]:
@@ -60,8 +75,41 @@ async def schale_get_stu_dict(key: str = "Name") -> dict:
     return {x[key]: x for x in await schale_get_stu_data()}
 
 
+async def get_schale_stu_fingerprint(stu: str) -> Optional[str]:
+    entry = next(
+        (x for x in await schale_get_stu_data() if x["PathName"] == stu),
+        None,
+    )
+    if not entry:
+        return None
+    return make_fingerprint(
+        config.ba_schale_url,
+        entry,
+        (await read_file_cached(SCHALE_UTIL_CSS_PATH)).decode("u8"),
+        (await read_file_cached(SCHALE_UTIL_JS_PATH)).decode("u8"),
+    )
+
+
 async def schale_get_stu_info(stu: str) -> bytes:
-    async with cast(Page, get_new_page(**PAGE_KWARGS)) as page:
+    try:
+        fingerprint = await get_schale_stu_fingerprint(stu)
+    except Exception:
+        logger.exception(f"获取学生 {stu} 的数据指纹失败")
+        fingerprint = None
+
+    if fingerprint and (
+        cached := await load_screenshot_cache("schale", stu, fingerprint)
+    ):
+        return cached[0]
+
+    img = await screenshot_schale_stu_info(stu)
+    if fingerprint:
+        await save_screenshot_cache("schale", stu, fingerprint, [img])
+    return img
+
+
+async def screenshot_schale_stu_info(stu: str) -> bytes:
+    async with get_pooled_page(site=SITE_SCHALE, **PAGE_KWARGS) as page:
         await page.goto(config.ba_schale_url, wait_until="domcontentloaded")
 
         await page.goto(
@@ -115,108 +163,326 @@ def find_current_event(
     return None
 
 
-async def schale_get_calender(
-    server_index: int,
-    students: Dict[str, Dict],
-    s_config: dict,
-    localization: dict,
-    raids: dict,
-) -> BytesIO:
-    region = s_config["Regions"][server_index]
-    now = datetime.now().astimezone()
+def format_event_time(r: CurrentEventTuple) -> str:
+    dd, hh, mm, ss = parse_time_delta(r.remain)
+    return (
+        f"{r.start} ~ {r.end} | "
+        f"剩余 [b][color=#fc6475]{dd}天 {hh:0>2d}:{mm:0>2d}:{ss:0>2d}[color=#fc6475][/b]"
+    )
+
+
+# 以下 render_ 开头的函数会被提交到绘图线程 / 进程池执行，
+# 参数与返回值都需要可以被 pickle
+
+
+def render_calender_panel(title: str, r: CurrentEventTuple) -> BuildImage:
+    pic = BuildImage.new("RGBA", (1400, 640), (255, 255, 255, 70)).draw_text(
+        (25, 25, 1375, 150),
+        title,
+        weight="bold",
+        max_fontsize=80,
+    )
+    return pic.paste(
+        ti := text2image(
+            format_event_time(r),
+            (255, 255, 255, 0),
+            fontsize=45,
+            max_width=1350,
+            align="center",
+        ),
+        (int((1400 - ti.width) / 2), 150),
+        alpha=True,
+    )
 
-    pic_bg = BuildImage.new("RGBA", (1400, 640), (255, 255, 255, 70))
 
-    def format_time(_start: datetime, _end: datetime, _remain: timedelta) -> str:
-        dd, hh, mm, ss = parse_time_delta(_remain)
+def render_calender_gacha(
+    r: CurrentEventTuple,
+    names: List[str],
+    avatars: List[bytes],
+) -> BuildImage:
+    pic = render_calender_panel("特选招募", r)
+
+    x_index = int((1400 - (300 + 25) * len(avatars) + 25) / 2)
+    for name, avatar in zip(names, avatars):
+        p = (
+            BuildImage.open(BytesIO(avatar))
+            .resize((300, 340))
+            .paste(
+                BuildImage.new("RGBA", (300, 65), (255, 255, 255, 120)),
+                (0, 275),
+                alpha=True,
+            )
+            .convert("RGB")
+            .circle_corner(25)
+            .draw_text((0, 275, 300, 340), name, max_fontsize=50)
+        )
+        pic = pic.paste(p, (x_index, 250), alpha=True)
+        x_index += p.width + 25
+
+    return pic
+
+
+def render_calender_event(
+    r: CurrentEventTuple,
+    ev_name: str,
+    ev_bg: bytes,
+    ev_img: bytes,
+) -> BuildImage:
+    pic = render_calender_panel("当前活动", r)
+
+    bg = (
+        BuildImage.open(BytesIO(ev_bg))
+        .convert("RGBA")
+        .resize_height(340)
+        .filter(ImageFilter.GaussianBlur(3))
+    )
+    bg = (
+        bg.paste(
+            BuildImage.open(BytesIO(ev_img))
+            .convert("RGBA")
+            .resize(
+                (bg.width, bg.height - 65),
+                keep_ratio=True,
+                inside=True,
+                bg_color=(255, 255, 255, 0),
+            ),
+            alpha=True,
+        )
+        .paste(
+            BuildImage.new("RGBA", (bg.width, 65), (255, 255, 255, 120)),
+            (0, bg.height - 65),
+            alpha=True,
+        )
+        .convert("RGB")
+        .circle_corner(25)
+        .draw_text(
+            (0, bg.height - 65, bg.width, bg.height),
+            ev_name,
+            max_fontsize=50,
+        )
+    )
+    return pic.paste(
+        bg,
+        (int((pic.width - bg.width) / 2), 250),
+        alpha=True,
+    )
+
+
+def render_raid_icon(icon: bytes, color: Any, invert: bool = False) -> BuildImage:
+    if invert:
         return (
-            f"{_start} ~ {_end} | "
-            f"剩余 [b][color=#fc6475]{dd}天 {hh:0>2d}:{mm:0>2d}:{ss:0>2d}[color=#fc6475][/b]"
+            BuildImage.new("RGBA", (64, 64), color)
+            .paste(
+                img_invert_rgba(Image.open(BytesIO(icon)).convert("RGBA")),
+                (-2, -2),
+                alpha=True,
+            )
+            .circle()
         )
+    return (
+        BuildImage.new("RGBA", (64, 64), color)
+        .paste(
+            BuildImage.open(BytesIO(icon)).convert("RGBA").resize_height(48),
+            (8, 8),
+            alpha=True,
+        )
+        .circle()
+    )
 
-    async def draw_gacha():
-        c_gacha = region["CurrentGacha"]
-        if not (r := find_current_event(c_gacha)):
-            return None
 
-        pic = pic_bg.copy().draw_text(
-            (25, 25, 1375, 150),
-            "特选招募",
-            weight="bold",
-            max_fontsize=80,
+def render_calender_raid(
+    r: CurrentEventTuple,
+    title: str,
+    stage_name: str,
+    atk_color: Tuple[int, int, int],
+    def_color: Tuple[int, int, int],
+    images: Tuple[bytes, bytes, bytes, bytes, bytes],
+) -> BuildImage:
+    pic = render_calender_panel(title, r)
+
+    c_bg, c_fg, icon_def, icon_atk, icon_tr = images
+    icon_def = render_raid_icon(icon_def, def_color)
+    icon_atk = render_raid_icon(icon_atk, atk_color)
+    icon_tr = render_raid_icon(icon_tr, "#ffffff", invert=True)
+
+    bg = (
+        BuildImage.open(BytesIO(c_bg))
+        .convert("RGBA")
+        .resize_height(340)
+        .filter(ImageFilter.GaussianBlur(3))
+    )
+    fg = BuildImage.open(BytesIO(c_fg)).convert("RGBA").resize_height(bg.height)
+    bg = (
+        bg.paste(
+            fg,
+            (int((bg.width - fg.width) / 2), 0),
+            alpha=True,
         )
-        g = r.event
-        t = format_time(r.start, r.end, r.remain)
-        pic = pic.paste(
-            ti := text2image(
-                t,
-                (255, 255, 255, 0),
-                fontsize=45,
-                max_width=1350,
-                align="center",
-            ),
-            (int((1400 - ti.width) / 2), 150),
+        .paste(
+            BuildImage.new("RGBA", (bg.width, 65), (255, 255, 255, 120)),
+            (0, bg.height - 65),
             alpha=True,
         )
-        stu = [students[x] for x in g["characters"]]
-
-        async def process_avatar(s: dict):
-            return (
-                BuildImage.open(
-                    BytesIO(
-                        await schale_get(
-                            f'images/student/collection/{s["Id"]}.webp',
-                            resp_type=Rt.BYTES,
-                        ),
-                    ),
-                )
-                .resize((300, 340))
-                .paste(
-                    BuildImage.new("RGBA", (300, 65), (255, 255, 255, 120)),
-                    (0, 275),
+        .paste(icon_atk, (10, 10), alpha=True)
+        .paste(icon_def, (10, 79), alpha=True)
+        .paste(icon_tr, (10, 147), alpha=True)
+        .convert("RGB")
+        .circle_corner(25)
+        .draw_text(
+            (0, bg.height - 65, bg.width, bg.height),
+            stage_name,
+            max_fontsize=50,
+        )
+    )
+    return pic.paste(bg, (int((pic.width - bg.width) / 2), 250), alpha=True)
+
+
+def render_calender_birth(
+    birth_this_week: List[dict],
+    birth_next_week: List[dict],
+    icons: List[bytes],
+) -> BuildImage:
+    img_per_line = 7
+    p_h = 0
+    if birth_this_week:
+        p_h += 70 + 220 * math.ceil(len(birth_this_week) / img_per_line)
+
+    if birth_next_week:
+        p_h += 70 + 220 * math.ceil(len(birth_next_week) / img_per_line)
+        if birth_this_week:
+            p_h += 25
+
+    padding = 25
+    min_height = 640
+    title_h = 125
+    height = max(padding * 3 + title_h + p_h, min_height)
+    width = 1400
+    pic = BuildImage.new("RGBA", (width, height), (255, 255, 255, 70)).draw_text(
+        (25, 25, 1375, 150),
+        "学生生日",
+        weight="bold",
+        max_fontsize=80,
+    )
+    stu_pics = [
+        BuildImage.open(BytesIO(x)).convert("RGBA").resize_height(180).circle()
+        for x in icons
+    ]
+
+    y_offset = title_h + padding
+    if height >= min_height:
+        y_offset += (height - (padding // 2) - title_h - p_h) // 2
+
+    def draw_birth_stu(title: str, students: List[dict]):
+        nonlocal y_offset
+
+        subtitle = Text2Image.from_text(title, fontsize=45)
+        subtitle.draw_on_image(pic.image, ((width - subtitle.width) // 2, y_offset))
+        y_offset += 70
+
+        for line in split_list(students, img_per_line):
+            x_offset = (width - (190 * len(line))) // 2
+            for stu in line:
+                pic.paste(
+                    stu_pics.pop(0),
+                    (x_offset, y_offset),
                     alpha=True,
+                ).draw_text(
+                    (x_offset, y_offset + 180, x_offset + 180, y_offset + 220),
+                    stu["BirthDay"],
                 )
-                .convert("RGB")
-                .circle_corner(25)
-                .draw_text((0, 275, 300, 340), s["Name"], max_fontsize=50)
-            )
+                x_offset += 190
+            y_offset += 220
 
-        avatars = await asyncio.gather(*[process_avatar(x) for x in stu])
-        ava_len = len(avatars)
-        x_index = int((1400 - (300 + 25) * ava_len + 25) / 2)
+    if birth_this_week:
+        draw_birth_stu("本周", birth_this_week)
+        y_offset += 25
 
-        for p in avatars:
-            pic = pic.paste(p, (x_index, 250), alpha=True)
-            x_index += p.width + 25
+    if birth_next_week:
+        draw_birth_stu("下周", birth_next_week)
 
-        return pic
+    return pic
 
-    async def draw_event():
-        c_event = region["CurrentEvents"]
-        if not (r := find_current_event(c_event)):
-            return None
 
-        pic = pic_bg.copy().draw_text(
-            (25, 25, 1375, 150),
-            "当前活动",
+def render_calender(
+    img: List[BuildImage],
+    title: str,
+    banner: BuildImage,
+    gradient_bg: BuildImage,
+) -> BytesIO:
+    if not img:
+        img.append(
+            BuildImage.new("RGBA", (1400, 640), (255, 255, 255, 70)).draw_text(
+                (0, 0, 1400, 640),
+                "没有获取到任何数据",
+                max_fontsize=60,
+            ),
+        )
+
+    bg_w = 1500
+    bg_h = 200 + sum([x.height + 50 for x in img])
+    bg = (
+        BuildImage.new("RGBA", (bg_w, bg_h))
+        .paste(banner)
+        .draw_text(
+            (50, 0, 1480, 150),
+            title,
+            max_fontsize=100,
             weight="bold",
-            max_fontsize=80,
+            fill="#ffffff",
+            halign="left",
+        )
+        .paste(
+            gradient_bg.resize(
+                (1500, bg_h - 150),
+                resample=Resampling.NEAREST,
+            ),
+            (0, 150),
         )
+    )
+
+    h_index = 200
+    for im in img:
+        bg.paste(circle_corner(im, 10), (50, h_index), alpha=True)
+        h_index += im.height + 50
+    return bg.convert("RGB").save("JPEG")
+
+
+async def schale_get_calender(
+    server_index: int,
+    students: Dict[str, Dict],
+    s_config: dict,
+    localization: dict,
+    raids: dict,
+) -> BytesIO:
+    region = s_config["Regions"][server_index]
+    now = datetime.now().astimezone()
+
+    async def draw_gacha():
+        if not (r := find_current_event(region["CurrentGacha"])):
+            return None
 
-        g = r.event
-        t = format_time(r.start, r.end, r.remain)
-        pic = pic.paste(
-            ti := text2image(
-                t,
-                (255, 255, 255, 0),
-                fontsize=45,
-                max_width=1350,
-                align="center",
+        stu = [students[x] for x in r.event["characters"]]
+        avatars = await asyncio.gather(
+            *(
+                schale_get(
+                    f'images/student/collection/{s["Id"]}.webp',
+                    resp_type=Rt.BYTES,
+                )
+                for s in stu
             ),
-            (int((1400 - ti.width) / 2), 150),
-            alpha=True,
         )
-        ev = g["event"]
+        return await run_render(
+            render_calender_gacha,
+            r,
+            [s["Name"] for s in stu],
+            list(avatars),
+        )
+
+    async def draw_event():
+        if not (r := find_current_event(region["CurrentEvents"])):
+            return None
+
+        ev = r.event["event"]
         ev_name = ""
         if ev >= 10000:
             ev_name = " (复刻)"
@@ -233,76 +499,19 @@ async def schale_get_calender(
                 resp_type=Rt.BYTES,
             ),
         )
-
-        ev_bg = (
-            BuildImage.open(BytesIO(ev_bg))
-            .convert("RGBA")
-            .resize_height(340)
-            .filter(ImageFilter.GaussianBlur(3))
-        )
-        ev_bg = (
-            ev_bg.paste(
-                BuildImage.open(BytesIO(ev_img))
-                .convert("RGBA")
-                .resize(
-                    (ev_bg.width, ev_bg.height - 65),
-                    keep_ratio=True,
-                    inside=True,
-                    bg_color=(255, 255, 255, 0),
-                ),
-                alpha=True,
-            )
-            .paste(
-                BuildImage.new("RGBA", (ev_bg.width, 65), (255, 255, 255, 120)),
-                (0, ev_bg.height - 65),
-                alpha=True,
-            )
-            .convert("RGB")
-            .circle_corner(25)
-            .draw_text(
-                (0, ev_bg.height - 65, ev_bg.width, ev_bg.height),
-                ev_name,
-                max_fontsize=50,
-            )
-        )
-        return pic.paste(
-            ev_bg,
-            (int((pic.width - ev_bg.width) / 2), 250),
-            alpha=True,
-        )
+        return await run_render(render_calender_event, r, ev_name, ev_bg, ev_img)
 
     async def draw_raid():
         if not (r := find_current_event(region["CurrentRaid"])):
             return None
 
-        pic = pic_bg.copy()
-
         ri = r.event
-        t = format_time(r.start, r.end, r.remain)
-        pic = pic.paste(
-            ti := text2image(
-                t,
-                (255, 255, 255, 0),
-                fontsize=45,
-                max_width=1350,
-                align="center",
-            ),
-            (int((1400 - ti.width) / 2), 150),
-            alpha=True,
-        )
-
         raid_type = ri["type"]
         time_atk = raid_type == "TimeAttack"
         type_key = "TimeAttack" if time_atk else "Raid"
 
         raid = {x["Id"]: x for x in raids[type_key]}
         c_ri = raid[ri["raid"]]
-        pic = pic.draw_text(
-            (25, 25, 1375, 150),
-            localization["StageType"][type_key],
-            weight="bold",
-            max_fontsize=80,
-        )
 
         if time_atk:
             tk_bg = {
@@ -332,7 +541,7 @@ async def schale_get_calender(
         atk_color = color_map[c_ri["BulletType" if time_atk else "BulletTypeInsane"]]
         def_color = color_map[c_ri["ArmorType"]]
 
-        c_bg, c_fg, icon_def, icon_atk, icon_tr = await asyncio.gather(
+        images = await asyncio.gather(
             *(
                 schale_get(bg_url, resp_type=Rt.BYTES),
                 schale_get(fg_url, resp_type=Rt.BYTES),
@@ -341,69 +550,19 @@ async def schale_get_calender(
                 schale_get(f"images/ui/Terrain_{terrain}.png", resp_type=Rt.BYTES),
             ),
         )
-
-        icon_def = (
-            BuildImage.new("RGBA", (64, 64), def_color)
-            .paste(
-                (BuildImage.open(BytesIO(icon_def)).convert("RGBA").resize_height(48)),
-                (8, 8),
-                alpha=True,
-            )
-            .circle()
-        )
-        icon_atk = (
-            BuildImage.new("RGBA", (64, 64), atk_color)
-            .paste(
-                (BuildImage.open(BytesIO(icon_atk)).convert("RGBA").resize_height(48)),
-                (8, 8),
-                alpha=True,
-            )
-            .circle()
-        )
-        icon_tr = (
-            BuildImage.new("RGBA", (64, 64), "#ffffff")
-            .paste(
-                img_invert_rgba(Image.open(BytesIO(icon_tr)).convert("RGBA")),
-                (-2, -2),
-                alpha=True,
-            )
-            .circle()
-        )
-
-        c_bg = (
-            BuildImage.open(BytesIO(c_bg))
-            .convert("RGBA")
-            .resize_height(340)
-            .filter(ImageFilter.GaussianBlur(3))
-        )
-        c_fg = BuildImage.open(BytesIO(c_fg)).convert("RGBA").resize_height(c_bg.height)
-        c_bg = (
-            c_bg.paste(
-                c_fg,
-                (int((c_bg.width - c_fg.width) / 2), 0),
-                alpha=True,
-            )
-            .paste(
-                BuildImage.new("RGBA", (c_bg.width, 65), (255, 255, 255, 120)),
-                (0, c_bg.height - 65),
-                alpha=True,
-            )
-            .paste(icon_atk, (10, 10), alpha=True)
-            .paste(icon_def, (10, 79), alpha=True)
-            .paste(icon_tr, (10, 147), alpha=True)
-            .convert("RGB")
-            .circle_corner(25)
-            .draw_text(
-                (0, c_bg.height - 65, c_bg.width, c_bg.height),
-                (
-                    localization["TimeAttackStage"][c_ri["DungeonType"]]
-                    if time_atk
-                    else (c_ri["Name"])
-                ),
-                max_fontsize=50,
-            )
+        return await run_render(
+            render_calender_raid,
+            r,
+            localization["StageType"][type_key],
+            (
+                localization["TimeAttackStage"][c_ri["DungeonType"]]
+                if time_atk
+                else (c_ri["Name"])
+            ),
+            atk_color,
+            def_color,
+            tuple(images),
         )
-        return pic.paste(c_bg, (int((pic.width - c_bg.width) / 2), 250), alpha=True)
 
     async def draw_birth():
         now_t = time.mktime(now.date().timetuple())
@@ -429,122 +588,45 @@ async def schale_get_calender(
         if (not birth_this_week) and (not birth_next_week):
             return None
 
-        img_per_line = 7
         sort_key = lambda x: tuple(  # noqa: E731
             f"{x:0>2}" for x in cast(str, x["BirthDay"]).split("/")
         )
-        p_h = 0
-        if birth_this_week:
-            birth_this_week.sort(key=sort_key)
-            p_h += 70 + 220 * math.ceil(len(birth_this_week) / img_per_line)
-
-        if birth_next_week:
-            birth_next_week.sort(key=sort_key)
-            p_h += 70 + 220 * math.ceil(len(birth_next_week) / img_per_line)
-            if birth_this_week:
-                p_h += 25
-
-        padding = 25
-        min_height = 640
-        title_h = 125
-        height = max(padding * 3 + title_h + p_h, min_height)
-        width = 1400
-        pic = BuildImage.new("RGBA", (width, height), (255, 255, 255, 70)).draw_text(
-            (25, 25, 1375, 150),
-            "学生生日",
-            weight="bold",
-            max_fontsize=80,
-        )
-        stu_pics = [
-            BuildImage.open(BytesIO(x)).convert("RGBA").resize_height(180).circle()
-            for x in await asyncio.gather(
-                *(
-                    schale_get(
-                        f'images/student/icon/{x["Id"]}.webp',
-                        resp_type=Rt.BYTES,
-                    )
-                    for x in birth_this_week + birth_next_week
-                ),
-            )
-        ]
-
-        y_offset = title_h + padding
-        if height >= min_height:
-            y_offset += (height - (padding // 2) - title_h - p_h) // 2
-
-        def draw_birth_stu(title: str, students: List[dict]):
-            nonlocal y_offset
-
-            subtitle = Text2Image.from_text(title, fontsize=45)
-            subtitle.draw_on_image(pic.image, ((width - subtitle.width) // 2, y_offset))
-            y_offset += 70
-
-            for line in split_list(students, img_per_line):
-                x_offset = (width - (190 * len(line))) // 2
-                for stu in line:
-                    pic.paste(
-                        stu_pics.pop(0),
-                        (x_offset, y_offset),
-                        alpha=True,
-                    ).draw_text(
-                        (x_offset, y_offset + 180, x_offset + 180, y_offset + 220),
-                        stu["BirthDay"],
-                    )
-                    x_offset += 190
-                y_offset += 220
-
-        if birth_this_week:
-            draw_birth_stu("本周", birth_this_week)
-            y_offset += 25
-
-        if birth_next_week:
-            draw_birth_stu("下周", birth_next_week)
+        birth_this_week.sort(key=sort_key)
+        birth_next_week.sort(key=sort_key)
 
-        return pic
-
-    img = await asyncio.gather(  # type: ignore
-        draw_gacha(),
-        draw_event(),
-        draw_raid(),
-        draw_birth(),
-    )
-    img: List[BuildImage] = [x for x in img if x]
-    if not img:
-        img.append(
-            pic_bg.copy().draw_text(
-                (0, 0, 1400, 640),
-                "没有获取到任何数据",
-                max_fontsize=60,
+        icons = await asyncio.gather(
+            *(
+                schale_get(
+                    f'images/student/icon/{x["Id"]}.webp',
+                    resp_type=Rt.BYTES,
+                )
+                for x in birth_this_week + birth_next_week
             ),
         )
-
-    bg_w = 1500
-    bg_h = 200 + sum([x.height + 50 for x in img])
-    bg = (
-        BuildImage.new("RGBA", (bg_w, bg_h))
-        .paste((await read_image(CALENDER_BANNER_PATH)).resize((1500, 150)))
-        .draw_text(
-            (50, 0, 1480, 150),
-            f"SchaleDB丨活动日程丨{localization['ServerName'][str(server_index)]}",
-            max_fontsize=100,
-            weight="bold",
-            fill="#ffffff",
-            halign="left",
+        return await run_render(
+            render_calender_birth,
+            [{"BirthDay": x["BirthDay"]} for x in birth_this_week],
+            [{"BirthDay": x["BirthDay"]} for x in birth_next_week],
+            list(icons),
         )
-        .paste(
-            (await read_image(GRADIENT_BG_PATH)).resize(
-                (1500, bg_h - 150),
-                resample=Resampling.NEAREST,
-            ),
-            (0, 150),
-        )
-    )
 
-    h_index = 200
-    for im in img:
-        bg.paste(im.circle_corner(10), (50, h_index), alpha=True)
-        h_index += im.height + 50
-    return bg.convert("RGB").save("JPEG")
+    img, banner, gradient_bg = await asyncio.gather(
+        asyncio.gather(
+            draw_gacha(),
+            draw_event(),
+            draw_raid(),
+            draw_birth(),
+        ),
+        read_image_resized(CALENDER_BANNER_PATH, (1500, 150)),
+        read_image(GRADIENT_BG_PATH),
+    )
+    return await run_render(
+        render_calender,
+        [x for x in img if x],
+        f"SchaleDB丨活动日程丨{localization['ServerName'][str(server_index)]}",
+        banner,
+        gradient_bg,
+    )
 
 
 async def get_fav_li(lvl: int) -> List[dict]:
@@ -555,51 +637,62 @@ async def get_fav_li(lvl: int) -> List[dict]:
     ]
 
 
-async def draw_fav_li(stu_li: List[dict]) -> BytesIO:
+def render_fav_li(
+    names: List[str],
+    icons: List[bytes],
+    gradient_bg: BuildImage,
+) -> BytesIO:
     txt_h = 48
     pic_h = 144
     icon_w = 182
     icon_h = pic_h + txt_h
     line_max_icon = 6
 
-    if (li_len := len(stu_li)) <= line_max_icon:
+    if (li_len := len(names)) <= line_max_icon:
         line = 1
         length = li_len
     else:
         line = math.ceil(li_len / line_max_icon)
         length = line_max_icon
 
-    img = (await read_image(GRADIENT_BG_PATH)).resize(
+    img = gradient_bg.resize(
         (icon_w * length, icon_h * line + 5),
         resample=Resampling.NEAREST,
     )
 
-    async def draw_stu(name_: str, stu_id_: int, line_: int, index_: int):
-        left = index_ * icon_w
-        top = line_ * icon_h + 5
+    for i, (name, icon) in enumerate(zip(names, icons)):
+        line, index = divmod(i, line_max_icon)
+        left = index * icon_w
+        top = line * icon_h + 5
 
-        ret = await schale_get(
-            f"images/student/lobby/{stu_id_}.webp",
-            resp_type=Rt.BYTES,
-        )
-        icon_img = Image.open(BytesIO(ret)).convert("RGBA")
+        icon_img = Image.open(BytesIO(icon)).convert("RGBA")
         img.paste(icon_img, (left, top), alpha=True)
         img.draw_text(
             (left, top + pic_h, left + icon_w, top + icon_h),
-            name_,
+            name,
             max_fontsize=25,
             min_fontsize=1,
         )
 
-    task_li = []
-    line = 0
-    i = 0
-    for stu in stu_li:
-        if i == line_max_icon:
-            i = 0
-            line += 1
-        task_li.append(draw_stu(stu["Name"], stu["Id"], line, i))
-        i += 1
-    await asyncio.gather(*task_li)
-
     return img.convert("RGB").save("JPEG")
+
+
+async def draw_fav_li(stu_li: List[dict]) -> BytesIO:
+    icons, gradient_bg = await asyncio.gather(
+        asyncio.gather(
+            *(
+                schale_get(
+                    f"images/student/lobby/{x['Id']}.webp",
+                    resp_type=Rt.BYTES,
+                )
+                for x in stu_li
+            ),
+        ),
+        read_image(GRADIENT_BG_PATH),
+    )
+    return await run_render(
+        render_fav_li,
+        [x["Name"] for x in stu_li],
+        list(icons),
+        gradient_bg,
+    )
@@ -1,13 +1,20 @@
 import asyncio
+import functools
 import shutil
+import time
 from base64 import b64encode
-from datetime import datetime
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, tzinfo
 from enum import Enum
-from io import BytesIO
 from typing import (
+    TYPE_CHECKING,
     Any,
     AsyncIterable,
+    AsyncIterator,
+    Awaitable,
     Callable,
+    Deque,
     Dict,
     Generic,
     Iterable,
@@ -24,15 +31,8 @@ from urllib.parse import urljoin
 
 import anyio
 import jinja2
-import matplotlib.dates as mdates
-import matplotlib.ticker as mticker
-import pytz
-from matplotlib import pyplot
-from matplotlib.axes import Axes
-from matplotlib.figure import Figure
 from nonebot import logger
-from nonebot.compat import PYDANTIC_V2, type_validate_python
-from nonebot_plugin_htmlrender import get_new_page
+from nonebot.compat import PYDANTIC_V2, model_dump, type_validate_python
 from playwright.async_api import Route, ViewportSize
 from pydantic import BaseModel, ConfigDict, Field
 from yarl import URL
@@ -48,11 +48,25 @@ from ..resource import (
 from ..util import (
     AsyncReqKwargs,
     RespType,
+    TokenBucket,
     base_async_req,
     camel_case,
+    request_cache_budget,
     wrapped_alru_cache,
 )
-from .playwright import RES_ROUTE_URL, bawiki_router, get_template_renderer
+from .chart import new_figure, render_chart_cached, save_figure
+from .playwright import (
+    RES_ROUTE_URL,
+    SITE_SHITTIM,
+    bawiki_router,
+    get_pooled_page,
+    get_template_renderer,
+)
+from .shittim_store import load_doc, load_docs, save_doc, save_docs
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
 
 if not config.ba_shittim_key:
     logger.warning("API Key 未配置，关于什亭之匣的功能将会不可用！")
@@ -84,11 +98,42 @@ HARD_FULLNAME_MAP = {
     "N": "Normal",
 }
 RAID_ANALYSIS_URL = urljoin(config.ba_shittim_url, "raidAnalyse")
-TIMEZONE_SHANGHAI = pytz.timezone("Asia/Shanghai")
 
-async_req = wrapped_alru_cache(ttl=config.ba_shittim_req_cache_ttl, maxsize=None)(
-    base_async_req,
+
+@functools.cache
+def get_timezone_shanghai() -> tzinfo:
+    import pytz
+
+    return pytz.timezone("Asia/Shanghai")
+
+
+def get_shittim_rate_limiter() -> TokenBucket:
+    rate = config.ba_shittim_rate_limit
+    if (not rate) and config.ba_shittim_request_delay > 0:
+        rate = 1 / config.ba_shittim_request_delay
+    return TokenBucket(rate, config.ba_shittim_rate_burst)
+
+
+shittim_rate_limiter = get_shittim_rate_limiter()
+
+async_req = wrapped_alru_cache(
+    ttl=config.ba_shittim_req_cache_ttl,
+    maxsize=None,
+    budget=request_cache_budget,
+)(base_async_req)
+
+
+# 限速放在缓存内层，命中缓存的请求不会占用令牌，也不需要排队
+@wrapped_alru_cache(
+    ttl=config.ba_shittim_req_cache_ttl,
+    maxsize=None,
+    budget=request_cache_budget,
 )
+async def api_async_req(*urls: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
+    await shittim_rate_limiter.acquire()
+    return await base_async_req(*urls, **kwargs)
+
+
 template_env = jinja2.Environment(
     loader=jinja2.FileSystemLoader(RES_SHITTIM_TEMPLATES_DIR),
     enable_async=True,
@@ -99,37 +144,71 @@ template_env = jinja2.Environment(
 # region Pagination
 
 
+@dataclass()
+class PageResult(Generic[T]):
+    items: Optional[List[T]]
+    last_page: bool
+    total_pages: Optional[int] = None
+
+
 class PaginationCallable(Protocol, Generic[T]):
-    # (resp, is_last_page)
-    async def __call__(
-        self,
-        page: int,
-        size: int,
-        delay: float,
-    ) -> Tuple[Optional[List[T]], bool]:
+    async def __call__(self, page: int, size: int) -> PageResult[T]:
         ...
 
 
 class IterPFKwargs(TypedDict, total=False):
     page: int
     size: int
-    delay: float
+    concurrency: int
 
 
 def iter_pagination_func(**kwargs: Unpack[IterPFKwargs]):
-    page = kwargs.get("page", 1)
+    start_page = kwargs.get("page", 1)
     size = kwargs.get("size", 100)
-    delay = kwargs.get("delay", 0.0)
+    concurrency = max(kwargs.get("concurrency", 1), 1)
 
     def decorator(func: PaginationCallable[T]) -> Callable[[], AsyncIterable[T]]:
         async def wrapper():
-            while True:
-                resp, last_page = await func(page, size, delay)
-                if resp:
-                    for x in resp:
-                        yield x
-                if last_page:
-                    break
+            first = await func(start_page, size)
+            if first.items:
+                for x in first.items:
+                    yield x
+            if first.last_page:
+                return
+
+            # 接口没有返回总页数时只能一页一页往后翻
+            if not first.total_pages:
+                page = start_page
+                while True:
+                    page += 1
+                    resp = await func(page, size)
+                    if resp.items:
+                        for x in resp.items:
+                            yield x
+                    if resp.last_page:
+                        return
+
+            # 已知总页数时同时请求后面的几页，但仍按页码顺序输出
+            pages = iter(range(start_page + 1, first.total_pages + 1))
+            pending: Deque[asyncio.Task[PageResult[T]]] = deque()
+            try:
+                while True:
+                    while len(pending) < concurrency and (
+                        (page := next(pages, None)) is not None
+                    ):
+                        pending.append(asyncio.create_task(func(page, size)))
+                    if not pending:
+                        return
+
+                    resp = await pending.popleft()
+                    if resp.items:
+                        for x in resp.items:
+                            yield x
+                    if resp.last_page:
+                        return
+            finally:
+                for task in pending:
+                    task.cancel()
 
         return wrapper
 
@@ -166,7 +245,7 @@ def validator_time(cls, v: str):  # noqa: ANN001, ARG001
     try:
         return (
             datetime.strptime(v, "%Y-%m-%d %H:%M")
-            .replace(tzinfo=TIMEZONE_SHANGHAI)
+            .replace(tzinfo=get_timezone_shanghai())
             .astimezone()
         )
     except ValueError as e:
@@ -290,9 +369,6 @@ class ParticipationChart(CamelAliasModel):
 # region api
 
 
-request_lock = asyncio.Lock()
-
-
 async def shittim_get(url: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
     if not config.ba_shittim_key:
         raise ValueError("`BA_SHITTIM_KEY` not set")
@@ -304,16 +380,7 @@ async def shittim_get(url: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
     headers["Authorization"] = f"ba-token {config.ba_shittim_key}"
     kwargs["headers"] = headers
 
-    limit_qps = config.ba_shittim_request_delay > 0
-    if limit_qps:
-        kwargs["sleep"] = config.ba_shittim_request_delay
-        await request_lock.acquire()
-
-    try:
-        resp = await async_req(url, **kwargs)
-    finally:
-        if limit_qps and request_lock.locked():
-            request_lock.release()
+    resp = await api_async_req(url, **kwargs)
 
     if (code := resp.get("code")) != 200:
         params = kwargs.get("params")
@@ -325,28 +392,89 @@ async def shittim_get(url: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
 
 
 async def get_season_list() -> List[Season]:
-    return type_validate_python(List[Season], await shittim_get("api/season/list"))
+    if not config.ba_shittim_local_store:
+        return type_validate_python(List[Season], await shittim_get("api/season/list"))
+
+    doc = await load_doc(STORE_KIND_SEASON_LIST)
+    if doc:
+        seasons = type_validate_python(List[Season], doc.data)
+        age = time.time() - doc.synced_at
+        # 有正在进行的总力时，期数列表短时间内不会变化
+        has_live = any(
+            is_season_started(x) and not is_season_frozen(x) for x in seasons
+        )
+        if age < SEASON_LIST_MAX_AGE and (
+            has_live or age < config.ba_shittim_req_cache_ttl
+        ):
+            return seasons
+
+    try:
+        data = await shittim_get("api/season/list")
+    except Exception as e:
+        if not doc:
+            raise
+        logger.warning(f"Failed to update season list, using local data: {e!r}")
+        return type_validate_python(List[Season], doc.data)
+
+    seasons = type_validate_python(List[Season], data)
+    await save_doc(STORE_KIND_SEASON_LIST, data, False)
+    return seasons
 
 
-def get_rank_list(
+async def get_rank_list(
     server: ServerType,
     data_type: RankDataType,
     season: int,
     **pf_kwargs: Unpack[IterPFKwargs],
-) -> AsyncIterable[RankRecord]:
-    @iter_pagination_func(**pf_kwargs)
-    async def iterator(page: int, size: int, delay: float):
-        ret = type_validate_python(
-            Rank,
-            await shittim_get(
-                f"api/rank/list/{server.value}/{data_type.value}/{season}",
-                params={"page": page, "size": size},
-                sleep=delay,
-            ),
+) -> AsyncIterator[RankRecord]:
+    pf_kwargs.setdefault("concurrency", config.ba_shittim_page_concurrency)
+
+    frozen = await is_season_id_frozen(season)
+    if frozen and (
+        doc := await load_doc(
+            STORE_KIND_RANK_LIST,
+            server.value,
+            season,
+            data_type.value,
         )
-        return ret.records, True if (not ret.records) else ret.last_page
+    ):
+        for x in type_validate_python(List[RankRecord], doc.data):
+            yield x
+        return
 
-    return iterator()
+    # 页面可能是乱序请求完成的，保存时再按页码排好
+    pages: Dict[int, Tuple[List[Any], bool]] = {}
+
+    @iter_pagination_func(**pf_kwargs)
+    async def iterator(page: int, size: int):
+        data = await shittim_get(
+            f"api/rank/list/{server.value}/{data_type.value}/{season}",
+            params={"page": page, "size": size},
+        )
+        ret = type_validate_python(Rank, data)
+        last_page = True if (not ret.records) else ret.last_page
+        pages[page] = (data["records"], last_page)
+        return PageResult(ret.records, last_page, ret.total_pages)
+
+    async for x in iterator():
+        yield x
+
+    if frozen:
+        records = []
+        for page in sorted(pages):
+            page_records, last_page = pages[page]
+            records.extend(page_records)
+            if last_page:
+                break
+        if records:
+            await save_doc(
+                STORE_KIND_RANK_LIST,
+                records,
+                True,
+                server.value,
+                season,
+                data_type.value,
+            )
 
 
 async def get_rank_list_top(
@@ -355,9 +483,14 @@ async def get_rank_list_top(
 ) -> List[RankSummary]:
     return type_validate_python(
         List[RankSummary],
-        await shittim_get(
-            "api/rank/list_top",
-            params={"server": server.value, "season": season},
+        await get_season_doc(
+            STORE_KIND_RANK_LIST_TOP,
+            server,
+            season,
+            lambda: shittim_get(
+                "api/rank/list_top",
+                params={"server": server.value, "season": season},
+            ),
         ),
     )
 
@@ -368,9 +501,14 @@ async def get_rank_list_by_last_rank(
 ) -> List[RankSummary]:
     return type_validate_python(
         List[RankSummary],
-        await shittim_get(
-            "api/rank/list_by_last_rank",
-            params={"server": server.value, "season": season},
+        await get_season_doc(
+            STORE_KIND_RANK_LIST_BY_LAST_RANK,
+            server,
+            season,
+            lambda: shittim_get(
+                "api/rank/list_by_last_rank",
+                params={"server": server.value, "season": season},
+            ),
         ),
     )
 
@@ -378,7 +516,15 @@ async def get_rank_list_by_last_rank(
 async def get_raid_chart_data(server: ServerType, season: int) -> RaidChart:
     return type_validate_python(
         RaidChart,
-        await shittim_get(f"raid/new/charts/{server.value}", params={"s": season}),
+        await get_season_doc(
+            STORE_KIND_RAID_CHART,
+            server,
+            season,
+            lambda: shittim_get(
+                f"raid/new/charts/{server.value}",
+                params={"s": season},
+            ),
+        ),
     )
 
 
@@ -388,9 +534,14 @@ async def get_participation_chart_data(
 ) -> ParticipationChart:
     return type_validate_python(
         ParticipationChart,
-        await shittim_get(
-            "api/rank/season/lastRank/charts",
-            params={"server": server.value, "season": season},
+        await get_season_doc(
+            STORE_KIND_PARTICIPATION_CHART,
+            server,
+            season,
+            lambda: shittim_get(
+                "api/rank/season/lastRank/charts",
+                params={"server": server.value, "season": season},
+            ),
         ),
     )
 
@@ -398,14 +549,28 @@ async def get_participation_chart_data(
 async def get_alice_friends(server: ServerType) -> Dict[int, RankRecord]:
     return type_validate_python(
         Dict[int, RankRecord],
-        await shittim_get("api/rank/list_20001", params={"server": server.value}),
+        await get_season_records_doc(
+            STORE_KIND_ALICE_FRIENDS,
+            server,
+            lambda: shittim_get(
+                "api/rank/list_20001",
+                params={"server": server.value},
+            ),
+        ),
     )
 
 
 async def get_diligent_achievers(server: ServerType) -> Dict[int, RankRecord]:
     return type_validate_python(
         Dict[int, RankRecord],
-        await shittim_get("api/rank/list_1", params={"server": server.value}),
+        await get_season_records_doc(
+            STORE_KIND_DILIGENT_ACHIEVERS,
+            server,
+            lambda: shittim_get(
+                "api/rank/list_1",
+                params={"server": server.value},
+            ),
+        ),
     )
 
 
@@ -429,42 +594,116 @@ async def get_student_icon(student_id: Union[int, str]) -> bytes:
 # endregion
 
 
+# region local store
+
+
+# 总力结束一段时间后数据不会再变化，之后就只从本地读取
+SEASON_FREEZE_DELAY = timedelta(days=1)
+SEASON_LIST_MAX_AGE = 86400
+
+STORE_KIND_SEASON_LIST = "season_list"
+STORE_KIND_RANK_LIST = "rank_list"
+STORE_KIND_RANK_LIST_TOP = "rank_list_top"
+STORE_KIND_RANK_LIST_BY_LAST_RANK = "rank_list_by_last_rank"
+STORE_KIND_RAID_CHART = "raid_chart"
+STORE_KIND_PARTICIPATION_CHART = "participation_chart"
+STORE_KIND_ALICE_FRIENDS = "alice_friends"
+STORE_KIND_DILIGENT_ACHIEVERS = "diligent_achievers"
+
+
+def is_season_started(season: Season) -> bool:
+    return season.start_time <= datetime.now().astimezone()
+
+
+def is_season_frozen(season: Season) -> bool:
+    return datetime.now().astimezone() > season.end_time + SEASON_FREEZE_DELAY
+
+
+async def is_season_id_frozen(season: int) -> bool:
+    if not config.ba_shittim_local_store:
+        return False
+    season_obj = next((x for x in await get_season_list() if x.season == season), None)
+    return bool(season_obj) and is_season_frozen(season_obj)  # type: ignore
+
+
+async def get_season_doc(
+    kind: str,
+    server: ServerType,
+    season: int,
+    fetch: Callable[[], Awaitable[Any]],
+    data_type: int = 0,
+) -> Any:
+    frozen = await is_season_id_frozen(season)
+    if frozen and (doc := await load_doc(kind, server.value, season, data_type)):
+        return doc.data
+
+    data = await fetch()
+    if frozen and data:
+        await save_doc(kind, data, True, server.value, season, data_type)
+    return data
+
+
+async def get_season_records_doc(
+    kind: str,
+    server: ServerType,
+    fetch: Callable[[], Awaitable[Any]],
+) -> Any:
+    """用于各期数据在同一个接口中返回的情况，所有已开始的期数都冻结后才从本地读取"""
+
+    if not config.ba_shittim_local_store:
+        return await fetch()
+
+    seasons = await get_season_list()
+    started = [x for x in seasons if is_season_started(x)]
+    if started and all(is_season_frozen(x) for x in started):
+        docs = await load_docs(kind, server.value)
+        if all(x.season in docs for x in started):
+            return {
+                str(x.season): doc.data
+                for x in started
+                if (doc := docs[x.season]).data is not None
+            }
+
+    data = await fetch()
+    if data and isinstance(data, dict):
+        await save_docs(
+            kind,
+            {x.season: data.get(str(x.season)) for x in seasons if is_season_frozen(x)},
+            True,
+            server.value,
+        )
+    return data
+
+
+# endregion
+
+
 # region render
 
 
 VIEWPORT_SIZE = ViewportSize(width=880, height=1080)
 
 CHART_SHOW_RANKS = [1, 1000, 2000, 4000, 8000, 20000]
-MULTIPLIER = 2
 CHART_W = 760
 CHART_H = 480
 DATE_FORMAT = "%m-%d %H:%M"
 NUM_FORMAT = "{x:,.0f}"
-DATE_FORMATTER = mdates.DateFormatter(DATE_FORMAT)
-NUM_FORMATTER = mticker.StrMethodFormatter(NUM_FORMAT)
-
 
-def get_figure() -> Figure:
-    figure = pyplot.figure()
-    figure.set_dpi(figure.dpi * MULTIPLIER)
-    figure.set_size_inches(
-        CHART_W * MULTIPLIER / figure.dpi,
-        CHART_H * MULTIPLIER / figure.dpi,
-    )
-    return figure
 
+def get_figure() -> "Figure":
+    # 模板中图片按原始尺寸显示，所以输出尺寸保持 CHART_W x CHART_H
+    return new_figure(CHART_W, CHART_H, 1)
 
-def save_figure(figure: Figure) -> bytes:
-    bio = BytesIO()
-    figure.savefig(bio, transparent=True, format="png")
-    return bio.getvalue()
 
+def ax_settings(ax: "Axes") -> None:
+    import matplotlib.dates as mdates
+    import matplotlib.ticker as mticker
 
-def ax_settings(ax: Axes) -> None:
+    # formatter 会记录所属的坐标轴，不能在多个图表之间共用
     ax.grid()
     ax.legend(loc="lower right")
-    ax.xaxis.set_major_formatter(DATE_FORMATTER)
-    ax.yaxis.set_major_formatter(NUM_FORMATTER)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter(DATE_FORMAT))
+    ax.yaxis.set_major_formatter(mticker.StrMethodFormatter(NUM_FORMAT))
     ax.tick_params(axis="x", labelrotation=15)
 
 
@@ -488,7 +727,7 @@ def render_raid_chart(data: RaidChart) -> bytes:
     ax_settings(ax)
 
     figure.tight_layout()
-    return save_figure(figure)
+    return save_figure(figure, transparent=True)
 
 
 def render_participation_chart(data: ParticipationChart) -> bytes:
@@ -507,7 +746,7 @@ def render_participation_chart(data: ParticipationChart) -> bytes:
     ax_settings(ax)
 
     figure.tight_layout()
-    return save_figure(figure)
+    return save_figure(figure, transparent=True)
 
 
 def to_b64_url(data: bytes) -> str:
@@ -525,10 +764,16 @@ async def render_raid_rank(
     participation_chart: ParticipationChart,
 ) -> bytes:
     template = template_env.get_template("content_raid_rank.html.jinja")
-    raid_chart_url = to_b64_url(render_raid_chart(raid_chart))
-    participation_chart_url = to_b64_url(
-        render_participation_chart(participation_chart),
+    raid_chart_img, participation_chart_img = await asyncio.gather(
+        render_chart_cached(render_raid_chart, raid_chart, model_dump(raid_chart)),
+        render_chart_cached(
+            render_participation_chart,
+            participation_chart,
+            model_dump(participation_chart),
+        ),
     )
+    raid_chart_url = to_b64_url(raid_chart_img)
+    participation_chart_url = to_b64_url(participation_chart_img)
     return await get_template_renderer(
         template,
         selector=".wrapper",
@@ -565,7 +810,7 @@ async def render_rank_detail(
 
 
 async def render_raid_analysis() -> bytes:
-    async with get_new_page(viewport=VIEWPORT_SIZE) as page:
+    async with get_pooled_page(site=SITE_SHITTIM, viewport=VIEWPORT_SIZE) as page:
         await page.goto(RAID_ANALYSIS_URL, wait_until="networkidle")
 
         await page.evaluate(SHITTIM_UTIL_JS_PATH.read_text(encoding="u8"))
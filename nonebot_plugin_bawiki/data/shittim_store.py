@@ -0,0 +1,181 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import anyio
+
+from ..resource import DATA_DIR
+
+SHITTIM_DB_PATH = DATA_DIR / "shittim.db"
+
+
+@dataclass()
+class ShittimDoc:
+    data: Any
+    frozen: bool
+    synced_at: float
+
+
+def connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(SHITTIM_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_db():
+    with closing(connect()) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        # 保存接口返回的原始数据，读取时再交给 pydantic 校验
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shittim_doc ("
+            "kind TEXT NOT NULL, "
+            "server INTEGER NOT NULL, "
+            "season INTEGER NOT NULL, "
+            "data_type INTEGER NOT NULL, "
+            "frozen INTEGER NOT NULL, "
+            "synced_at REAL NOT NULL, "
+            "data TEXT NOT NULL, "
+            "PRIMARY KEY (kind, server, season, data_type)"
+            ") WITHOUT ROWID",
+        )
+
+
+db_ready = False
+db_ready_lock = threading.Lock()
+
+
+def ensure_db():
+    """第一次读写时再建表，避免插件加载时就打开数据库"""
+
+    global db_ready
+
+    if db_ready:
+        return
+    with db_ready_lock:
+        if db_ready:
+            return
+        init_db()
+        db_ready = True
+
+
+def load_doc_sync(
+    kind: str,
+    server: int = 0,
+    season: int = 0,
+    data_type: int = 0,
+) -> Optional[ShittimDoc]:
+    ensure_db()
+    with closing(connect()) as conn:
+        row = conn.execute(
+            "SELECT data, frozen, synced_at FROM shittim_doc "
+            "WHERE kind = ? AND server = ? AND season = ? AND data_type = ?",
+            (kind, server, season, data_type),
+        ).fetchone()
+    if not row:
+        return None
+    return ShittimDoc(json.loads(row[0]), bool(row[1]), row[2])
+
+
+def load_docs_sync(
+    kind: str,
+    server: int = 0,
+    data_type: int = 0,
+) -> Dict[int, ShittimDoc]:
+    ensure_db()
+    with closing(connect()) as conn:
+        cursor = conn.execute(
+            "SELECT season, data, frozen, synced_at FROM shittim_doc "
+            "WHERE kind = ? AND server = ? AND data_type = ?",
+            (kind, server, data_type),
+        )
+        return {
+            season: ShittimDoc(json.loads(data), bool(frozen), synced_at)
+            for season, data, frozen, synced_at in cursor
+        }
+
+
+def save_docs_sync(
+    kind: str,
+    docs: Dict[int, Any],
+    frozen: bool,
+    server: int = 0,
+    data_type: int = 0,
+):
+    ensure_db()
+    now = time.time()
+    rows = [
+        (kind, server, season, data_type, int(frozen), now, json.dumps(data))
+        for season, data in docs.items()
+    ]
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 已经冻结的数据不会再被覆盖
+            conn.executemany(
+                "INSERT INTO shittim_doc VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, server, season, data_type) DO UPDATE SET "
+                "frozen = excluded.frozen, "
+                "synced_at = excluded.synced_at, "
+                "data = excluded.data "
+                "WHERE shittim_doc.frozen = 0",
+                rows,
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+async def load_doc(
+    kind: str,
+    server: int = 0,
+    season: int = 0,
+    data_type: int = 0,
+) -> Optional[ShittimDoc]:
+    return await anyio.to_thread.run_sync(
+        load_doc_sync,
+        kind,
+        server,
+        season,
+        data_type,
+    )
+
+
+async def load_docs(
+    kind: str,
+    server: int = 0,
+    data_type: int = 0,
+) -> Dict[int, ShittimDoc]:
+    return await anyio.to_thread.run_sync(load_docs_sync, kind, server, data_type)
+
+
+async def save_doc(
+    kind: str,
+    data: Any,
+    frozen: bool,
+    server: int = 0,
+    season: int = 0,
+    data_type: int = 0,
+):
+    await save_docs(kind, {season: data}, frozen, server, data_type)
+
+
+async def save_docs(
+    kind: str,
+    docs: Dict[int, Any],
+    frozen: bool,
+    server: int = 0,
+    data_type: int = 0,
+):
+    await anyio.to_thread.run_sync(
+        save_docs_sync,
+        kind,
+        docs,
+        frozen,
+        server,
+        data_type,
+    )
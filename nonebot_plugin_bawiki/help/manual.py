@@ -8,7 +8,7 @@ from nonebot.matcher import Matcher
 from nonebot.params import CommandArg
 from pil_utils import Text2Image
 
-from ..command import help_list
+from ..command import get_help_list
 
 usage = "使用指令 `ba帮助` 查询插件功能帮助"
 extra = None
@@ -75,7 +75,7 @@ async def help_handle(matcher: Matcher, arg_msg: Message = CommandArg()):
                 f"({k['trigger_method']}：{k['trigger_condition']}) - "
                 f"{k['brief_des']}"
             )
-            for k in help_list
+            for k in get_help_list()
         )
         msg = (
             f"目前插件支持的功能：\n"
@@ -90,7 +90,7 @@ async def help_handle(matcher: Matcher, arg_msg: Message = CommandArg()):
     func = next(
         (
             x
-            for x in help_list
+            for x in get_help_list()
             if (
                 (arg_lower in x["func"].lower())
                 or (arg_lower in x["trigger_condition"].lower())
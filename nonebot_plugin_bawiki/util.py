@@ -1,35 +1,51 @@
 import asyncio
+import functools
+import hashlib
+import heapq
 import itertools
+import json as json_lib
+import multiprocessing
+import re
+import shutil
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum, auto
 from io import BytesIO
 from pathlib import Path
+from stat import S_ISREG
 from typing import (
     Any,
     Callable,
     Coroutine,
+    Deque,
     Dict,
     Generic,
+    Hashable,
     Iterable,
     Iterator,
     List,
     NamedTuple,
     Optional,
     Sequence,
+    Set,
     Tuple,
     TypedDict,
     TypeVar,
     Union,
-    cast,
 )
 from typing_extensions import ParamSpec, Unpack
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 from weakref import WeakSet
 
 import anyio
-from async_lru import _LRUCacheWrapper, alru_cache
-from httpx import AsyncClient
-from nonebot import logger
+from async_lru import alru_cache
+from httpx import AsyncClient, Headers, HTTPStatusError, Limits, Response
+from nonebot import get_driver, logger
 from nonebot.adapters.onebot.v11 import (
     Bot,
     GroupMessageEvent,
@@ -37,11 +53,14 @@ from nonebot.adapters.onebot.v11 import (
     MessageEvent,
     MessageSegment,
 )
+from nonebot.compat import model_dump
 from nonebot.matcher import current_matcher
-from PIL import Image, ImageOps
+from PIL import Image, ImageChops, ImageDraw, ImageOps
 from pil_utils import BuildImage
+from pydantic import BaseModel
 
 from .config import config
+from .resource import CACHE_DIR
 
 T = TypeVar("T")
 R = TypeVar("R")
@@ -55,69 +74,692 @@ SendableType = Union[Message, MessageSegment, str]
 
 KEY_ILLEGAL_COUNT = "_ba_illegal_count"
 
+HTTP_CACHE_DIR = CACHE_DIR / "http"
+if config.ba_auto_clear_cache_path and HTTP_CACHE_DIR.exists():
+    shutil.rmtree(HTTP_CACHE_DIR)
+if not HTTP_CACHE_DIR.exists():
+    HTTP_CACHE_DIR.mkdir(parents=True)
+
+SCREENSHOT_CACHE_DIR = CACHE_DIR / "screenshot"
+if config.ba_auto_clear_cache_path and SCREENSHOT_CACHE_DIR.exists():
+    shutil.rmtree(SCREENSHOT_CACHE_DIR)
+if not SCREENSHOT_CACHE_DIR.exists():
+    SCREENSHOT_CACHE_DIR.mkdir(parents=True)
+
+
+# region http client
+
+
+ClientKey = Tuple[Optional[str], Optional[float]]  # (proxy, timeout)
+
+http_clients: Dict[ClientKey, AsyncClient] = {}
+
+
+def get_http_client(
+    proxy: Optional[str] = None,
+    timeout: Optional[float] = config.ba_req_timeout,
+) -> AsyncClient:
+    key: ClientKey = (proxy, timeout)
+    cli = http_clients.get(key)
+    if (not cli) or cli.is_closed:
+        cli = AsyncClient(
+            proxy=proxy,
+            follow_redirects=True,
+            timeout=timeout,
+            limits=Limits(
+                max_connections=config.ba_req_max_connections,
+                max_keepalive_connections=config.ba_req_max_keepalive_connections,
+                keepalive_expiry=config.ba_req_keepalive_expiry,
+            ),
+        )
+        http_clients[key] = cli
+        logger.debug(f"Created http client, {proxy=}, {timeout=}")
+    return cli
+
+
+async def close_http_clients():
+    clients = list(http_clients.values())
+    http_clients.clear()
+    await asyncio.gather(*(x.aclose() for x in clients), return_exceptions=True)
+
+
+driver = get_driver()
+
+
+@driver.on_startup
+async def _():
+    get_http_client(config.ba_proxy)
+
+
+@driver.on_shutdown
+async def _():
+    await close_http_clients()
+
+
+# endregion
+
+
+# region render executor
+
+
+# Pillow 的大部分操作都会释放 GIL，所以默认使用线程池就能让绘图不再阻塞事件循环
+# 使用进程池时提交的函数需要定义在模块顶层，参数与返回值都需要可以被 pickle
+
+render_executor: Optional[Executor] = None
+
+
+def get_render_executor() -> Optional[Executor]:
+    global render_executor
+
+    if render_executor or config.ba_render_executor == "none":
+        return render_executor
+
+    workers = config.ba_render_workers
+    if config.ba_render_executor == "process":
+        # 使用 spawn 启动的子进程会重新导入插件，而那时 NoneBot 还没有初始化
+        if "fork" in multiprocessing.get_all_start_methods():
+            render_executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("fork"),
+            )
+            return render_executor
+        logger.warning("当前平台不支持 fork，绘图进程池将回退为线程池")
+
+    render_executor = ThreadPoolExecutor(workers, thread_name_prefix="bawiki-render")
+    return render_executor
+
+
+async def run_render(func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    executor = get_render_executor()
+    if not executor:
+        return func(*args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(
+        executor,
+        functools.partial(func, *args, **kwargs),
+    )
+
+
+def shutdown_render_executor():
+    global render_executor
+    if render_executor:
+        render_executor.shutdown(wait=False, cancel_futures=True)
+        render_executor = None
+
+
+@driver.on_shutdown
+async def _():
+    shutdown_render_executor()
+
+
+# endregion
+
+
+# region host health
+
+
+HEALTH_EWMA_ALPHA = 0.3
+HEALTH_DEFAULT_LATENCY = 1.0
+HEDGE_DEFAULT_DELAY = 1.0
+HEDGE_MIN_SAMPLES = 5
+
+
+@dataclass
+class HostHealth:
+    latency: Optional[float] = None  # EWMA, seconds
+    error_rate: float = 0.0  # EWMA
+    failures: int = 0  # consecutive
+    open_until: float = 0.0
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=64))
+
+    @property
+    def is_open(self) -> bool:
+        return self.open_until > time.monotonic()
+
+    @property
+    def score(self) -> float:
+        latency = HEALTH_DEFAULT_LATENCY if self.latency is None else self.latency
+        return latency / max(1 - self.error_rate, 0.05)
+
+    def record_success(self, latency: float):
+        self.latency = (
+            latency
+            if self.latency is None
+            else (HEALTH_EWMA_ALPHA * latency + (1 - HEALTH_EWMA_ALPHA) * self.latency)
+        )
+        self.error_rate *= 1 - HEALTH_EWMA_ALPHA
+        self.failures = 0
+        self.open_until = 0.0
+        self.samples.append(latency)
+
+    def record_failure(self):
+        self.error_rate = HEALTH_EWMA_ALPHA + (1 - HEALTH_EWMA_ALPHA) * self.error_rate
+        self.failures += 1
+        threshold = config.ba_req_circuit_breaker_threshold
+        if threshold > 0 and self.failures >= threshold:
+            self.open_until = time.monotonic() + config.ba_req_circuit_breaker_cooldown
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        samples = sorted(self.samples)
+        index = round((len(samples) - 1) * min(max(percentile, 0), 100) / 100)
+        return samples[index]
+
+
+host_health: Dict[str, HostHealth] = {}
+
+
+def get_host_health(url: str) -> HostHealth:
+    host = urlsplit(url).netloc
+    if host not in host_health:
+        host_health[host] = HostHealth()
+    return host_health[host]
+
+
+def rank_urls(urls: Sequence[str]) -> List[str]:
+    if len(urls) <= 1:
+        return list(urls)
+
+    # 熔断中的地址只有在全部地址都熔断时才会被尝试
+    healths = {x: get_host_health(x) for x in urls}
+    closed = [x for x in urls if not healths[x].is_open]
+    return sorted(closed or urls, key=lambda x: healths[x].score)
+
+
+# endregion
+
+
+# region rate limit
+
+
+@dataclass
+class RateLimitStats:
+    count: int = 0
+    waited: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+
+    @property
+    def wait_avg(self) -> float:
+        return self.wait_total / self.count if self.count else 0.0
+
+    def record(self, wait: float):
+        self.count += 1
+        if wait > 0:
+            self.waited += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+class TokenBucket:
+    """
+    令牌桶限速，每秒补充 `rate` 个令牌，最多积攒 `burst` 个，`rate` 不大于 0 时不限速
+
+    令牌不足时直接预支（令牌数变为负数）并按欠下的数量等待，
+    所以等待中的请求按调用顺序放行，也不需要加锁
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.stats = RateLimitStats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    async def acquire(self):
+        if not self.enabled:
+            self.stats.record(0)
+            return
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        self.stats.record(wait)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # 等待中被取消，归还预支的令牌，不占用后面请求的额度
+                self.tokens += 1
+                raise
+
+
+# endregion
+
+
+# region disk cache limit
+
+
+# 磁盘缓存写入后检查缓存文件夹，总大小超出上限或文件过旧时按修改时间从旧到新删除，
+# 读取缓存时可以更新文件的修改时间，这样常用的文件会留到最后
+# 检查需要遍历整个文件夹，所以两次检查至少间隔 DISK_CACHE_SWEEP_INTERVAL 秒，
+# 期间写入的数据超过上限的 1/10 时会提前检查
+
+DISK_CACHE_SWEEP_INTERVAL = 600
+
+
+def sweep_cache_dir(
+    path: Path,
+    max_size: Optional[int],
+    max_age: Optional[float] = None,
+) -> Tuple[int, int]:
+    """返回删除的文件数与总字节数"""
+
+    now = time.time()
+    files: List[Tuple[float, int, Path]] = []
+    for file in path.rglob("*"):
+        try:
+            stat = file.stat()
+        except OSError:
+            continue
+        if S_ISREG(stat.st_mode):
+            files.append((stat.st_mtime, stat.st_size, file))
+    files.sort()
+
+    total = sum(x[1] for x in files)
+    removed = 0
+    removed_size = 0
+    for mtime, size, file in files:
+        expired = (max_age is not None) and (now - mtime > max_age)
+        if (not expired) and (max_size is None or total <= max_size):
+            break
+        with suppress(OSError):
+            file.unlink()
+            removed += 1
+            removed_size += size
+        total -= size
+    return removed, removed_size
+
+
+@dataclass
+class DiskCacheLimit:
+    path: Path
+    max_size: Optional[int]
+    max_age: Optional[float] = None
+    written: int = 0
+    last_sweep: Optional[float] = None
+    sweeping: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return (self.max_size is not None) or (self.max_age is not None)
+
+    def is_sweep_due(self) -> bool:
+        if self.last_sweep is None:
+            return True
+        if time.monotonic() - self.last_sweep >= DISK_CACHE_SWEEP_INTERVAL:
+            return True
+        return (self.max_size is not None) and self.written * 10 >= self.max_size
+
+    async def record_write(self, size: int):
+        if not self.enabled:
+            return
+
+        self.written += size
+        await self.sweep_if_due()
+
+    async def sweep_if_due(self):
+        if (not self.enabled) or self.sweeping or (not self.is_sweep_due()):
+            return
+
+        self.sweeping = True
+        try:
+            removed, removed_size = await anyio.to_thread.run_sync(
+                sweep_cache_dir,
+                self.path,
+                self.max_size,
+                self.max_age,
+            )
+        finally:
+            self.sweeping = False
+            self.written = 0
+            self.last_sweep = time.monotonic()
+        if removed:
+            logger.debug(
+                f"Removed {removed} file(s) ({format_size(removed_size)}) "
+                f"from cache dir `{self.path.name}`",
+            )
+
+
+# endregion
+
 
 # region async_req
-# 这玩意真的太不优雅了
-# 有必要重新写一个 request cache，可以参考 hishel
 
 
 wrapped_cache_functions: "WeakSet['SupportDictCacheWrapper']" = WeakSet()
 
+KWARGS_MARK = object()
+
 
-class SupportDictCacheWrapper(Generic[P, R], _LRUCacheWrapper[R]):  # type: ignore  # ignore final class
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    coalesced: int
+    stale_hits: int
+    maxsize: Optional[int]
+    currsize: int
+
+
+class CacheKind(Enum):
+    JSON = auto()
+    BINARY = auto()
+
+
+@dataclass
+class CacheItem(Generic[R]):
+    value: R
+    expires_at: Optional[float]
+    size: int = 0
+    kind: CacheKind = CacheKind.JSON
+    priority: float = 0.0
+
+
+def estimate_size(obj: Any) -> int:
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_size(x) for x in obj)
+    if isinstance(obj, Headers):
+        return sum(len(k) + len(v) for k, v in obj.raw)
+    return sys.getsizeof(obj)
+
+
+def get_cache_kind(obj: Any) -> CacheKind:
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return CacheKind.BINARY
+    return CacheKind.JSON
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.2f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+
+# 多个缓存函数可以共用同一个内存预算
+# 超出预算时按 GreedyDual-Size 淘汰：越久没被访问、占用越大的缓存越先被淘汰
+class CacheBudget:
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        kind_max_bytes: Optional[Dict[CacheKind, Optional[int]]] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.kind_max_bytes = kind_max_bytes or {}
+        self.used: Dict[CacheKind, int] = {x: 0 for x in CacheKind}
+        self.count: Dict[CacheKind, int] = {x: 0 for x in CacheKind}
+        self.evicted = 0
+
+        self._clock = 0.0
+        self._counter = itertools.count()
+        self._heaps: Dict[CacheKind, List[tuple]] = {x: [] for x in CacheKind}
+
+    @property
+    def total_used(self) -> int:
+        return sum(self.used.values())
+
+    def _is_valid(self, entry: tuple) -> bool:
+        priority, _, owner, key = entry
+        item = owner._cache.get(key)
+        return (item is not None) and item.priority == priority
+
+    def _peek(self, kind: CacheKind) -> Optional[tuple]:
+        heap = self._heaps[kind]
+        while heap and (not self._is_valid(heap[0])):
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _evict_one(self, kind: CacheKind):
+        priority, _, owner, key = heapq.heappop(self._heaps[kind])
+        self._clock = priority
+        self.evicted += 1
+        owner._remove_item(key)
+
+    def _make_room(self, kind: CacheKind, size: int):
+        kind_limit = self.kind_max_bytes.get(kind)
+        while (kind_limit is not None) and (self.used[kind] + size > kind_limit):
+            if not self._peek(kind):
+                break
+            self._evict_one(kind)
+
+        max_bytes = self.max_bytes
+        while (max_bytes is not None) and (self.total_used + size > max_bytes):
+            heads = [(entry, k) for k in CacheKind if (entry := self._peek(k))]
+            if not heads:
+                break
+            self._evict_one(min(heads, key=lambda x: x[0][:2])[1])
+
+    def touch(self, owner: "SupportDictCacheWrapper", key: Hashable, item: CacheItem):
+        item.priority = self._clock + 1 / max(item.size, 1)
+        heap = self._heaps[item.kind]
+        heapq.heappush(heap, (item.priority, next(self._counter), owner, key))
+        self._compact(item.kind)
+
+    def _compact(self, kind: CacheKind):
+        # 命中或删除时旧的堆项不会被立即移除，太多了就清理一下
+        heap = self._heaps[kind]
+        if len(heap) > max(64, self.count[kind] * 2):
+            heap[:] = [x for x in heap if self._is_valid(x)]
+            heapq.heapify(heap)
+
+    def admit(
+        self,
+        owner: "SupportDictCacheWrapper",
+        key: Hashable,
+        item: CacheItem,
+    ) -> bool:
+        kind_limit = self.kind_max_bytes.get(item.kind)
+        if ((self.max_bytes is not None) and item.size > self.max_bytes) or (
+            (kind_limit is not None) and item.size > kind_limit
+        ):
+            return False
+
+        self._make_room(item.kind, item.size)
+        self.used[item.kind] += item.size
+        self.count[item.kind] += 1
+        self.touch(owner, key, item)
+        return True
+
+    def release(self, item: CacheItem):
+        self.used[item.kind] -= item.size
+        self.count[item.kind] -= 1
+        self._compact(item.kind)
+
+
+def freeze_arg(obj: Any) -> Hashable:
+    if isinstance(obj, dict):
+        return frozenset((k, freeze_arg(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze_arg(x) for x in obj)
+    if isinstance(obj, set):
+        return frozenset(freeze_arg(x) for x in obj)
+    return obj
+
+
+# 同一时间内参数相同的调用只会真正执行一次，其他调用会等待并共享同一个结果
+# 执行出错时不会缓存结果，取消其中一个调用也不会影响其他正在等待的调用
+# 设置了 stale_ttl 时，过期不超过 stale_ttl 秒的缓存会被直接返回，同时在后台刷新
+class SupportDictCacheWrapper(Generic[P, R]):
     def __init__(
         self,
         fn: Callable[P, Coroutine[Any, Any, R]],
         maxsize: Optional[int] = 128,
         typed: bool = False,
         ttl: Optional[float] = None,
+        budget: Optional[CacheBudget] = None,
+        stale_ttl: Optional[float] = None,
     ) -> None:
-        async def wrapped_func(*args, **kwargs):
-            new_args, new_kwargs = self._recover_args(args, kwargs)
-            return await cast(Callable, fn)(*new_args, **new_kwargs)
+        functools.update_wrapper(self, fn)
+        self.__wrapped__ = fn
+        self.maxsize = maxsize
+        self.typed = typed
+        self.ttl = ttl
+        self.budget = budget
+        self.stale_ttl = stale_ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+
+        self._cache: OrderedDict[Hashable, CacheItem[R]] = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task[R]] = {}
+
+    def _make_key(self, args: Tuple, kwargs: Dict) -> Hashable:
+        key = tuple(freeze_arg(x) for x in args)
+        sorted_kwargs = sorted(kwargs.items(), key=lambda x: x[0])
+        if sorted_kwargs:
+            key += (KWARGS_MARK, *((k, freeze_arg(v)) for k, v in sorted_kwargs))
+        if self.typed:
+            key += tuple(type(x) for x in args)
+            key += tuple(type(v) for _, v in sorted_kwargs)
+        return key
+
+    def _get_item(self, key: Hashable) -> Optional[CacheItem[R]]:
+        item = self._cache.get(key)
+        if not item:
+            return None
+        if (item.expires_at is not None) and (
+            item.expires_at + (self.stale_ttl or 0) <= time.monotonic()
+        ):
+            self._remove_item(key)
+            return None
+        self._cache.move_to_end(key)
+        if self.budget:
+            self.budget.touch(self, key, item)
+        return item
+
+    def _remove_item(self, key: Hashable):
+        item = self._cache.pop(key, None)
+        if item and self.budget:
+            self.budget.release(item)
+
+    def _set_item(self, key: Hashable, value: R):
+        self._remove_item(key)
+
+        expires_at = (time.monotonic() + self.ttl) if self.ttl is not None else None
+        item = CacheItem(value, expires_at)
+        if self.budget:
+            item.size = estimate_size(value)
+            item.kind = get_cache_kind(value)
+            self._cache[key] = item
+            if not self.budget.admit(self, key, item):
+                del self._cache[key]
+                logger.debug(
+                    f"Response too large to cache ({format_size(item.size)}), "
+                    f"{self.__wrapped__.__name__}{key}",
+                )
+                return
+        else:
+            self._cache[key] = item
+
+        if self.maxsize is not None:
+            while len(self._cache) > self.maxsize:
+                self._remove_item(next(iter(self._cache)))
+
+    def _is_stale(self, item: CacheItem[R]) -> bool:
+        return (item.expires_at is not None) and (item.expires_at <= time.monotonic())
+
+    def _task_done(self, key: Hashable, task: "asyncio.Task[R]"):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception():
+            return
+        self._set_item(key, task.result())
 
-        super().__init__(wrapped_func, maxsize, typed, ttl)
+    def _revalidate_done(self, task: "asyncio.Task[R]"):
+        if (not task.cancelled()) and (e := task.exception()):
+            name = self.__wrapped__.__name__
+            logger.warning(f"Failed to refresh stale cache of `{name}`: {e!r}")
 
-    def _process_args(
+    def _start_task(
         self,
-        func: Callable[[Any], Any],
+        key: Hashable,
         args: Tuple,
         kwargs: Dict,
-    ) -> Tuple[Tuple, Dict]:
-        new_args = tuple(func(arg) for arg in args)
-        new_kwargs = {}
-        for k, v in kwargs.items():
-            new_kwargs[k] = func(v)
-        return new_args, new_kwargs
-
-    def _convert_args(self, args: Tuple, kwargs: Dict) -> Tuple[Tuple, Dict]:
-        return self._process_args(
-            lambda obj: frozenset(obj.items()) if isinstance(obj, dict) else obj,
-            args,
-            kwargs,
+    ) -> "asyncio.Task[R]":
+        task = asyncio.create_task(self.__wrapped__(*args, **kwargs))
+        task.add_done_callback(functools.partial(self._task_done, key))
+        self._inflight[key] = task
+        return task
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            self.hits,
+            self.misses,
+            self.coalesced,
+            self.stale_hits,
+            self.maxsize,
+            len(self._cache),
         )
 
-    def _recover_args(self, args: Tuple, kwargs: Dict) -> Tuple[Tuple, Dict]:
-        return self._process_args(
-            lambda obj: dict(obj) if isinstance(obj, frozenset) else obj,
-            args,
-            kwargs,
-        )
+    def cache_memory(self) -> int:
+        return sum(x.size for x in self._cache.values())
+
+    def cache_clear(self):
+        for key in list(self._cache):
+            self._remove_item(key)
+
+    def cache_invalidate(self, *args: P.args, **kwargs: P.kwargs) -> bool:
+        key = self._make_key(args, kwargs)
+        exists = key in self._cache
+        self._remove_item(key)
+        return exists
 
     async def __call__(self, *args: P.args, **kwargs: P.kwargs) -> R:
-        new_args, new_kwargs = self._convert_args(args, kwargs)
-        return await super().__call__(*new_args, **new_kwargs)
+        key = self._make_key(args, kwargs)
+
+        if item := self._get_item(key):
+            if not self._is_stale(item):
+                self.hits += 1
+                return item.value
+
+            self.stale_hits += 1
+            if key not in self._inflight:
+                self._start_task(key, args, kwargs).add_done_callback(
+                    self._revalidate_done,
+                )
+            return item.value
+
+        if task := self._inflight.get(key):
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        return await asyncio.shield(self._start_task(key, args, kwargs))
 
 
 def wrapped_alru_cache(
     maxsize: Optional[int] = 128,
     typed: bool = False,
     ttl: Optional[int] = None,
+    budget: Optional[CacheBudget] = None,
+    stale_ttl: Optional[int] = None,
 ):
     def wrapper(
         func: Callable[P, Coroutine[Any, Any, R]],
     ) -> SupportDictCacheWrapper[P, R]:
-        wrapped = SupportDictCacheWrapper(func, maxsize, typed, ttl)
+        wrapped = SupportDictCacheWrapper(
+            func,
+            maxsize,
+            typed,
+            ttl,
+            budget,
+            stale_ttl,
+        )
         wrapped_cache_functions.add(wrapped)
         return wrapped
 
@@ -131,6 +773,80 @@ class RespType(Enum):
     HEADERS = auto()
 
 
+class HttpCacheMeta(BaseModel):
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    encoding: Optional[str] = None
+    stored_at: float
+
+
+def get_http_cache_paths(url: str) -> Tuple[anyio.Path, anyio.Path]:
+    name = hashlib.sha256(url.encode()).hexdigest()
+    return (
+        anyio.Path(HTTP_CACHE_DIR / f"{name}.json"),
+        anyio.Path(HTTP_CACHE_DIR / f"{name}.bin"),
+    )
+
+
+async def load_http_cache_meta(url: str) -> Optional[HttpCacheMeta]:
+    meta_path, body_path = get_http_cache_paths(url)
+    if not ((await meta_path.exists()) and (await body_path.exists())):
+        return None
+    try:
+        return HttpCacheMeta(**json_lib.loads(await meta_path.read_text("u8")))
+    except Exception as e:
+        logger.warning(f"Failed to load http cache meta of `{url}`: {e!r}")
+        return None
+
+
+async def read_http_cache_body(url: str) -> bytes:
+    meta_path, body_path = get_http_cache_paths(url)
+    # 更新修改时间，清理缓存时最近用到的文件会留到最后
+    for path in (meta_path, body_path):
+        with suppress(OSError):
+            await path.touch()
+    return await body_path.read_bytes()
+
+
+async def save_http_cache(url: str, resp: Response):
+    cache_control = resp.headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return
+
+    meta = HttpCacheMeta(
+        url=url,
+        etag=resp.headers.get("ETag"),
+        last_modified=resp.headers.get("Last-Modified"),
+        encoding=resp.encoding,
+        stored_at=time.time(),
+    )
+    if not (meta.etag or meta.last_modified):
+        return
+
+    meta_path, body_path = get_http_cache_paths(url)
+    for path, content in (
+        (body_path, resp.content),
+        (meta_path, json_lib.dumps(model_dump(meta)).encode("u8")),
+    ):
+        tmp_path = path.with_suffix(f"{path.suffix}.tmp")
+        await tmp_path.write_bytes(content)
+        await tmp_path.replace(path)
+    await http_cache_limit.record_write(len(resp.content))
+
+
+def parse_resp_content(
+    content: bytes,
+    encoding: Optional[str],
+    resp_type: RespType,
+) -> Any:
+    if resp_type == RespType.TEXT:
+        return content.decode(encoding or "u8", errors="replace")
+    if resp_type == RespType.BYTES:
+        return content
+    return json_lib.loads(content)  # default RespType.JSON:
+
+
 class AsyncReqKwargs(TypedDict, total=False):
     method: str
     params: Optional[Dict[Any, Any]]
@@ -145,6 +861,7 @@ class AsyncReqKwargs(TypedDict, total=False):
     retries: int
     raise_for_status: bool
     sleep: float
+    disk_cache: bool
 
 
 async def base_async_req(*urls: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
@@ -164,6 +881,13 @@ async def base_async_req(*urls: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
     retries = kwargs.pop("retries", config.ba_req_retry)
     raise_for_status = kwargs.pop("raise_for_status", True)
     sleep = kwargs.pop("sleep", 0)
+    disk_cache = (
+        kwargs.pop("disk_cache", False)
+        and config.ba_req_disk_cache
+        and method == "GET"
+        and (content is None and data is None and json is None)
+        and resp_type != RespType.HEADERS
+    )
 
     if base_urls:
         if not isinstance(base_urls, list):
@@ -172,60 +896,168 @@ async def base_async_req(*urls: str, **kwargs: Unpack[AsyncReqKwargs]) -> Any:
             itertools.starmap(urljoin, itertools.product(base_urls, urls)),  # type: ignore
         )
 
+    cli = get_http_client(proxies)
+    hedge = config.ba_req_hedge and method in ("GET", "HEAD")
+
     async def do_request(current_url: str):
-        async with AsyncClient(
-            proxies=proxies,
-            follow_redirects=True,
-            timeout=config.ba_req_timeout,
-        ) as cli:
+        logger.debug(
+            f"{method} `{current_url}`, "
+            f"{params=}, {headers=}, {content=}, {data=}, {json=}",
+        )
+        request = cli.build_request(
+            method,
+            current_url,
+            params=params,
+            headers=headers,
+            content=content,
+            data=data,
+            json=json,
+        )
+
+        cache_url = str(request.url)
+        cache_meta = (await load_http_cache_meta(cache_url)) if disk_cache else None
+        if cache_meta:
+            if cache_meta.etag:
+                request.headers["If-None-Match"] = cache_meta.etag
+            if cache_meta.last_modified:
+                request.headers["If-Modified-Since"] = cache_meta.last_modified
+
+        resp = await cli.send(request)
+
+        if cache_meta and resp.status_code == 304:
+            logger.debug(f"`{cache_url}` not modified, using disk cache")
+            cached = await read_http_cache_body(cache_url)
+            return parse_resp_content(cached, cache_meta.encoding, resp_type)
+
+        if raise_for_status:
+            resp.raise_for_status()
+
+        if disk_cache and resp.is_success:
+            try:
+                await save_http_cache(cache_url, resp)
+            except Exception as e:
+                logger.warning(f"Failed to save http cache of `{cache_url}`: {e!r}")
+
+        if resp_type == RespType.HEADERS:
+            return resp.headers
+        return parse_resp_content(resp.content, resp.encoding, resp_type)
+
+    async def timed_request(current_url: str):
+        health = get_host_health(current_url)
+        start = time.monotonic()
+        try:
+            ret = await do_request(current_url)
+        except HTTPStatusError as e:
+            # 4xx 说明服务器本身是正常的
+            if e.response.status_code < 500:
+                health.record_success(time.monotonic() - start)
+            else:
+                health.record_failure()
+            raise
+        except Exception:
+            health.record_failure()
+            raise
+        health.record_success(time.monotonic() - start)
+        return ret
+
+    async def hedged_request(current_url: str, backup_url: str):
+        delay = (
+            get_host_health(current_url).latency_percentile(
+                config.ba_req_hedge_percentile,
+            )
+            or HEDGE_DEFAULT_DELAY
+        )
+        pending = {asyncio.create_task(timed_request(current_url))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return done.pop().result()
+
             logger.debug(
-                f"{method} `{current_url}`, "
-                f"{params=}, {headers=}, {content=}, {data=}, {json=}",
+                f"`{current_url}` not responding in {delay:.2f}s, "
+                f"hedging with `{backup_url}`",
             )
-            resp = await cli.request(
-                method,
-                current_url,
-                params=params,
-                headers=headers,
-                content=content,
-                data=data,
-                json=json,
+            pending.add(asyncio.create_task(timed_request(backup_url)))
+            last_e: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if not (e := task.exception()):
+                        return task.result()
+                    last_e = e
+            assert last_e
+            raise last_e
+        finally:
+            for task in pending:
+                task.cancel()
+
+    candidates = rank_urls(urls)
+    attempts = retries + len(candidates)
+    last_e: Optional[Exception] = None
+    for i in range(attempts):
+        url = candidates[i % len(candidates)]
+        backup_url = candidates[(i + 1) % len(candidates)]
+        try:
+            ret = await (
+                hedged_request(url, backup_url)
+                if hedge and url != backup_url
+                else timed_request(url)
             )
-            if raise_for_status:
-                resp.raise_for_status()
-
+        except Exception as e:
+            last_e = e
+            if not (left := attempts - i - 1):
+                break
+            logger.error(
+                f"Requesting `{backup_url}` ({left} attempts left) "
+                f"because error occurred while requesting `{url}`: {e!r}",
+            )
+            logger.opt(exception=e).debug("Error Stack")
+        else:
             if sleep:
                 await asyncio.sleep(sleep)
+            return ret
 
-            if resp_type == RespType.TEXT:
-                return resp.text
-            if resp_type == RespType.BYTES:
-                return resp.content
-            if resp_type == RespType.HEADERS:
-                return resp.headers
-            return resp.json()  # default RespType.JSON:
+    raise ConnectionError("All retries failed") from last_e
 
-    while True:
-        url, *rest = urls
-        try:
-            return await do_request(url)
-        except Exception as e:
-            e_sfx = f"because error occurred while requesting `{url}`: {e!r}"
-            if retries > 0:
-                retries -= 1
-                logger.error(f"Retrying ({retries} left) {e_sfx}")
-            else:
-                if not rest:
-                    raise ConnectionError("All retries failed") from e
-                logger.error(f"Requesting next url `{rest[0]}` {e_sfx}")
-                url, *rest = rest
-            logger.opt(exception=e).debug("Error Stack")
+
+def mb_to_bytes(mb: float) -> Optional[int]:
+    return int(mb * 1024 * 1024) if mb > 0 else None
 
 
-async_req = wrapped_alru_cache(ttl=config.ba_req_cache_ttl, maxsize=None)(
-    base_async_req,
+request_cache_budget = CacheBudget(
+    mb_to_bytes(config.ba_req_cache_max_mb),
+    {
+        CacheKind.JSON: mb_to_bytes(config.ba_req_cache_json_max_mb),
+        CacheKind.BINARY: mb_to_bytes(config.ba_req_cache_binary_max_mb),
+    },
 )
 
+http_cache_limit = DiskCacheLimit(
+    HTTP_CACHE_DIR,
+    mb_to_bytes(config.ba_req_disk_cache_max_mb),
+)
+
+async_req = wrapped_alru_cache(
+    ttl=config.ba_req_cache_ttl,
+    maxsize=None,
+    budget=request_cache_budget,
+)(base_async_req)
+
+# 学生、图鉴等数据源 JSON 更新不频繁，过期后先返回旧数据，同时在后台刷新
+stale_async_req = wrapped_alru_cache(
+    ttl=config.ba_req_cache_ttl,
+    maxsize=None,
+    budget=request_cache_budget,
+    stale_ttl=config.ba_req_cache_max_stale or None,
+)(base_async_req)
+
+
+def get_wrapped_alru_cache_memory() -> int:
+    return sum(x.cache_memory() for x in wrapped_cache_functions)
+
 
 def clear_wrapped_alru_cache() -> int:
     cleared = 0
@@ -239,26 +1071,320 @@ def clear_wrapped_alru_cache() -> int:
 # endregion
 
 
+# region screenshot cache
+
+
+# 网页截图按 来源 + 键 保存在缓存文件夹中，
+# 只有内容指纹与截图时一致才会使用，这样页面内容更新后会自动重新截图
+
+
+class ScreenshotCacheMeta(BaseModel):
+    source: str
+    key: str
+    fingerprint: str
+    count: int
+    stored_at: float
+
+
+def make_fingerprint(*parts: Any) -> str:
+    data = json_lib.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("u8")).hexdigest()
+
+
+def get_screenshot_cache_dir(source: str, key: str) -> anyio.Path:
+    name = hashlib.sha256(key.encode("u8")).hexdigest()
+    return anyio.Path(SCREENSHOT_CACHE_DIR / source / name)
+
+
+async def load_screenshot_cache(
+    source: str,
+    key: str,
+    fingerprint: str,
+) -> Optional[List[bytes]]:
+    if not config.ba_screenshot_cache:
+        return None
+
+    path = get_screenshot_cache_dir(source, key)
+    meta_path = path / "meta.json"
+    if not await meta_path.exists():
+        return None
+
+    try:
+        meta = ScreenshotCacheMeta(**json_lib.loads(await meta_path.read_text("u8")))
+        if meta.fingerprint != fingerprint:
+            return None
+        return [await (path / f"{i}.bin").read_bytes() for i in range(meta.count)]
+    except Exception as e:
+        logger.warning(f"Failed to load screenshot cache of `{source}/{key}`: {e!r}")
+        return None
+
+
+async def save_screenshot_cache(
+    source: str,
+    key: str,
+    fingerprint: str,
+    images: Sequence[bytes],
+):
+    if not config.ba_screenshot_cache:
+        return
+
+    path = get_screenshot_cache_dir(source, key)
+    await path.mkdir(parents=True, exist_ok=True)
+
+    # 先删掉旧的元数据，图片都写完后再写入新的，中途失败时只会导致缓存未命中
+    meta_path = path / "meta.json"
+    if await meta_path.exists():
+        await meta_path.unlink()
+
+    meta = ScreenshotCacheMeta(
+        source=source,
+        key=key,
+        fingerprint=fingerprint,
+        count=len(images),
+        stored_at=time.time(),
+    )
+    for name, content in (
+        *((f"{i}.bin", x) for i, x in enumerate(images)),
+        ("meta.json", json_lib.dumps(model_dump(meta)).encode("u8")),
+    ):
+        tmp_path = path / f"{name}.tmp"
+        await tmp_path.write_bytes(content)
+        await tmp_path.replace(path / name)
+
+
+# endregion
+
+
 def format_timestamp(t: int) -> str:
     return datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S")  # noqa: DTZ006
 
 
+def iter_grams(text: str) -> Iterator[str]:
+    # 单字与相邻两字
+    yield from text
+    for i in range(len(text) - 1):
+        yield text[i : i + 2]
+
+
+class AliasIndex:
+    def __init__(self, alia_dict: Dict[str, List[str]]) -> None:
+        self.keys: List[str] = list(alia_dict)
+        self.exact: Dict[str, str] = {}
+        self.fuzzy_values: List[List[str]] = []
+        self.grams: Dict[str, Set[int]] = {}
+
+        for i, (k, li) in enumerate(alia_dict.items()):
+            for x in (*li, k):
+                self.exact.setdefault(x, k)
+
+            values = [x.replace(" ", "") for x in (k, *li)]
+            self.fuzzy_values.append(values)
+            for v in values:
+                for gram in iter_grams(v):
+                    self.grams.setdefault(gram, set()).add(i)
+
+    def match_exact(self, origin: str) -> Optional[str]:
+        return self.exact.get(origin)
+
+    def match_fuzzy(self, origin: str) -> Optional[str]:
+        if not origin:
+            return self.keys[0] if self.keys else None
+
+        query_grams = (
+            {origin[i : i + 2] for i in range(len(origin) - 1)}
+            if len(origin) > 1
+            else {origin}
+        )
+        postings = sorted((self.grams.get(x, set()) for x in query_grams), key=len)
+        candidates = set.intersection(*postings)
+        for i in sorted(candidates):
+            if any(origin in v for v in self.fuzzy_values[i]):
+                return self.keys[i]
+        return None
+
+
+ALIAS_INDEX_CACHE_SIZE = 16
+alias_indexes: "OrderedDict[int, Tuple[Dict[str, List[str]], AliasIndex]]" = (
+    OrderedDict()
+)
+
+
+def get_alias_index(alia_dict: Dict[str, List[str]]) -> AliasIndex:
+    # 别名数据来自请求缓存，数据更新时会是一个新的对象，所以以对象本身作为索引的键
+    cached = alias_indexes.get(id(alia_dict))
+    if cached and cached[0] is alia_dict:
+        alias_indexes.move_to_end(id(alia_dict))
+        return cached[1]
+
+    index = AliasIndex(alia_dict)
+    alias_indexes[id(alia_dict)] = (alia_dict, index)
+    while len(alias_indexes) > ALIAS_INDEX_CACHE_SIZE:
+        alias_indexes.popitem(last=False)
+    return index
+
+
+SEARCH_TEXT_IGNORE_PATTERN = re.compile(r"[\s()（）·・]")
+SEARCH_WEIGHT_ALIAS = 0.95
+SEARCH_WEIGHT_PINYIN = 0.9
+SEARCH_WEIGHT_INITIALS = 0.8
+SEARCH_DISTANCE_PENALTY = 0.2
+
+
+def normalize_search_text(text: str) -> str:
+    return SEARCH_TEXT_IGNORE_PATTERN.sub("", replace_brackets(text).lower())
+
+
+def get_full_pinyin(text: str) -> str:
+    # pypinyin 导入时会加载很大的词典，第一次建立搜索索引时再导入
+    from pypinyin import lazy_pinyin
+
+    return "".join(x for x in lazy_pinyin(text) if x.isalnum())
+
+
+def get_pinyin_initials(text: str) -> str:
+    from pypinyin import Style, lazy_pinyin
+
+    initials = lazy_pinyin(text, style=Style.FIRST_LETTER)
+    return "".join(x for x in initials if x.isalnum())
+
+
+def get_max_distance(length: int) -> int:
+    if length < 3:
+        return 0
+    if length < 8:
+        return 1
+    return 2
+
+
+def iter_deletes(text: str, distance: int) -> Set[str]:
+    variants = {text}
+    current = {text}
+    for _ in range(distance):
+        current = {x[:i] + x[i + 1 :] for x in current for i in range(len(x))}
+        variants |= current
+    return variants
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> Optional[int]:
+    # Optimal String Alignment 距离，超过 limit 时返回 None
+    if abs(len(a) - len(b)) > limit:
+        return None
+
+    prev_prev: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev_prev[j - 2] + 1)
+        if min(cur) > limit:
+            return None
+        prev_prev, prev = prev, cur
+
+    return prev[-1] if prev[-1] <= limit else None
+
+
+class SearchResult(NamedTuple):
+    key: str
+    score: float
+
+
+# 支持全拼、拼音首字母与有限编辑距离的名称搜索
+class SearchIndex:
+    def __init__(self, entries: Iterable[Tuple[str, Iterable[str]]]) -> None:
+        self.keys: List[str] = []
+        self.term_keys: Dict[str, Dict[int, float]] = {}
+        self.deletes: Dict[str, Set[str]] = {}
+
+        for key, aliases in entries:
+            key_index = len(self.keys)
+            self.keys.append(key)
+            for term, weight in (
+                (key, 1.0),
+                *((x, SEARCH_WEIGHT_ALIAS) for x in aliases),
+            ):
+                if not (text := normalize_search_text(term)):
+                    continue
+                self._add_term(text, key_index, weight)
+                self._add_term(
+                    get_full_pinyin(text),
+                    key_index,
+                    weight * SEARCH_WEIGHT_PINYIN,
+                )
+                if len(initials := get_pinyin_initials(text)) > 1:
+                    self._add_term(
+                        initials,
+                        key_index,
+                        weight * SEARCH_WEIGHT_INITIALS,
+                    )
+
+    def _add_term(self, term: str, key_index: int, weight: float):
+        if not term:
+            return
+
+        if term not in self.term_keys:
+            self.term_keys[term] = {}
+            for variant in iter_deletes(term, get_max_distance(len(term))):
+                self.deletes.setdefault(variant, set()).add(term)
+
+        weights = self.term_keys[term]
+        weights[key_index] = max(weights.get(key_index, 0), weight)
+
+    def search(self, query: str, limit: int = 5) -> List[SearchResult]:
+        if not (text := normalize_search_text(query)):
+            return []
+
+        forms = [(text, 1.0)]
+        if (pinyin := get_full_pinyin(text)) and pinyin != text:
+            forms.append((pinyin, SEARCH_WEIGHT_PINYIN))
+
+        scores: Dict[int, float] = {}
+        for form, form_weight in forms:
+            limit_distance = get_max_distance(len(form))
+            checked: Set[str] = set()
+            for variant in iter_deletes(form, limit_distance):
+                for term in self.deletes.get(variant, ()):
+                    if term in checked:
+                        continue
+                    checked.add(term)
+
+                    distance = bounded_edit_distance(
+                        form,
+                        term,
+                        min(limit_distance, get_max_distance(len(term))),
+                    )
+                    if distance is None:
+                        continue
+
+                    for key_index, weight in self.term_keys[term].items():
+                        score = (
+                            form_weight
+                            * weight
+                            * (1 - SEARCH_DISTANCE_PENALTY * distance)
+                        )
+                        if score > scores.get(key_index, 0):
+                            scores[key_index] = score
+
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:limit]
+        return [SearchResult(self.keys[i], score) for i, score in ranked]
+
+    def search_best(self, query: str) -> Optional[str]:
+        return r[0].key if (r := self.search(query, 1)) else None
+
+
 def recover_alia(origin: str, alia_dict: Dict[str, List[str]]):
     origin = replace_brackets(origin).strip()
-    origin_ = origin.lower()
+    index = get_alias_index(alia_dict)
 
     # 精确匹配
-    for k, li in alia_dict.items():
-        if origin_ in li or origin_ == k:
-            return k
+    if k := index.match_exact(origin.lower()):
+        return k
 
     # 没找到，模糊匹配
-    origin_ = origin.replace(" ", "")
-    for k, li in alia_dict.items():
-        li = [x.replace(" ", "") for x in ([k, *li])]
-        for v in li:
-            if origin_ in v:
-                return k
+    if k := index.match_fuzzy(origin.replace(" ", "")):
+        return k
 
     return origin
 
@@ -327,12 +1453,23 @@ def split_pic(pic: Image.Image, max_height: int = 4096) -> List[Image.Image]:
 
 
 def i2b(image: Image.Image, img_format: str = "JPEG") -> BytesIO:
+    if img_format.upper() in ("JPEG", "JPG") and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
     buf = BytesIO()
     image.save(buf, img_format)
     buf.seek(0)
     return buf
 
 
+def split_pic_bytes(
+    data: bytes,
+    max_height: int = 4096,
+    img_format: str = "JPEG",
+) -> List[BytesIO]:
+    pic = Image.open(BytesIO(data))
+    return [i2b(x, img_format) for x in split_pic(pic, max_height)]
+
+
 @alru_cache()
 async def read_file_cached(path: PathType) -> bytes:
     if not isinstance(path, anyio.Path):
@@ -340,10 +1477,73 @@ async def read_file_cached(path: PathType) -> bytes:
     return await path.read_bytes()
 
 
-async def read_image(path: PathType) -> BuildImage:
+# 解码后的图片会被缓存，外部拿到的都是副本，可以随意修改
+
+
+@alru_cache()
+async def read_image_cached(path: PathType, mode: Optional[str] = None) -> BuildImage:
     content = await read_file_cached(path)
-    bio = BytesIO(content)
-    return BuildImage.open(bio)
+    image = BuildImage.open(BytesIO(content))
+    if mode and image.mode != mode:
+        image = image.convert(mode)
+    image.image.load()
+    return image
+
+
+@alru_cache()
+async def read_image_resized_cached(
+    path: PathType,
+    size: Tuple[int, int],
+    keep_ratio: bool = False,
+    mode: Optional[str] = None,
+) -> BuildImage:
+    image = await read_image_cached(path, mode)
+    return image.resize(size, keep_ratio=keep_ratio)
+
+
+async def read_image(path: PathType, mode: Optional[str] = None) -> BuildImage:
+    return (await read_image_cached(path, mode)).copy()
+
+
+async def read_image_resized(
+    path: PathType,
+    size: Tuple[int, int],
+    keep_ratio: bool = False,
+    mode: Optional[str] = None,
+) -> BuildImage:
+    return (await read_image_resized_cached(path, size, keep_ratio, mode)).copy()
+
+
+@functools.lru_cache(maxsize=16)
+def get_corner_mask(r: int) -> Image.Image:
+    # 只对左上角的 r*r 区域做 5 倍超采样，其他三个角翻转得到
+    mask = Image.new("L", (r * 10, r * 10), 0)
+    ImageDraw.Draw(mask).rounded_rectangle(
+        (0, 0, mask.width, mask.height),
+        r * 5,
+        fill=255,
+    )
+    return mask.resize((r * 2, r * 2), Image.Resampling.LANCZOS).crop((0, 0, r, r))
+
+
+def circle_corner(image: BuildImage, r: int) -> BuildImage:
+    """与 `BuildImage.circle_corner` 效果相同，但不会生成整张图五倍大小的蒙版"""
+    img = image.image.convert("RGBA")
+    w, h = img.size
+    r = min(r, w // 2, h // 2)
+    if r <= 0:
+        return BuildImage(img)
+
+    corner = get_corner_mask(r)
+    mask = Image.new("L", img.size, 255)
+    mask.paste(corner, (0, 0))
+    mask.paste(ImageOps.mirror(corner), (w - r, 0))
+    mask.paste(ImageOps.flip(corner), (0, h - r))
+    mask.paste(ImageOps.flip(ImageOps.mirror(corner)), (w - r, h - r))
+
+    alpha = img.getchannel("A")
+    img.putalpha(ImageChops.multiply(alpha, mask))
+    return BuildImage(img)
 
 
 async def send_forward_msg(